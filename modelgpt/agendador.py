@@ -0,0 +1,348 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as TempoEsgotado
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites da conta na OpenAI (requisições e tokens por minuto)
+LIMITE_RPM = 500
+LIMITE_TPM = 200000
+
+# Retentativas em erros temporários (429, 5xx e falhas de conexão)
+MAX_TENTATIVAS = 6
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 60.0
+
+# Chamada duplicada quando a original passa de FATOR_HEDGE x p95 da latência,
+# contado do início da tentativa em andamento (não da fila nem da espera no balde)
+FATOR_HEDGE = 1.5
+MIN_AMOSTRAS_HEDGE = 20
+JANELA_LATENCIAS = 200
+# Com hedge as chamadas rodam no pool do agendador, que precisa comportar
+# todas as páginas em andamento de todas as sessões, mais as duplicadas
+MAX_CHAMADAS_HEDGE = 64
+
+# Erros de rede do cliente da OpenAI, que valem nova tentativa
+ERROS_CONEXAO = {'APIConnectionError', 'APITimeoutError'}
+
+class BaldeTokens:
+    """
+    Balde de tokens duplo: um para requisições por minuto e outro para
+    tokens por minuto. reservar() bloqueia até haver uma requisição e os
+    tokens estimados disponíveis; ajustar() corrige a reserva com o uso real.
+    """
+
+    def __init__(self, rpm=LIMITE_RPM, tpm=LIMITE_TPM, relogio=time.monotonic, dormir=time.sleep):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.relogio = relogio
+        self.dormir = dormir
+        self._lock = threading.Lock()
+        self._requisicoes = float(rpm)
+        self._tokens = float(tpm)
+        self._ultimo = relogio()
+        self.segundos_espera = 0.0
+
+    def _reabastecer(self):
+        agora = self.relogio()
+        decorrido = agora - self._ultimo
+        self._ultimo = agora
+        self._requisicoes = min(self.rpm, self._requisicoes + decorrido * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + decorrido * self.tpm / 60)
+
+    def reservar(self, tokens):
+        # Uma chamada maior que o balde inteiro espera só até ele encher
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._reabastecer()
+                if self._requisicoes >= 1 and self._tokens >= tokens:
+                    self._requisicoes -= 1
+                    self._tokens -= tokens
+                    return
+                espera = max(
+                    (1 - self._requisicoes) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                )
+            # Acorda ao menos a cada segundo para aproveitar tokens devolvidos por ajustar()
+            espera = min(espera, 1.0)
+            self.dormir(espera)
+            with self._lock:
+                self.segundos_espera += espera
+
+    def ajustar(self, reservados, usados):
+        with self._lock:
+            self._tokens = min(self.tpm, self._tokens + reservados - usados)
+
+
+def _erro_temporario(erro):
+    """429, 5xx e falhas de conexão valem nova tentativa; o resto não."""
+    status = getattr(erro, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(erro, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(erro).__name__ in ERROS_CONEXAO
+
+def _retry_after(erro):
+    """Segundos pedidos pelo servidor no cabeçalho Retry-After, se houver."""
+    cabecalhos = getattr(getattr(erro, 'response', None), 'headers', None) or {}
+    try:
+        return float(cabecalhos.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def _registrar_perdedor(ao_descartar, andamento, futuro):
+    """Repassa a resposta da chamada que perdeu o hedge, se ela deu certo."""
+    if futuro.exception() is None:
+        ao_descartar(futuro.result(), andamento[1])
+
+class Agendador:
+    """
+    Agendador das chamadas ao modelo, compartilhado por todas as sessões:
+    respeita os limites de RPM/TPM com um balde de tokens, repete as
+    chamadas que falham com 429/5xx com espera exponencial e jitter, e
+    opcionalmente dispara uma chamada duplicada (hedge) para as que demoram
+    muito além do p95 de latência, ficando com a que responder primeiro.
+    As latências são separadas por chave (ex.: modelo e páginas por
+    chamada), para um modelo lento não disparar hedges em um rápido.
+    """
+
+    def __init__(self, rpm=LIMITE_RPM, tpm=LIMITE_TPM, max_tentativas=MAX_TENTATIVAS,
+                 espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA, hedging=False,
+                 relogio=time.monotonic, dormir=time.sleep, semente=None):
+        self.balde = BaldeTokens(rpm, tpm, relogio, dormir)
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.hedging = hedging
+        self.dormir = dormir
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self._latencias = defaultdict(list)
+        self._executor = None
+        self.retentativas = 0
+        self.hedges = 0
+        self.hedges_vencedores = 0
+
+    def _espera(self, tentativa, erro):
+        """Full jitter: aleatório entre 0 e a espera exponencial, ou o Retry-After se maior."""
+        with self._lock:
+            espera = self._aleatorio.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa))
+        pedido = _retry_after(erro)
+        return max(espera, pedido) if pedido is not None else espera
+
+    def _com_retentativas(self, funcao, tokens, chave=None, andamento=None):
+        """
+        andamento, se dado, recebe em [0] o início da tentativa em curso
+        (None fora de uma tentativa) e em [1] a latência da que deu certo.
+        """
+        andamento = andamento if andamento is not None else [None, None]
+        for tentativa in range(self.max_tentativas):
+            self.balde.reservar(tokens)
+            inicio = time.perf_counter()
+            andamento[0] = inicio
+            try:
+                resposta = funcao()
+            except Exception as erro:
+                andamento[0] = None
+                # A requisição recusada não consumiu os tokens reservados
+                self.balde.ajustar(tokens, 0)
+                if not _erro_temporario(erro) or tentativa == self.max_tentativas - 1:
+                    raise
+                with self._lock:
+                    self.retentativas += 1
+                self.dormir(self._espera(tentativa, erro))
+                continue
+            uso = getattr(resposta, 'usage_metadata', None) or {}
+            self.balde.ajustar(tokens, uso.get('total_tokens', tokens))
+            andamento[0], andamento[1] = None, time.perf_counter() - inicio
+            with self._lock:
+                latencias = self._latencias[chave]
+                latencias.append(andamento[1])
+                del latencias[:-JANELA_LATENCIAS]
+            return resposta
+
+    def p95(self, chave=None):
+        """Percentil 95 das latências recentes da chave, ou None com poucas amostras."""
+        with self._lock:
+            latencias = self._latencias.get(chave, [])
+            if len(latencias) < MIN_AMOSTRAS_HEDGE:
+                return None
+            ordenadas = sorted(latencias)
+        return ordenadas[int(0.95 * (len(ordenadas) - 1))]
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=MAX_CHAMADAS_HEDGE, thread_name_prefix="hedge")
+            return self._executor
+
+    def _aguardar_limite(self, original, andamento, limite):
+        """
+        Espera a original até ela passar de limite segundos na tentativa em
+        curso. Devolve True se ela terminou antes; a fila do pool, a espera
+        no balde e as pausas entre retentativas não contam.
+        """
+        while True:
+            inicio = andamento[0]
+            restante = limite if inicio is None else inicio + limite - time.perf_counter()
+            try:
+                original.result(timeout=max(restante, 0))
+                return True
+            except TempoEsgotado:
+                pass
+            inicio = andamento[0]
+            if inicio is not None and time.perf_counter() - inicio >= limite:
+                return False
+
+    def executar(self, funcao, tokens=0, chave=None, ao_descartar=None):
+        """
+        Executa funcao() (a chamada ao modelo) dentro dos limites, com
+        retentativas. tokens é a estimativa de tokens da chamada (entrada
+        mais saída máxima), corrigida depois pelo usage_metadata. chave
+        separa as latências usadas no hedge. As duas chamadas de um hedge
+        são cobradas: ao_descartar(resposta, segundos) recebe a que perdeu,
+        se ela terminar bem (depois do retorno de executar).
+        """
+        p95 = self.p95(chave) if self.hedging else None
+        if p95 is None:
+            return self._com_retentativas(funcao, tokens, chave)
+
+        executor = self._obter_executor()
+        andamento_original = [None, None]
+        original = executor.submit(self._com_retentativas, funcao, tokens, chave, andamento_original)
+        if self._aguardar_limite(original, andamento_original, FATOR_HEDGE * p95):
+            return original.result()
+        with self._lock:
+            self.hedges += 1
+        andamento_duplicada = [None, None]
+        duplicada = executor.submit(self._com_retentativas, funcao, tokens, chave, andamento_duplicada)
+        andamentos = {original: andamento_original, duplicada: andamento_duplicada}
+        pendentes = {original, duplicada}
+        while pendentes:
+            prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                if futuro.exception() is None:
+                    if futuro is duplicada:
+                        with self._lock:
+                            self.hedges_vencedores += 1
+                    if ao_descartar is not None:
+                        perdedor = duplicada if futuro is original else original
+                        perdedor.add_done_callback(partial(_registrar_perdedor, ao_descartar, andamentos[perdedor]))
+                    return futuro.result()
+        # As duas falharam
+        return original.result()
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'retentativas': self.retentativas,
+                'hedges': self.hedges,
+                'hedges_vencedores': self.hedges_vencedores,
+                # Soma das esperas de todas as threads
+                'segundos_espera_limite': round(self.balde.segundos_espera, 3),
+            }
+
+
+class EndpointFalso:
+    """
+    Servidor HTTP local que imita o /v1/chat/completions da OpenAI, para
+    testar o agendador com o cliente de verdade, sem rede:
+
+        with EndpointFalso(falhas=[429, 500]) as endpoint:
+            llm = ChatOpenAI(base_url=endpoint.url, api_key="falso", model="falso", max_retries=0)
+
+    falhas são os status devolvidos nas primeiras chamadas, na ordem;
+    depois, cada chamada falha com taxa_falhas e demora latencia segundos,
+    mais latencia_cauda com probabilidade taxa_cauda (para testar o hedge).
+    """
+
+    def __init__(self, resposta="tipo,valor,origem, data\n", latencia=0.0, falhas=(), taxa_falhas=0.0,
+                 latencia_cauda=0.0, taxa_cauda=0.0, retry_after=None, semente=0):
+        self.resposta = resposta
+        self.latencia = latencia
+        self.falhas = list(falhas)
+        self.taxa_falhas = taxa_falhas
+        self.latencia_cauda = latencia_cauda
+        self.taxa_cauda = taxa_cauda
+        self.retry_after = retry_after
+        self.chamadas = 0
+        self.status = []
+        self._aleatorio = random.Random(semente)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}/v1"
+
+    def _proxima(self):
+        """Status e espera da próxima chamada."""
+        with self._lock:
+            self.chamadas += 1
+            if self.falhas:
+                status = self.falhas.pop(0)
+            else:
+                status = 429 if self._aleatorio.random() < self.taxa_falhas else 200
+            espera = self.latencia
+            if self._aleatorio.random() < self.taxa_cauda:
+                espera += self.latencia_cauda
+            self.status.append(status)
+            return status, espera, next(self._ids)
+
+    def _manipulador(self):
+        endpoint = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+                status, espera, numero = endpoint._proxima()
+                time.sleep(espera)
+                if status == 200:
+                    entrada = len(json.dumps(corpo.get('messages', []))) // 4
+                    saida = len(endpoint.resposta) // 4 + 1
+                    dados = {
+                        'id': f"chatcmpl-falso{numero}",
+                        'object': 'chat.completion',
+                        'created': int(time.time()),
+                        'model': corpo.get('model', 'falso'),
+                        'choices': [{
+                            'index': 0,
+                            'message': {'role': 'assistant', 'content': endpoint.resposta},
+                            'finish_reason': 'stop',
+                        }],
+                        'usage': {'prompt_tokens': entrada, 'completion_tokens': saida, 'total_tokens': entrada + saida},
+                    }
+                else:
+                    dados = {'error': {'message': f"Erro simulado {status}", 'type': 'falso', 'code': str(status)}}
+                conteudo = json.dumps(dados).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(conteudo)))
+                if status != 200 and endpoint.retry_after is not None:
+                    self.send_header('Retry-After', str(endpoint.retry_after))
+                self.end_headers()
+                self.wfile.write(conteudo)
+
+        return Manipulador
+
+    def __enter__(self):
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), self._manipulador())
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *erro):
+        self._servidor.shutdown()
+        self._servidor.server_close()
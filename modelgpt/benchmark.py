@@ -0,0 +1,260 @@
+"""
+Benchmark offline do pipeline de extratos, sem chamar a API: gera extratos
+sintéticos, troca o modelo pelo ModeloFalso (com latência configurável) e
+mede cada etapa do mesmo fluxo do streamapp.py, além da normalização das
+origens em tamanhos crescentes. O relatório sai em JSON e pode ser
+comparado com o de uma execução anterior.
+
+    python benchmark.py --paginas 1 5 20 --layouts sinal escaneado --latencia 0.5 --saida atual.json
+    python benchmark.py --comparar base.json --saida atual.json
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import fitz  # PyMuPDF
+import pandas as pd
+
+import modelo
+from camada_texto import extrair_transacoes_texto
+from classificacao_paginas import motivo_sem_movimentacoes
+from extrato_sintetico import LAYOUTS, ORIGENS, ModeloFalso, gerar_extrato, saldos_paginas
+from google_drive import DriveFalso, SessaoDrive
+from metricas import EstatisticasExtrato
+from renderizacao import renderizar_paginas, renderizar_recortes
+from similaridade_nomes import normalizar_origens
+
+# Campos que identificam um cenário ao comparar dois relatórios
+CHAVES_EXTRATO = ['layout', 'paginas', 'linhas', 'transporte', 'empacotar', 'compacta', 'conciliar']
+CHAVES_NORMALIZACAO = ['origens']
+
+SILABAS = ['MA', 'RI', 'BO', 'LU', 'CA', 'TE', 'NO', 'SA', 'PE', 'DI', 'GO', 'FA', 'VI', 'LE', 'ZU', 'TRA']
+
+def _origens_sinteticas(quantidade, semente=0):
+    """
+    Origens para medir a normalização: as conhecidas do gerador de extratos
+    mais nomes inventados, cada um com algumas variações de escrita.
+    """
+    aleatorio = random.Random(semente)
+    nomes = [variacao for variacoes in ORIGENS.values() for variacao in variacoes]
+    while len(nomes) < quantidade:
+        base = " ".join("".join(aleatorio.choices(SILABAS, k=aleatorio.randint(2, 4))) for _ in range(aleatorio.randint(1, 3)))
+        nomes.append(base)
+        if aleatorio.random() < 0.5:
+            posicao = aleatorio.randrange(len(base))
+            nomes.append(base[:posicao] + base[posicao + 1:])
+        if aleatorio.random() < 0.3:
+            nomes.append(f"{base} LTDA")
+    return [aleatorio.choice(nomes) for _ in range(quantidade)]
+
+def medir_extrato(modelo_falso, paginas, linhas, layout, transporte='memoria', empacotar=False, compacta=False,
+                  usar_camada_texto=True, recortar=True, max_paginas_simultaneas=modelo.MAX_PAGINAS_SIMULTANEAS, semente=0,
+                  conciliar=False, filtrar_paginas=True):
+    """
+    Processa um extrato sintético como o streamapp.py (camada de texto e
+    filtro de páginas sem movimentações, renderização, envio, inferência, leitura, conferência de saldos e
+    normalização) e devolve os tempos de cada etapa, o uso do modelo e se
+    os totais conferem.
+    """
+    pdf_bytes, esperadas = gerar_extrato(paginas, linhas, layout, semente)
+    saldos = saldos_paginas(esperadas)
+    estatisticas = EstatisticasExtrato()
+
+    with estatisticas.etapa('camada_texto'):
+        documento = fitz.open(stream=pdf_bytes, filetype="pdf")
+        itens = [extrair_transacoes_texto(page) if usar_camada_texto else None for page in documento]
+        if filtrar_paginas:
+            for i, page in enumerate(documento):
+                motivo = motivo_sem_movimentacoes(page) if itens[i] is None else None
+                if motivo is not None:
+                    itens[i] = modelo._pagina_ignorada(motivo)
+        documento.close()
+
+    with estatisticas.etapa('renderizacao'):
+        numeros_imagens = [i for i, item in enumerate(itens) if item is None]
+        if recortar:
+            imagens, _ = renderizar_recortes(pdf_bytes, numeros_imagens)
+        else:
+            imagens = renderizar_paginas(pdf_bytes, numeros_imagens)
+        for i, imagem in zip(numeros_imagens, imagens):
+            itens[i] = imagem
+
+    if transporte == 'drive':
+        # Mesmo caminho do Drive, com o serviço imitado em memória
+        partes = [(i, parte) for i in numeros_imagens for parte in (itens[i] if isinstance(itens[i], list) else [itens[i]])]
+        envio = SessaoDrive(service=DriveFalso()).paginas_publicas([parte for _, parte in partes])
+    else:
+        partes = []
+        envio = None
+
+    def extrair():
+        return dict(modelo.extrair_transacoes_por_pagina(
+            itens, max_paginas_simultaneas, usar_cache=False, empacotar_paginas=empacotar,
+            estatisticas=estatisticas, saida_compacta=compacta, conciliar_saldos=conciliar
+        ))
+
+    if envio is None:
+        for i in numeros_imagens:
+            modelo_falso.registrar(itens[i], esperadas[i], saldos[i])
+        dfs_paginas = extrair()
+    else:
+        with estatisticas.medir_contexto(envio, 'envio', 'limpeza') as links:
+            links_por_pagina = {}
+            for (i, _), link in zip(partes, links):
+                links_por_pagina.setdefault(i, []).append(link)
+            for i in numeros_imagens:
+                itens[i] = links_por_pagina[i] if isinstance(itens[i], list) else links_por_pagina[i][0]
+                modelo_falso.registrar(itens[i], esperadas[i], saldos[i])
+            dfs_paginas = extrair()
+
+    dfs_paginas = [dfs_paginas[i] for i in range(len(itens))]
+    if conciliar:
+        dfs_paginas = modelo.conciliar_saldos_paginas(
+            itens, dfs_paginas, estatisticas, max_paginas_simultaneas=max_paginas_simultaneas,
+            usar_cache=False, saida_compacta=compacta
+        )
+    resultado = modelo.consolidar_transacoes(dfs_paginas, usar_dicionario_origens=False, estatisticas=estatisticas)
+    esperado_credito = sum(round(t['valor'] * 100) for pagina in esperadas for t in pagina if t['tipo'] == 'credito')
+    esperado_debito = sum(round(t['valor'] * 100) for pagina in esperadas for t in pagina if t['tipo'] == 'debito')
+
+    resumo = estatisticas.resumo()
+    return {
+        'layout': layout,
+        'paginas': paginas,
+        'linhas': linhas,
+        'transporte': transporte,
+        'empacotar': empacotar,
+        'compacta': compacta,
+        'conciliar': conciliar,
+        'confere': round(resultado[0] * 100) == esperado_credito and round(resultado[1] * 100) == esperado_debito,
+        **resumo['etapas'],
+        'chamadas': resumo['chamadas'],
+        'total_tokens': resumo['total_tokens'],
+        'output_tokens': resumo['output_tokens'],
+        'saida_por_pagina': round(resumo['output_tokens'] / max(resumo['paginas'].get('modelo', 0), 1), 1),
+        'paginas_modelo': resumo['paginas'].get('modelo', 0),
+        'paginas_texto': resumo['paginas'].get('texto', 0),
+        'paginas_ignoradas': resumo['paginas_ignoradas'],
+        # Cascata: páginas aprovadas no primeiro modelo e páginas que subiram de nível
+        'aprovacao_nivel0': resumo['niveis'][0]['taxa_aprovacao'] if resumo['niveis'] else None,
+        'paginas_escaladas': sum(nivel['paginas'] for nivel in resumo['niveis'][1:]),
+        'paginas_reconsultadas_saldo': resumo['paginas_reconsultadas_saldo'],
+        'paginas_sem_conciliacao': resumo['paginas_sem_conciliacao'],
+        'segundos_total': resumo['segundos_total'],
+        'paginas_por_segundo': round(paginas / resumo['segundos_total'], 2),
+    }
+
+def medir_normalizacao(quantidade, threshold=0.8, semente=0):
+    """Tempo do normalizar_origens para quantidade origens (sem o dicionário persistido)."""
+    origens = _origens_sinteticas(quantidade, semente)
+    df = pd.DataFrame({'tipo': 'debito', 'valor': 1.0, 'origem': origens, 'data': '01/03/2025'})
+    inicio = time.perf_counter()
+    normalizado = normalizar_origens(df, threshold)
+    segundos = time.perf_counter() - inicio
+    return {
+        'origens': quantidade,
+        'distintas': len(set(origens)),
+        'canonicas': normalizado['origem'].nunique(),
+        'segundos': round(segundos, 4),
+    }
+
+def _mediana(execucoes, campo):
+    """Execução mediana pelo campo de tempo, para o relatório não depender de uma rodada ruim."""
+    ordenadas = sorted(execucoes, key=lambda e: e[campo])
+    return ordenadas[len(ordenadas) // 2]
+
+def comparar(atual, base):
+    """
+    Junta os cenários em comum de dois relatórios e calcula a razão entre
+    os tempos (atual / base): abaixo de 1 ficou mais rápido.
+    """
+    tabelas = {}
+    for secao, chaves, campo in [('extratos', CHAVES_EXTRATO, 'segundos_total'), ('normalizacao', CHAVES_NORMALIZACAO, 'segundos')]:
+        df_atual = pd.DataFrame(atual.get(secao, []))
+        df_base = pd.DataFrame(base.get(secao, []))
+        if df_atual.empty or df_base.empty:
+            continue
+        juntos = df_atual[chaves + [campo]].merge(df_base[chaves + [campo]], on=chaves, suffixes=('', '_base'))
+        if juntos.empty:
+            continue
+        juntos['razao'] = (juntos[campo] / juntos[f'{campo}_base']).round(3)
+        tabelas[secao] = juntos
+    return tabelas
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de extratos.")
+    parser.add_argument('--paginas', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[30])
+    parser.add_argument('--layouts', nargs='+', default=LAYOUTS, choices=LAYOUTS)
+    parser.add_argument('--transportes', nargs='+', default=['memoria'], choices=['memoria', 'drive'])
+    parser.add_argument('--empacotar', action='store_true', help="mede também com várias páginas por chamada")
+    parser.add_argument('--compacta', action='store_true', help="mede também com a resposta no formato compacto")
+    parser.add_argument('--origens', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--latencia', type=float, default=0.5, help="latência fixa de cada chamada ao modelo falso, em segundos")
+    parser.add_argument('--latencia-token', type=float, default=0.01, help="latência por token de saída, em segundos")
+    parser.add_argument('--variacao', type=float, default=0.2, help="variação relativa da latência (0 a 1)")
+    parser.add_argument('--taxa-erros', type=float, default=0.0, help="fração das páginas que o primeiro modelo da cascata lê errado")
+    parser.add_argument('--conciliar', action='store_true', help="mede também com a conferência de saldos")
+    parser.add_argument('--taxa-divergencias', type=float, default=0.0,
+                        help="fração das páginas em que o primeiro modelo erra um valor e o saldo não fecha")
+    parser.add_argument('--max-paginas-simultaneas', type=int, default=modelo.MAX_PAGINAS_SIMULTANEAS)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--saida', default='benchmark.json')
+    parser.add_argument('--comparar', help="relatório anterior para comparar os tempos")
+    args = parser.parse_args()
+
+    # Um modelo falso por nível da cascata; só o primeiro erra, e todos respondem as mesmas páginas
+    modelo_falso = ModeloFalso(args.latencia, args.latencia_token, args.variacao, args.semente,
+                               modelo.CASCATA_MODELOS[0], args.taxa_erros, args.taxa_divergencias)
+    modelo.llms[modelo.CASCATA_MODELOS[0]] = modelo_falso
+    for nome in modelo.CASCATA_MODELOS[1:]:
+        modelo.llms[nome] = ModeloFalso(args.latencia, args.latencia_token, args.variacao, args.semente, nome)
+        modelo.llms[nome].respostas = modelo_falso.respostas
+        modelo.llms[nome].saldos = modelo_falso.saldos
+
+    extratos = []
+    for layout in args.layouts:
+        for transporte in args.transportes:
+            for empacotar in ([False, True] if args.empacotar else [False]):
+                for compacta in ([False, True] if args.compacta else [False]):
+                    for conciliar in ([False, True] if args.conciliar else [False]):
+                        for paginas in args.paginas:
+                            for linhas in args.linhas:
+                                execucoes = [
+                                    medir_extrato(modelo_falso, paginas, linhas, layout, transporte, empacotar, compacta,
+                                                  max_paginas_simultaneas=args.max_paginas_simultaneas, semente=args.semente,
+                                                  conciliar=conciliar)
+                                    for _ in range(args.repeticoes)
+                                ]
+                                extratos.append(_mediana(execucoes, 'segundos_total'))
+    normalizacao = [
+        _mediana([medir_normalizacao(quantidade, semente=args.semente) for _ in range(args.repeticoes)], 'segundos')
+        for quantidade in args.origens
+    ]
+
+    relatorio = {
+        'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'parametros': vars(args),
+        'extratos': extratos,
+        'normalizacao': normalizacao,
+    }
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=1)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(pd.DataFrame(extratos).to_string(index=False))
+        print()
+        print(pd.DataFrame(normalizacao).to_string(index=False))
+        if args.comparar:
+            with open(args.comparar, encoding='utf-8') as arquivo:
+                base = json.load(arquivo)
+            for secao, tabela in comparar(relatorio, base).items():
+                print(f"\nComparação com {args.comparar} ({secao}, razão = atual / base):")
+                print(tabela.to_string(index=False))
+    print(f"\nRelatório gravado em {args.saida}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Arquivo do cache e tamanho máximo ocupado pelos resultados guardados
+CAMINHO_CACHE = "cache_paginas.sqlite"
+MAX_BYTES_CACHE = 50 * 1024 * 1024
+
+class CachePaginas:
+    """
+    Cache em disco (SQLite) dos resultados já extraídos de cada página.
+    A chave é o hash do conteúdo da página junto com o prompt e o modelo,
+    então o mesmo extrato enviado de novo não volta ao modelo. Quando o
+    total guardado passa de max_bytes, saem as entradas usadas há mais tempo.
+    Cada entrada guarda também o motivo da reprovação na validação, quando o
+    resultado é o do último modelo da cascata e não passou (ex.: 'vazia').
+    """
+
+    def __init__(self, caminho=CAMINHO_CACHE, max_bytes=MAX_BYTES_CACHE):
+        self.caminho = caminho
+        self.max_bytes = max_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS paginas (
+                chave TEXT PRIMARY KEY,
+                linhas TEXT NOT NULL,
+                tamanho INTEGER NOT NULL,
+                ultimo_acesso REAL NOT NULL,
+                motivo TEXT
+            )
+            """
+        )
+        # Caches criados antes da coluna motivo
+        colunas = [coluna[1] for coluna in self._conexao.execute("PRAGMA table_info(paginas)")]
+        if 'motivo' not in colunas:
+            self._conexao.execute("ALTER TABLE paginas ADD COLUMN motivo TEXT")
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_acesso ON paginas (ultimo_acesso)")
+        self._conexao.commit()
+
+    @staticmethod
+    def chave(conteudo, prompt, modelo):
+        """Hash SHA-256 dos bytes da página, do prompt e do nome do modelo."""
+        h = hashlib.sha256()
+        for parte in (prompt.encode("utf-8"), modelo.encode("utf-8"), bytes(conteudo)):
+            h.update(len(parte).to_bytes(8, "big"))
+            h.update(parte)
+        return h.hexdigest()
+
+    def obter(self, chave):
+        """Devolve (linhas, motivo) guardados para a chave, ou None se não houver."""
+        with self._lock:
+            linha = self._conexao.execute("SELECT linhas, motivo FROM paginas WHERE chave = ?", (chave,)).fetchone()
+            if linha is None:
+                self.falhas += 1
+                return None
+            self.acertos += 1
+            self._conexao.execute("UPDATE paginas SET ultimo_acesso = ? WHERE chave = ?", (time.time(), chave))
+            self._conexao.commit()
+        return json.loads(linha[0]), linha[1]
+
+    def guardar(self, chave, linhas, motivo=None):
+        dados = json.dumps(linhas, ensure_ascii=False)
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO paginas (chave, linhas, tamanho, ultimo_acesso, motivo) VALUES (?, ?, ?, ?, ?)",
+                (chave, dados, len(dados.encode("utf-8")), time.time(), motivo)
+            )
+            self._remover_excedente()
+            self._conexao.commit()
+
+    def _remover_excedente(self):
+        total = self._conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM paginas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for chave, tamanho in self._conexao.execute(
+            "SELECT chave, tamanho FROM paginas ORDER BY ultimo_acesso"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conexao.execute("DELETE FROM paginas WHERE chave = ?", (chave,))
+            total -= tamanho
+
+    def limpar(self):
+        with self._lock:
+            self._conexao.execute("DELETE FROM paginas")
+            self._conexao.commit()
+
+    def estatisticas(self):
+        with self._lock:
+            entradas, total = self._conexao.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM paginas"
+            ).fetchone()
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "entradas": entradas,
+            "bytes": total,
+        }
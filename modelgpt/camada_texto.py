@@ -0,0 +1,221 @@
+import re
+import unicodedata
+from collections import Counter
+
+import pandas as pd
+
+# Mínimo de palavras para considerar que a página tem camada de texto
+MIN_PALAVRAS = 10
+# Distância vertical (em pontos) para duas palavras ficarem na mesma linha
+TOLERANCIA_LINHA = 3
+
+RE_DATA = re.compile(r"^(\d{2})/(\d{2})(?:/(\d{2}|\d{4}))?$")
+RE_VALOR = re.compile(r"^(\()?([-+])?(?:R\$)?([-+])?(\d{1,3}(?:\.?\d{3})*,\d{2})(\))?([-+])?([DC])?$")
+RE_ANO = re.compile(r"\b\d{2}/\d{2}/(\d{4})\b")
+
+# Palavras do cabeçalho que identificam as colunas de valores
+COLUNAS_VALOR = {
+    'valor': 'valor',
+    'saldo': 'saldo',
+    'debito': 'debito',
+    'debitos': 'debito',
+    'saida': 'debito',
+    'saidas': 'debito',
+    'credito': 'credito',
+    'creditos': 'credito',
+    'entrada': 'credito',
+    'entradas': 'credito',
+}
+PALAVRAS_CABECALHO = set(COLUNAS_VALOR) | {'data', 'historico', 'descricao', 'lancamento', 'lancamentos', 'documento'}
+# Início das linhas de resumo (totais, limite), que têm valor mas não são movimentações
+PALAVRAS_RESUMO = ('total', 'subtotal', 'resumo', 'limite')
+
+# Prefixos de histórico que não fazem parte do nome da origem
+RE_PREFIXO_ORIGEM = re.compile(
+    r"^(PIX\s+(QRS|ENVIADO|RECEBIDO|TRANSF|TRANSFERENCIA|EMIT|REC)|DEV\s+PIX|TED|DOC|"
+    r"COMPRA\s+(CARTAO|CART)(\s+DEB)?|PAGAMENTO|PAG\s+BOLETO|TRANSF(ERENCIA)?)\s+",
+    re.IGNORECASE,
+)
+
+def _sem_acento(texto):
+    texto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+def _agrupar_linhas(palavras):
+    """
+    Agrupa as palavras em linhas visuais pelo centro vertical e ordena
+    cada linha da esquerda para a direita.
+    """
+    palavras = sorted(palavras, key=lambda p: ((p[1] + p[3]) / 2, p[0]))
+    linhas = []
+    centro_atual = None
+    for palavra in palavras:
+        centro = (palavra[1] + palavra[3]) / 2
+        if centro_atual is None or abs(centro - centro_atual) > TOLERANCIA_LINHA:
+            linhas.append([])
+            centro_atual = centro
+        linhas[-1].append(palavra)
+    return [sorted(linha, key=lambda p: p[0]) for linha in linhas]
+
+def _colunas_cabecalho(linha):
+    """
+    Se a linha for o cabeçalho da tabela, devolve [(x1, coluna)] das colunas
+    de valores (alinhadas pela borda direita). Caso contrário, None.
+    """
+    termos = [_sem_acento(p[4]).strip(':.') for p in linha]
+    if len(PALAVRAS_CABECALHO.intersection(termos)) < 2:
+        return None
+    return [(p[2], COLUNAS_VALOR[t]) for p, t in zip(linha, termos) if t in COLUNAS_VALOR]
+
+def _ler_valor(texto):
+    """
+    Interpreta um valor no formato brasileiro. Devolve (valor, sinal), onde
+    sinal é 'debito', 'credito' ou None quando o texto não indica o tipo.
+    """
+    match = RE_VALOR.match(texto)
+    if not match:
+        return None
+    abre, sinal1, sinal2, numero, fecha, sinal3, letra = match.groups()
+    valor = float(numero.replace('.', '').replace(',', '.'))
+    sinais = {sinal1, sinal2, sinal3} - {None}
+    if (abre and fecha) or '-' in sinais or letra == 'D':
+        return valor, 'debito'
+    if '+' in sinais or letra == 'C':
+        return valor, 'credito'
+    return valor, None
+
+def _ler_data(texto, ano_padrao):
+    match = RE_DATA.match(texto)
+    if not match:
+        return None
+    dia, mes, ano = match.groups()
+    if not (1 <= int(dia) <= 31 and 1 <= int(mes) <= 12):
+        return None
+    if ano is None:
+        if ano_padrao is None:
+            return None
+        ano = ano_padrao
+    elif len(ano) == 2:
+        ano = '20' + ano
+    return f"{dia}/{mes}/{ano}"
+
+def _coluna_mais_proxima(x1, colunas):
+    return min(colunas, key=lambda c: abs(c[0] - x1))[1]
+
+def _limpar_origem(tokens):
+    origem = ' '.join(tokens).strip(' -')
+    return RE_PREFIXO_ORIGEM.sub('', origem).strip(' -') or origem
+
+def extrair_transacoes_texto(page):
+    """
+    Reconstrói a tabela de movimentações de uma página a partir das
+    coordenadas das palavras da camada de texto (PyMuPDF), sem chamar o modelo.
+    Devolve um DataFrame com as colunas tipo, valor, origem e data, ou None
+    quando a página não tem camada de texto utilizável ou a reconstrução não
+    passa na validação (inclusive páginas com linhas de resumo, como totais
+    e limite, que não dá para separar com segurança das movimentações);
+    nesses casos a página deve ir para o modelo.
+    Os saldos lidos na página (coluna de saldo, saldo anterior, saldo do
+    dia) ficam em df.attrs como saldo_inicial (antes da primeira
+    movimentação) e saldo_final (depois da última), ou None, para a
+    conferência de saldos.
+    """
+    palavras = page.get_text("words")
+    if len(palavras) < MIN_PALAVRAS:
+        return None
+
+    # Ano usado em datas sem ano (dd/mm): o mais comum entre as datas completas da página
+    anos = Counter(RE_ANO.findall(page.get_text("text")))
+    ano_padrao = anos.most_common(1)[0][0] if anos else None
+
+    colunas = None
+    data_atual = None
+    linhas_csv = []
+    # Saldos vistos na página, com o movimento acumulado (em centavos) até eles
+    movimento = 0
+    saldos = []
+    for linha in _agrupar_linhas(palavras):
+        textos = [p[4] for p in linha]
+        cabecalho = _colunas_cabecalho(linha)
+        if cabecalho is not None:
+            colunas = cabecalho
+            continue
+
+        data_linha = None
+        valores = []
+        resto = []
+        sinal_pendente = None
+        for palavra in linha:
+            texto = palavra[4]
+            if data_linha is None and not valores and not resto:
+                data_linha = _ler_data(texto, ano_padrao)
+                if data_linha is not None:
+                    continue
+            valor = _ler_valor(texto)
+            if valor is not None:
+                valores.append((palavra[2], valor[0], valor[1] or {'-': 'debito', '+': 'credito'}.get(sinal_pendente)))
+                sinal_pendente = None
+                continue
+            # Sinais e letras D/C soltos, antes ou depois do valor
+            if texto in ('-', '+', 'D', 'C'):
+                sinal = 'debito' if texto in ('-', 'D') else 'credito'
+                if valores and valores[-1][2] is None:
+                    x1, valor_num, _ = valores[-1]
+                    valores[-1] = (x1, valor_num, sinal)
+                elif texto in ('-', '+'):
+                    sinal_pendente = texto
+                continue
+            if texto == 'R$':
+                continue
+            # Um sinal seguido de texto era só pontuação do histórico
+            if sinal_pendente is not None:
+                resto.append(sinal_pendente)
+                sinal_pendente = None
+            resto.append(texto)
+
+        if data_linha is not None:
+            data_atual = data_linha
+        if not valores:
+            continue
+        # Linhas de saldo (saldo do dia, saldo anterior...) não são movimentações
+        if any(_sem_acento(t).startswith('saldo') for t in textos):
+            _, valor_num, sinal = valores[-1]
+            saldos.append((movimento, -valor_num if sinal == 'debito' else valor_num))
+            continue
+        # Totais e limite no meio das movimentações: a página vai para o modelo
+        if resto and _sem_acento(resto[0]).startswith(PALAVRAS_RESUMO):
+            return None
+
+        movimentos = []
+        saldo_linha = None
+        for x1, valor_num, sinal in valores:
+            coluna = _coluna_mais_proxima(x1, colunas) if colunas else None
+            if coluna == 'saldo':
+                saldo_linha = -valor_num if sinal == 'debito' else valor_num
+                continue
+            if coluna in ('debito', 'credito') and sinal is None:
+                sinal = coluna
+            movimentos.append((valor_num, sinal))
+
+        if not movimentos:
+            continue
+        # Sem cabeçalho não dá para separar valor de saldo, nem há como
+        # saber o tipo de um valor sem sinal: a página vai para o modelo
+        if len(movimentos) > 1 and colunas is None:
+            return None
+        if data_atual is None or any(sinal is None for _, sinal in movimentos):
+            return None
+        origem = _limpar_origem(resto)
+        for valor_num, sinal in movimentos:
+            linhas_csv.append({'tipo': sinal, 'valor': valor_num, 'origem': origem, 'data': data_atual})
+            movimento += round(valor_num * 100) * (1 if sinal == 'credito' else -1)
+        if saldo_linha is not None:
+            saldos.append((movimento, saldo_linha))
+
+    if not linhas_csv:
+        return None
+    df = pd.DataFrame(linhas_csv, columns=['tipo', 'valor', 'origem', 'data'])
+    # O saldo final só vale se nenhuma movimentação vier depois do último saldo
+    df.attrs['saldo_inicial'] = round(saldos[0][1] - saldos[0][0] / 100, 2) if saldos else None
+    df.attrs['saldo_final'] = saldos[-1][1] if saldos and saldos[-1][0] == movimento else None
+    return df
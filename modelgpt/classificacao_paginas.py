@@ -0,0 +1,97 @@
+import numpy as np
+
+from camada_texto import MIN_PALAVRAS, PALAVRAS_RESUMO, RE_DATA, RE_VALOR, _agrupar_linhas, _sem_acento
+from recorte_tabela import blocos_texto, mapa_tinta
+
+# Páginas com texto: uma linha com data e valor já conta como movimentação;
+# sem data, este mínimo de linhas com valor (fora saldos e totais)
+MIN_LINHAS_MOVIMENTACAO = 2
+# Linhas sem data que têm valor mas não contam como movimentações: os
+# resumos de camada_texto, saldos e encargos informativos
+PALAVRAS_SEM_MOVIMENTACAO = PALAVRAS_RESUMO + ('saldo', 'juros', 'tarifa', 'taxa')
+# A partir desta fração da página coberta por imagens, o texto pode ser só
+# o cabeçalho de uma tabela escaneada: a página é julgada pela imagem
+FRACAO_AREA_IMAGEM = 0.3
+
+# Páginas escaneadas (mapa de tinta de recorte_tabela, em DPI_PROJECAO)
+# Abaixo desta fração de pixels com tinta a página está em branco
+FRACAO_TINTA_MINIMA = 0.002
+# Blocos com menos linhas de texto que isso não podem ser uma tabela
+MIN_LINHAS_BLOCO = 2
+# Blocos com menos linhas que isso não são julgados pelas colunas
+MIN_LINHAS_COLUNAS = 5
+# Faixas de tinta mais altas que isso (em pixels) são imagens, não linhas de texto
+ALTURA_MAXIMA_LINHA = 30
+# Espaço vazio, em pixels, que atravessa todas as linhas do bloco entre duas
+# colunas da tabela; texto corrido (avisos, contrato) não tem essas calhas
+LARGURA_CALHA = 4
+MIN_CALHAS = 2
+
+def _tem_movimentacoes_texto(page):
+    """
+    Pela camada de texto: qualquer linha com data e valor monetário, ou
+    começando por data (valores em formatos que RE_VALOR não reconhece), ou
+    MIN_LINHAS_MOVIMENTACAO linhas com valor que não são saldos nem totais.
+    """
+    com_valor = 0
+    for linha in _agrupar_linhas(page.get_text("words")):
+        textos = [p[4] for p in linha]
+        if RE_DATA.match(textos[0]):
+            return True
+        if not any(RE_VALOR.match(texto) for texto in textos):
+            continue
+        if any(RE_DATA.match(texto) for texto in textos):
+            return True
+        if _sem_acento(textos[0]).startswith(PALAVRAS_SEM_MOVIMENTACAO) or any(_sem_acento(t).startswith('saldo') for t in textos):
+            continue
+        com_valor += 1
+    return com_valor >= MIN_LINHAS_MOVIMENTACAO
+
+def _fracao_imagens(page):
+    area = page.rect.get_area()
+    return sum((page.rect & info['bbox']).get_area() for info in page.get_image_info()) / area if area else 0.0
+
+def _calhas(tinta, bloco):
+    """Faixas verticais sem tinta em todas as linhas do bloco, entre a primeira e a última coluna com tinta."""
+    colunas = np.zeros(tinta.shape[1], dtype=bool)
+    for y0, y1 in bloco:
+        colunas |= tinta[y0:y1].any(axis=0)
+    com_tinta = np.flatnonzero(colunas)
+    vazias = ~colunas[com_tinta[0]:com_tinta[-1] + 1]
+    # Comprimento de cada sequência de colunas vazias
+    bordas = np.diff(np.concatenate(([0], vazias.astype(np.int8), [0])))
+    larguras = np.flatnonzero(bordas == -1) - np.flatnonzero(bordas == 1)
+    return int((larguras >= LARGURA_CALHA).sum())
+
+def _pode_ser_tabela(tinta, bloco):
+    """
+    Um bloco só é descartado com evidência: texto corrido longo, sem as
+    calhas entre colunas. Blocos curtos demais para julgar contam como tabela.
+    """
+    linhas = [(y0, y1) for y0, y1 in bloco if y1 - y0 <= ALTURA_MAXIMA_LINHA]
+    if len(linhas) < MIN_LINHAS_BLOCO:
+        return False
+    return len(linhas) < MIN_LINHAS_COLUNAS or _calhas(tinta, linhas) >= MIN_CALHAS
+
+def motivo_sem_movimentacoes(page):
+    """
+    Filtro barato, antes de qualquer chamada ao modelo: devolve por que a
+    página não tem tabela de movimentações ('sem_movimentacoes', 'em_branco'
+    ou 'sem_tabela'), ou None se ela pode ter e deve ser analisada.
+
+    Páginas com camada de texto são julgadas pelas linhas com valor
+    monetário e datas (capas, avisos e páginas só de resumo não têm). As
+    escaneadas, pelo mapa de tinta: em branco, ou sem nenhum bloco que
+    possa ser uma tabela (todos só com imagens, linhas soltas ou texto
+    corrido longo, sem as calhas verticais que separam as colunas). Só há
+    descarte com evidência forte; na dúvida a página é analisada.
+    """
+    if len(page.get_text("words")) >= MIN_PALAVRAS and _fracao_imagens(page) < FRACAO_AREA_IMAGEM:
+        return None if _tem_movimentacoes_texto(page) else 'sem_movimentacoes'
+
+    tinta = mapa_tinta(page)
+    if tinta.mean() < FRACAO_TINTA_MINIMA:
+        return 'em_branco'
+    if not any(_pode_ser_tabela(tinta, bloco) for bloco in blocos_texto(tinta)):
+        return 'sem_tabela'
+    return None
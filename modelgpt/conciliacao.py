@@ -0,0 +1,65 @@
+import pandas as pd
+
+# Diferença aceita entre o saldo final lido e o calculado, em centavos
+TOLERANCIA_CENTAVOS = 1
+
+COLUNAS_CONCILIACAO = ['extrato', 'pagina', 'saldo_inicial', 'saldo_final', 'movimento', 'diferenca', 'situacao']
+
+def _centavos(valor):
+    return None if valor is None or pd.isna(valor) else round(valor * 100)
+
+def movimento_centavos(df):
+    """Créditos menos débitos da página, em centavos."""
+    if df.empty:
+        return 0
+    centavos = (pd.to_numeric(df['valor'], errors='coerce').abs() * 100).round().fillna(0).astype('int64')
+    return int(centavos.where(df['tipo'].astype(str) == 'credito', -centavos).sum())
+
+def conciliar_paginas(dfs_paginas, paginas_por_extrato=None):
+    """
+    Confere o saldo de cada página: saldo inicial + créditos - débitos tem
+    que dar o saldo final, com até TOLERANCIA_CENTAVOS de diferença. Os
+    saldos vêm de df.attrs (saldo_inicial e saldo_final, em reais); sem o
+    saldo inicial, vale o final da página anterior do mesmo extrato.
+
+    dfs_paginas são os DataFrames das páginas em ordem e paginas_por_extrato
+    quantas páginas tem cada extrato (None: um extrato só). Devolve um
+    DataFrame com uma linha por página, na mesma ordem: extrato, pagina (a
+    partir de 1), os saldos usados, o movimento e a diferenca (em reais) e a
+    situacao: 'conciliada', 'divergente', 'sem_saldo' (falta um dos saldos)
+    ou 'sem_movimento' (página sem transações nem saldos, como capa ou avisos).
+    """
+    if paginas_por_extrato is None:
+        paginas_por_extrato = [len(dfs_paginas)]
+    linhas = []
+    inicio = 0
+    for numero_extrato, quantidade in enumerate(paginas_por_extrato, start=1):
+        saldo_anterior = None
+        for numero_pagina, df in enumerate(dfs_paginas[inicio:inicio + quantidade], start=1):
+            saldo_inicial = _centavos(df.attrs.get('saldo_inicial'))
+            saldo_final = _centavos(df.attrs.get('saldo_final'))
+            movimento = movimento_centavos(df)
+            if saldo_inicial is None:
+                saldo_inicial = saldo_anterior
+            diferenca = None
+            if df.empty and df.attrs.get('saldo_inicial') is None and saldo_final is None:
+                # Não interrompe a sequência de saldos entre as páginas vizinhas
+                situacao = 'sem_movimento'
+                saldo_final = saldo_anterior
+            elif saldo_inicial is None or saldo_final is None:
+                situacao = 'sem_saldo'
+            else:
+                diferenca = saldo_final - saldo_inicial - movimento
+                situacao = 'conciliada' if abs(diferenca) <= TOLERANCIA_CENTAVOS else 'divergente'
+            linhas.append({
+                'extrato': numero_extrato,
+                'pagina': numero_pagina,
+                'saldo_inicial': None if saldo_inicial is None else saldo_inicial / 100,
+                'saldo_final': None if saldo_final is None else saldo_final / 100,
+                'movimento': movimento / 100,
+                'diferenca': None if diferenca is None else diferenca / 100,
+                'situacao': situacao,
+            })
+            saldo_anterior = saldo_final
+        inicio += quantidade
+    return pd.DataFrame(linhas, columns=COLUNAS_CONCILIACAO)
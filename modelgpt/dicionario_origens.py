@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import threading
+from difflib import SequenceMatcher
+
+from similaridade_nomes import IndiceNomes, _normalizar_nome, agrupar_nomes_similares
+
+CAMINHO_DICIONARIO = "dicionario_origens.json"
+
+class DicionarioOrigens:
+    """
+    Dicionário persistido (JSON) de apelidos de origens: cada origem já
+    vista aponta para o seu nome canônico. Origens conhecidas são resolvidas
+    com uma consulta direta; só as novas passam pela similaridade, e o
+    resultado é gravado de volta, então "IFOOD.COM" continua com o mesmo
+    nome canônico de um extrato para o outro.
+    """
+
+    def __init__(self, caminho=CAMINHO_DICIONARIO):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self.aliases = {}
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as arquivo:
+                self.aliases = json.load(arquivo)
+
+    def _salvar(self):
+        # Grava em arquivo temporário e troca, para não deixar o JSON pela metade
+        diretorio = os.path.dirname(os.path.abspath(self.caminho))
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=diretorio, suffix='.tmp', delete=False) as tmp:
+            json.dump(self.aliases, tmp, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp.name, self.caminho)
+
+    def _canonico_mais_proximo(self, indice, nome):
+        """Nome canônico já conhecido mais similar ao nome, ou None."""
+        normalizado = _normalizar_nome(nome)
+        similares = list(indice.similares(normalizado, sorted(indice.candidatos(normalizado))))
+        if not similares:
+            return None
+        melhor = max(similares, key=lambda i: (SequenceMatcher(None, normalizado, indice.normalizados[i]).ratio(), -i))
+        return indice.nomes[melhor]
+
+    def resolver(self, origens, threshold=0.8):
+        """
+        Devolve o mapeamento origem -> nome canônico para as origens dadas.
+        Origens novas são comparadas primeiro com os nomes canônicos já
+        conhecidos; as que não se parecem com nenhum são agrupadas entre si,
+        e o nome mais frequente de cada grupo vira um novo canônico.
+        """
+        with self._lock:
+            novos = [origem for origem in dict.fromkeys(origens) if origem not in self.aliases]
+            if novos:
+                indice = IndiceNomes(sorted(set(self.aliases.values())), threshold)
+                sem_par = set()
+                for nome in novos:
+                    canonico = self._canonico_mais_proximo(indice, nome)
+                    if canonico is None:
+                        sem_par.add(nome)
+                    else:
+                        self.aliases[nome] = canonico
+                if sem_par:
+                    # Mantém as repetições para que o mais frequente vire o canônico
+                    self.aliases.update(agrupar_nomes_similares([o for o in origens if o in sem_par], threshold))
+                self._salvar()
+            return {origem: self.aliases[origem] for origem in origens}
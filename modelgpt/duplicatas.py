@@ -0,0 +1,128 @@
+import re
+
+import pandas as pd
+
+from conciliacao import _centavos, movimento_centavos
+from transacoes import _converter_datas
+
+# Menor repetição entre o fim de uma página e o início da seguinte
+# que é tratada como linhas repetidas pelo banco; repetições menores só
+# com os saldos confirmando (veja _saldo_repetido)
+MIN_LINHAS_SOBREPOSICAO = 2
+
+RE_ESPACOS = re.compile(r"\s+")
+RE_PONTUACAO = re.compile(r"[^\w\s]")
+
+def _normalizar_origens(origens):
+    """Origem sem acento, pontuação e espaços repetidos, em maiúsculas."""
+    texto = origens.fillna('').astype(str).str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    return texto.str.replace(RE_PONTUACAO, ' ', regex=True).str.replace(RE_ESPACOS, ' ', regex=True).str.strip().str.upper()
+
+def chaves_transacoes(df):
+    """
+    Hash (uint64) de cada transação pela data, valor em centavos, tipo e
+    origem normalizados, para comparar linhas de páginas e extratos
+    diferentes em tempo linear.
+    """
+    if df.empty:
+        return pd.Series([], dtype='uint64')
+    normalizado = pd.DataFrame({
+        'data': _converter_datas(df['data']).dt.strftime('%Y-%m-%d').fillna(df['data'].astype(str)),
+        'valor': (pd.to_numeric(df['valor'], errors='coerce').abs() * 100).round().astype('Int64'),
+        'tipo': df['tipo'].astype(str).str.strip().str.lower(),
+        'origem': _normalizar_origens(df['origem']),
+    })
+    return pd.util.hash_pandas_object(normalizado, index=False).reset_index(drop=True)
+
+def sobreposicao(anterior, atual):
+    """
+    Quantas linhas do início de atual repetem as últimas de anterior (as
+    duas como listas de chaves). Usa a função de prefixo do KMP sobre
+    atual + anterior, linear no tamanho das duas páginas.
+    """
+    sequencia = list(atual) + [None] + list(anterior)
+    prefixo = [0] * len(sequencia)
+    for i in range(1, len(sequencia)):
+        k = prefixo[i - 1]
+        while k and sequencia[i] != sequencia[k]:
+            k = prefixo[k - 1]
+        if sequencia[i] == sequencia[k] and sequencia[i] is not None:
+            k += 1
+        prefixo[i] = k
+    return prefixo[-1] if sequencia else 0
+
+def _saldo_repetido(saldo_final_anterior, df, repetidas):
+    """
+    Se o saldo inicial da página é o da página anterior antes das linhas
+    repetidas: o banco reimprimiu essas linhas com o saldo delas. Sem os dois
+    saldos não há confirmação.
+    """
+    saldo_inicial = _centavos(df.attrs.get('saldo_inicial'))
+    if saldo_inicial is None or saldo_final_anterior is None:
+        return False
+    return saldo_inicial + movimento_centavos(df.iloc[:repetidas]) == saldo_final_anterior
+
+def remover_duplicatas(dfs_paginas, paginas_por_extrato=None):
+    """
+    Remove as transações repetidas antes de somar os totais:
+
+    - entre páginas do mesmo extrato, as primeiras linhas de uma página que
+      repetem, na mesma ordem, as últimas da página anterior: ao menos
+      MIN_LINHAS_SOBREPOSICAO linhas, ou menos com o saldo inicial da página
+      repetindo o da anterior antes delas (uma linha igual sozinha pode ser
+      uma transação legítima repetida);
+    - entre extratos (períodos que se sobrepõem), as linhas de um extrato
+      que já apareceram nos anteriores, quantas vezes apareceram lá, para
+      não apagar compras iguais feitas no mesmo dia.
+
+    dfs_paginas são os DataFrames das páginas em ordem e paginas_por_extrato
+    quantas páginas tem cada extrato (None: um extrato só). Devolve
+    (dfs_paginas sem as duplicatas, removidas), com as linhas removidas, o
+    extrato e a página (a partir de 1) e o motivo ('pagina' ou 'extrato').
+    """
+    if paginas_por_extrato is None:
+        paginas_por_extrato = [len(dfs_paginas)]
+    resultado = []
+    removidas = []
+    # Máximo de ocorrências de cada chave em um dos extratos anteriores
+    vistas = pd.Series([], dtype='int64')
+    inicio = 0
+    for numero_extrato, quantidade in enumerate(paginas_por_extrato, start=1):
+        paginas = dfs_paginas[inicio:inicio + quantidade]
+        inicio += quantidade
+
+        mantidas = []
+        chaves_anteriores = []
+        saldo_final_anterior = None
+        for numero_pagina, df in enumerate(paginas, start=1):
+            saldo_final = _centavos(df.attrs.get('saldo_final'))
+            df = df.reset_index(drop=True)
+            chaves = chaves_transacoes(df)
+            repetidas = sobreposicao(chaves_anteriores, chaves.tolist()) if chaves_anteriores else 0
+            if repetidas and (repetidas >= MIN_LINHAS_SOBREPOSICAO or _saldo_repetido(saldo_final_anterior, df, repetidas)):
+                removidas.append(df.iloc[:repetidas].assign(extrato=numero_extrato, pagina=numero_pagina, motivo='pagina'))
+                df, chaves = df.iloc[repetidas:].reset_index(drop=True), chaves.iloc[repetidas:].reset_index(drop=True)
+            if not df.empty:
+                # Páginas sem transações (resumo, avisos) não interrompem a sequência
+                chaves_anteriores = chaves.tolist()
+                saldo_final_anterior = saldo_final
+            mantidas.append((numero_pagina, df, chaves))
+
+        # Ocorrência de cada linha entre as iguais do extrato (0, 1, 2...)
+        chaves_extrato = pd.concat([chaves for _, _, chaves in mantidas] or [pd.Series([], dtype='uint64')], ignore_index=True)
+        ocorrencia = chaves_extrato.groupby(chaves_extrato).cumcount()
+        ja_vistas = ocorrencia < chaves_extrato.map(vistas).fillna(0)
+        posicao = 0
+        for numero_pagina, df, chaves in mantidas:
+            repetida = ja_vistas.iloc[posicao:posicao + len(df)].to_numpy()
+            posicao += len(df)
+            if repetida.any():
+                removidas.append(df[repetida].assign(extrato=numero_extrato, pagina=numero_pagina, motivo='extrato'))
+                df = df[~repetida].reset_index(drop=True)
+            resultado.append(df)
+        contagem = chaves_extrato.value_counts()
+        vistas = pd.concat([vistas, contagem]).groupby(level=0).max()
+
+    colunas = ['extrato', 'pagina', 'motivo', 'tipo', 'valor', 'origem', 'data']
+    removidas = pd.concat(removidas, ignore_index=True)[colunas] if removidas else pd.DataFrame(columns=colunas)
+    return resultado, removidas
@@ -0,0 +1,253 @@
+import base64
+import hashlib
+import io
+import random
+import time
+from datetime import date, timedelta
+
+import fitz  # PyMuPDF
+from PIL import Image
+from langchain_core.messages import AIMessage
+
+from recorte_tabela import estimar_tokens_imagem
+
+# Layouts dos extratos gerados:
+#   sinal      - coluna única de valor, com sinal de mais ou de menos
+#   colunas    - colunas separadas de débito e crédito
+#   escaneado  - layout "sinal" rasterizado, sem camada de texto
+LAYOUTS = ['sinal', 'colunas', 'escaneado']
+
+# Origens com as variações de escrita que aparecem nos extratos reais
+ORIGENS = {
+    'IFOOD.COM': ['IFOOD.COM', 'IFOOD .COM', 'IFOOD.COM AGENCIA'],
+    'SHPP BRASIL': ['SHPP BRASIL', 'SHPP BRASIL INST', 'SHPP BRAZIL'],
+    'UBER DO BRASIL': ['UBER DO BRASIL', 'UBER *TRIP', 'UBER DO BRASIL TEC'],
+    'MERCADO LIVRE': ['MERCADO LIVRE', 'MERCADOLIVRE', 'MERCADO LIVRE PAG'],
+    'JOAO DA SILVA': ['JOAO DA SILVA', 'JOAO SILVA', 'JOAO DA SILVA ME'],
+    'MARIA OLIVEIRA': ['MARIA OLIVEIRA', 'MARIA DE OLIVEIRA'],
+    'POSTO SHELL': ['POSTO SHELL', 'AUTO POSTO SHELL'],
+    'FARMACIA PAGUE MENOS': ['FARMACIA PAGUE MENOS', 'PAGUE MENOS'],
+    'NETFLIX.COM': ['NETFLIX.COM', 'NETFLIX COM'],
+    'ENEL DISTRIBUICAO': ['ENEL DISTRIBUICAO', 'ENEL'],
+}
+PREFIXOS = ['PIX QRS', 'PIX ENVIADO', 'PIX RECEBIDO', 'COMPRA CARTAO', 'TED', 'PAGAMENTO']
+
+# Geometria da página (pontos, A4)
+LARGURA_PAGINA, ALTURA_PAGINA = 595, 842
+TOPO_TABELA = 150
+BASE_TABELA = 790
+TAMANHO_FONTE = 8
+DPI_ESCANEADO = 100
+# Saldo da conta antes da primeira página
+SALDO_INICIAL = 1000.0
+
+def _formatar_valor(valor):
+    """1234.5 -> '1.234,50'"""
+    return f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+def gerar_transacoes(quantidade, semente=0, inicio=date(2025, 3, 1)):
+    """
+    Transações aleatórias, mas reproduzíveis pela semente, com origens
+    escritas de formas diferentes e datas em ordem crescente.
+    """
+    aleatorio = random.Random(semente)
+    dia = inicio
+    transacoes = []
+    for _ in range(quantidade):
+        dia += timedelta(days=aleatorio.random() < 0.3)
+        canonica = aleatorio.choice(list(ORIGENS))
+        tipo = 'credito' if aleatorio.random() < 0.3 else 'debito'
+        transacoes.append({
+            'tipo': tipo,
+            'valor': round(aleatorio.uniform(1, 2000 if tipo == 'credito' else 500), 2),
+            'origem': aleatorio.choice(ORIGENS[canonica]),
+            'data': dia.strftime('%d/%m/%Y'),
+            'prefixo': aleatorio.choice(PREFIXOS),
+        })
+    return transacoes
+
+def _texto_direita(page, x1, y, texto):
+    largura = fitz.get_text_length(texto, fontsize=TAMANHO_FONTE)
+    page.insert_text((x1 - largura, y), texto, fontsize=TAMANHO_FONTE)
+
+def _desenhar_pagina(page, transacoes, layout, numero, saldo):
+    page.insert_text((40, 60), "BANCO SINTETICO S.A.", fontsize=14)
+    page.insert_text((40, 80), "Extrato de conta corrente - Agencia 0001 Conta 12345-6", fontsize=9)
+    page.insert_text((40, 95), f"Pagina {numero}", fontsize=9)
+    if layout == 'colunas':
+        colunas = {'Debito': 400, 'Credito': 475, 'Saldo': 555}
+    else:
+        colunas = {'Valor': 460, 'Saldo': 555}
+    page.insert_text((40, TOPO_TABELA), "Data", fontsize=TAMANHO_FONTE)
+    page.insert_text((100, TOPO_TABELA), "Historico", fontsize=TAMANHO_FONTE)
+    for nome, x1 in colunas.items():
+        _texto_direita(page, x1, TOPO_TABELA, nome)
+
+    altura_linha = min(14, (BASE_TABELA - TOPO_TABELA) / max(len(transacoes), 1))
+    for i, transacao in enumerate(transacoes, start=1):
+        y = TOPO_TABELA + i * altura_linha
+        saldo += transacao['valor'] if transacao['tipo'] == 'credito' else -transacao['valor']
+        page.insert_text((40, y), transacao['data'], fontsize=TAMANHO_FONTE)
+        page.insert_text((100, y), f"{transacao['prefixo']} {transacao['origem']}", fontsize=TAMANHO_FONTE)
+        valor = _formatar_valor(transacao['valor'])
+        if layout == 'colunas':
+            _texto_direita(page, colunas['Debito' if transacao['tipo'] == 'debito' else 'Credito'], y, valor)
+        else:
+            _texto_direita(page, colunas['Valor'], y, f"+{valor}" if transacao['tipo'] == 'credito' else f"-{valor}")
+        _texto_direita(page, colunas['Saldo'], y, _formatar_valor(saldo))
+    return saldo
+
+def gerar_extrato(paginas=3, linhas_por_pagina=25, layout='sinal', semente=0):
+    """
+    PDF sintético de extrato bancário. Devolve (pdf_bytes, transacoes_por_pagina),
+    com as transações esperadas de cada página (tipo, valor, origem, data).
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Layout desconhecido: {layout}. Use um de {LAYOUTS}")
+    transacoes = gerar_transacoes(paginas * linhas_por_pagina, semente)
+    por_pagina = [transacoes[i:i + linhas_por_pagina] for i in range(0, len(transacoes), linhas_por_pagina)]
+
+    documento = fitz.open()
+    saldo = SALDO_INICIAL
+    for numero, transacoes_pagina in enumerate(por_pagina, start=1):
+        page = documento.new_page(width=LARGURA_PAGINA, height=ALTURA_PAGINA)
+        saldo = _desenhar_pagina(page, transacoes_pagina, 'sinal' if layout == 'escaneado' else layout, numero, saldo)
+
+    if layout == 'escaneado':
+        # Cada página vira só uma imagem, como um extrato impresso e escaneado
+        escaneado = fitz.open()
+        for page in documento:
+            pix = page.get_pixmap(dpi=DPI_ESCANEADO, colorspace=fitz.csGRAY, alpha=False)
+            nova = escaneado.new_page(width=page.rect.width, height=page.rect.height)
+            nova.insert_image(nova.rect, stream=pix.tobytes("png"))
+        documento.close()
+        documento = escaneado
+
+    pdf_bytes = documento.tobytes()
+    documento.close()
+    esperadas = [[{k: t[k] for k in ('tipo', 'valor', 'origem', 'data')} for t in pagina] for pagina in por_pagina]
+    return pdf_bytes, esperadas
+
+def saldos_paginas(esperadas, saldo_inicial=SALDO_INICIAL):
+    """(saldo inicial, saldo final) de cada página, a partir das transações esperadas."""
+    saldos = []
+    for transacoes in esperadas:
+        saldo_final = saldo_inicial + sum(t['valor'] if t['tipo'] == 'credito' else -t['valor'] for t in transacoes)
+        saldos.append((round(saldo_inicial, 2), round(saldo_final, 2)))
+        saldo_inicial = saldo_final
+    return saldos
+
+
+def _chave_imagem(imagem):
+    """Identifica a imagem pelo conteúdo (bytes ou data URL) ou pelo link."""
+    if isinstance(imagem, str):
+        if not imagem.startswith("data:"):
+            return imagem
+        imagem = base64.b64decode(imagem.split(",", 1)[1])
+    return hashlib.sha256(bytes(imagem)).hexdigest()
+
+class ModeloFalso:
+    """
+    Imitação determinística do ChatOpenAI para medir o pipeline sem chamar
+    a API. As imagens são registradas com as transações esperadas e o
+    modelo responde o CSV correspondente, depois de uma latência fixa mais
+    um tempo por token de saída e uma variação reproduzível. Segue o formato
+    das chamadas empacotadas (textos "Página N" e coluna pagina) e o formato
+    compacto, e respeita max_tokens, devolvendo finish_reason "length"
+    quando passa do limite. Com taxa_erros, essa fração das páginas volta
+    com o valor da primeira linha ilegível (para testar a cascata). Quando
+    o prompt pede os saldos, devolve os registrados com a página; com
+    taxa_divergencias, essa fração das páginas volta com o primeiro valor
+    errado, mas legível (para testar a conferência de saldos).
+    """
+
+    def __init__(self, latencia=0.0, latencia_por_token=0.0, variacao=0.0, semente=0, model_name="modelo-falso", taxa_erros=0.0, taxa_divergencias=0.0):
+        self.latencia = latencia
+        self.latencia_por_token = latencia_por_token
+        self.variacao = variacao
+        self.semente = semente
+        self.model_name = model_name
+        self.taxa_erros = taxa_erros
+        self.taxa_divergencias = taxa_divergencias
+        self.respostas = {}
+        self.saldos = {}
+
+    def registrar(self, imagem, transacoes, saldos=None):
+        """
+        Associa a imagem (ou link) às transações que o modelo deve devolver e,
+        opcionalmente, aos saldos (inicial, final) da página. Uma página em
+        vários recortes (lista) fica com as linhas e os saldos no primeiro.
+        """
+        partes = imagem if isinstance(imagem, (list, tuple)) else [imagem]
+        for i, parte in enumerate(partes):
+            self.respostas[_chave_imagem(parte)] = list(transacoes) if i == 0 else []
+            if saldos is not None and i == 0:
+                self.saldos[_chave_imagem(parte)] = saldos
+
+    def invoke(self, messages, max_tokens=None, **kwargs):
+        sistema = messages[0].content
+        partes = messages[-1].content
+        empacotada = any(parte["type"] == "text" for parte in partes)
+        compacta = "T;V;O;D" in sistema
+        com_saldos = "#saldo_inicial" in sistema
+        data_anterior = None
+        pagina = 1
+        linhas = []
+        linhas_saldo = []
+        tokens_entrada = len(sistema) // 4
+        for parte in partes:
+            if parte["type"] == "text":
+                pagina = int(parte["text"].split()[-1])
+                tokens_entrada += len(parte["text"]) // 4
+                continue
+            url = parte["image_url"]["url"]
+            if url.startswith("data:"):
+                largura, altura = Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))).size
+                tokens_entrada += estimar_tokens_imagem(largura, altura)
+            # Erro reproduzível: a mesma página sempre erra (ou acerta) neste modelo
+            chave = _chave_imagem(url)
+            errada = random.Random(f"{self.semente}:{self.model_name}:{chave}").random() < self.taxa_erros
+            divergente = random.Random(f"{self.semente}:{self.model_name}:{chave}:saldo").random() < self.taxa_divergencias
+            if com_saldos and chave in self.saldos:
+                sufixo = f":{pagina}" if empacotada else ""
+                saldo_inicial, saldo_final = self.saldos[chave]
+                linhas_saldo += [f"#saldo_inicial{sufixo}={saldo_inicial:.2f}", f"#saldo_final{sufixo}={saldo_final:.2f}"]
+            for numero, t in enumerate(self.respostas.get(chave, [])):
+                valor = "1O,5O" if errada and numero == 0 else f"{t['valor'] + (10 if divergente and numero == 0 else 0):.2f}"
+                if compacta:
+                    data = t['data'][:6] + t['data'][-2:]
+                    linha = f"{t['tipo'][0].upper()};{valor};{t['origem']};{'' if data == data_anterior else data}"
+                    data_anterior = data
+                    linhas.append(f"{pagina};{linha}" if empacotada else linha)
+                else:
+                    linha = f"{t['tipo']},{valor},{t['origem']},{t['data']}"
+                    linhas.append(f"{pagina},{linha}" if empacotada else linha)
+
+        if compacta:
+            cabecalho = "P;T;V;O;D" if empacotada else "T;V;O;D"
+        else:
+            cabecalho = "pagina,tipo,valor,origem, data" if empacotada else "tipo,valor,origem, data"
+        conteudo = "\n".join([cabecalho] + linhas + linhas_saldo)
+        tokens_saida = len(conteudo) // 4 + 1
+        finish_reason = "stop"
+        if max_tokens is not None and tokens_saida > max_tokens:
+            conteudo = conteudo[:max_tokens * 4]
+            tokens_saida = max_tokens
+            finish_reason = "length"
+
+        # Variação reproduzível: a mesma mensagem sempre demora o mesmo tempo
+        aleatorio = random.Random(f"{self.semente}:{conteudo}")
+        espera = self.latencia + self.latencia_por_token * tokens_saida
+        espera *= 1 + self.variacao * (2 * aleatorio.random() - 1)
+        if espera > 0:
+            time.sleep(espera)
+
+        return AIMessage(
+            content=conteudo,
+            usage_metadata={
+                "input_tokens": tokens_entrada,
+                "output_tokens": tokens_saida,
+                "total_tokens": tokens_entrada + tokens_saida,
+            },
+            response_metadata={"finish_reason": finish_reason, "model_name": self.model_name},
+        )
@@ -0,0 +1,250 @@
+import itertools
+import os
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# As bibliotecas do Google são importadas só no primeiro uso do Drive,
+# para não pesar no carregamento da página nem no envio em memória
+from renderizacao import tipo_imagem
+
+# Configurações googledrive
+SCOPES = ['https://www.googleapis.com/auth/drive.file']
+FOLDER_ID = "1kvWh4CxWZsmovOBZat7QzgY9kw26o7RE"  # Minha pasta
+
+# O Drive aceita no máximo 100 chamadas por requisição em lote
+TAMANHO_LOTE = 100
+MAX_UPLOADS_SIMULTANEOS = 8
+
+def authenticate():
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    creds = None
+    if os.path.exists('token.pickle'):
+        with open('token.pickle', 'rb') as token:
+            creds = pickle.load(token)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open('token.pickle', 'wb') as token:
+            pickle.dump(creds, token)
+    return creds
+
+class SessaoDrive:
+    """
+    Sessão de longa duração com o Google Drive: o cliente é construído uma
+    única vez, os uploads das páginas rodam em paralelo e as permissões e
+    remoções vão em requisições em lote.
+    """
+
+    def __init__(self, creds=None, service=None, max_uploads_simultaneos=MAX_UPLOADS_SIMULTANEOS):
+        if service is None:
+            from googleapiclient.discovery import build
+            service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+        self.creds = creds
+        self.service = service
+        self.max_uploads_simultaneos = max_uploads_simultaneos
+        self._local = threading.local()
+
+    def _http(self):
+        """
+        O httplib2 não é thread-safe, então cada thread usa sua própria
+        conexão autorizada. Sem credenciais (ex.: DriveFalso) usa a do serviço.
+        """
+        if self.creds is None:
+            return None
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _executar_em_lote(self, requisicoes):
+        """
+        Executa as requisições em lotes de até TAMANHO_LOTE chamadas.
+        Recebe um dicionário {request_id: requisição} e devolve
+        {request_id: exceção} das que falharam.
+        """
+        falhas = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                falhas[request_id] = exception
+
+        itens = list(requisicoes.items())
+        for inicio in range(0, len(itens), TAMANHO_LOTE):
+            lote = self.service.new_batch_http_request(callback=callback)
+            for request_id, requisicao in itens[inicio:inicio + TAMANHO_LOTE]:
+                lote.add(requisicao, request_id=request_id)
+            lote.execute(http=self._http())
+        return falhas
+
+    def _enviar_arquivo(self, nome, conteudo, folder_id, mimetype):
+        file_metadata = {
+            'name': nome,
+            'parents': [folder_id]
+        }
+        from googleapiclient.http import MediaInMemoryUpload
+        media = MediaInMemoryUpload(conteudo, mimetype=mimetype)
+        file = self.service.files().create(body=file_metadata, media_body=media, fields='id').execute(http=self._http())
+        return file.get('id')
+
+    def enviar_paginas(self, imagens, folder_id=FOLDER_ID, file_ids=None):
+        """
+        Envia os bytes das imagens das páginas em paralelo, torna todos públicos com
+        uma requisição em lote e devolve os links na ordem das páginas.
+        Os IDs criados são acrescentados em file_ids assim que cada upload
+        termina, para que a limpeza alcance até uploads parciais.
+        """
+        if file_ids is None:
+            file_ids = []
+
+        def enviar(indice_imagem):
+            indice, conteudo = indice_imagem
+            mimetype = tipo_imagem(conteudo)
+            file_id = self._enviar_arquivo(f"pagina_{indice + 1}.{mimetype.split('/')[1]}", conteudo, folder_id, mimetype)
+            file_ids.append(file_id)
+            return file_id
+
+        n_workers = max(1, min(self.max_uploads_simultaneos, len(imagens)))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            ids_paginas = list(executor.map(enviar, enumerate(imagens)))
+
+        # Torna os arquivos públicos
+        permission = {
+            'type': 'anyone',
+            'role': 'reader'
+        }
+        falhas = self._executar_em_lote({
+            file_id: self.service.permissions().create(fileId=file_id, body=permission)
+            for file_id in ids_paginas
+        })
+        if falhas:
+            raise RuntimeError(f"Não foi possível tornar públicos os arquivos {list(falhas)}")
+
+        # Gera os links públicos
+        return [f"https://drive.google.com/uc?id={file_id}" for file_id in ids_paginas]
+
+    def deletar_arquivos(self, file_ids):
+        """
+        Remove os arquivos em lote e devolve {file_id: exceção} dos que falharam.
+        """
+        return self._executar_em_lote({
+            file_id: self.service.files().delete(fileId=file_id)
+            for file_id in file_ids
+        })
+
+    @contextmanager
+    def paginas_publicas(self, imagens, folder_id=FOLDER_ID, ao_falhar_remocao=None):
+        """
+        Publica as páginas e entrega os links; ao sair do bloco os arquivos
+        são removidos do Drive, mesmo que a extração tenha falhado.
+        ao_falhar_remocao(file_id, exceção) é chamado para cada remoção que falhar.
+        """
+        file_ids = []
+        try:
+            yield self.enviar_paginas(imagens, folder_id, file_ids)
+        finally:
+            falhas = self.deletar_arquivos(file_ids)
+            if ao_falhar_remocao is not None:
+                for file_id, erro in falhas.items():
+                    ao_falhar_remocao(file_id, erro)
+
+
+class _RequisicaoFalsa:
+    def __init__(self, drive, funcao):
+        self.drive = drive
+        self.funcao = funcao
+
+    def execute(self, http=None, num_retries=0):
+        with self.drive._lock:
+            self.drive.chamadas_http += 1
+        return self.funcao()
+
+
+class _LoteFalso:
+    def __init__(self, drive, callback):
+        self.drive = drive
+        self.callback = callback
+        self.requisicoes = []
+
+    def add(self, requisicao, request_id=None):
+        self.requisicoes.append((request_id, requisicao))
+
+    def execute(self, http=None):
+        with self.drive._lock:
+            self.drive.chamadas_http += 1
+        for request_id, requisicao in self.requisicoes:
+            try:
+                resposta = requisicao.funcao()
+            except Exception as e:
+                self.callback(request_id, None, e)
+            else:
+                self.callback(request_id, resposta, None)
+
+
+class _ArquivosFalsos:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def create(self, body, media_body=None, fields=None):
+        def criar():
+            with self.drive._lock:
+                file_id = f"falso{next(self.drive._ids)}"
+                conteudo = media_body.getbytes(0, media_body.size()) if media_body is not None else b""
+                self.drive.arquivos[file_id] = {'nome': body.get('name'), 'conteudo': conteudo, 'publico': False}
+            return {'id': file_id}
+        return _RequisicaoFalsa(self.drive, criar)
+
+    def delete(self, fileId):
+        def deletar():
+            with self.drive._lock:
+                if fileId not in self.drive.arquivos:
+                    raise KeyError(f"Arquivo {fileId} não encontrado")
+                del self.drive.arquivos[fileId]
+            return ""
+        return _RequisicaoFalsa(self.drive, deletar)
+
+
+class _PermissoesFalsas:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def create(self, fileId, body):
+        def criar():
+            with self.drive._lock:
+                if fileId not in self.drive.arquivos:
+                    raise KeyError(f"Arquivo {fileId} não encontrado")
+                self.drive.arquivos[fileId]['publico'] = body.get('type') == 'anyone'
+            return {'id': 'anyoneWithLink'}
+        return _RequisicaoFalsa(self.drive, criar)
+
+
+class DriveFalso:
+    """
+    Imitação em memória do serviço Drive v3, com o subconjunto usado pela
+    SessaoDrive. Conta as chamadas HTTP que seriam feitas, o que permite
+    verificar o uso de lotes sem rede: SessaoDrive(service=DriveFalso()).
+    """
+
+    def __init__(self):
+        self.arquivos = {}
+        self.chamadas_http = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def files(self):
+        return _ArquivosFalsos(self)
+
+    def permissions(self):
+        return _PermissoesFalsas(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _LoteFalso(self, callback)
@@ -0,0 +1,218 @@
+import csv
+import io
+import re
+
+import pandas as pd
+
+from camada_texto import _sem_acento
+
+COLUNAS = ['tipo', 'valor', 'origem', 'data']
+
+# Formato compacto da resposta: tipo em uma letra, campos separados por ";"
+# e data vazia quando repete a da linha anterior
+CABECALHO_COMPACTO = ['t', 'v', 'o', 'd']
+TIPOS_COMPACTOS = {'D': 'debito', 'C': 'credito'}
+
+# Tipos aceitos na resposta do modelo (sem acento, minúsculos)
+TIPOS_ACEITOS = {'credito': 'credito', 'c': 'credito', 'debito': 'debito', 'd': 'debito'}
+
+RE_MILHAR = re.compile(r"-?\d{1,3}(\.\d{3})*")
+RE_CENTAVOS = re.compile(r"\d{2}")
+RE_GRUPO_MILHAR = re.compile(r"\d{3}(\.\d{1,2})?")
+RE_INTEIRO = re.compile(r"-?\d+")
+
+# Linhas de saldo pedidas na conferência de saldos: "#saldo_inicial=1000.00",
+# com ":N" depois do nome nas chamadas empacotadas (N = página no lote)
+RE_SALDO = re.compile(r"^\s*#\s*(saldo_(?:inicial|final))\s*(?::\s*(\d+))?\s*=\s*(.*?)\s*$", re.IGNORECASE)
+SALDOS = ['saldo_inicial', 'saldo_final']
+
+def _campos(linha):
+    return next(csv.reader([linha]), [])
+
+def _eh_cabecalho(campos):
+    return [_sem_acento(campo).strip() for campo in campos] == COLUNAS
+
+def _separar_colunas(campos):
+    """
+    Quatro colunas a partir dos campos da linha, ou None. Vírgulas sem
+    aspas na origem são juntadas de volta, assim como valores sem aspas
+    ("1.234,56" chega como "1.234" e "56", "1,234.56" como "1" e "234.56").
+    Quando o valor ainda é um inteiro sem separadores seguido de um campo só
+    com dígitos ("1234" e "56") não dá para saber onde ele termina: None.
+    """
+    if len(campos) == 4:
+        return campos
+    if len(campos) < 4:
+        return None
+    tipo, valor, *meio, data = campos
+    if RE_MILHAR.fullmatch(valor.strip()):
+        if RE_CENTAVOS.fullmatch(meio[0].strip()):
+            valor += "," + meio.pop(0)
+        else:
+            while len(meio) >= 2 and RE_GRUPO_MILHAR.fullmatch(meio[0].strip()):
+                valor += "," + meio.pop(0)
+    if RE_INTEIRO.fullmatch(valor.strip()) and meio[0].strip().isdigit():
+        return None
+    return [tipo, valor, ",".join(meio), data]
+
+def _eh_cabecalho_compacto(linha, cabecalho):
+    return [campo.strip().lower() for campo in linha.split(';')] == cabecalho
+
+def expandir_compacto(texto, com_pagina=False):
+    """
+    Converte a resposta no formato compacto (T;V;O;D, ou P;T;V;O;D nas
+    chamadas empacotadas) para o CSV padrão, com os tipos por extenso e as
+    datas omitidas repetidas da linha anterior. Linhas com campos de menos
+    passam como estão, para serem rejeitadas na leitura.
+    """
+    cabecalho = (['p'] if com_pagina else []) + CABECALHO_COMPACTO
+    linhas = texto.splitlines()
+    inicio = next((i + 1 for i, linha in enumerate(linhas) if _eh_cabecalho_compacto(linha, cabecalho)), 0)
+
+    saida = io.StringIO()
+    escritor = csv.writer(saida, lineterminator="\n")
+    escritor.writerow((['pagina'] if com_pagina else []) + ['tipo', 'valor', 'origem', ' data'])
+    data_anterior = ""
+    for linha in linhas[inicio:]:
+        if not linha.strip() or linha.strip().startswith('```') or _eh_cabecalho_compacto(linha, cabecalho):
+            continue
+        campos = linha.split(';')
+        if len(campos) < len(cabecalho):
+            escritor.writerow([linha])
+            continue
+        # Ponto e vírgula na origem
+        campos = campos[:len(cabecalho) - 2] + [';'.join(campos[len(cabecalho) - 2:-1]), campos[-1]]
+        *pagina, tipo, valor, origem, data = [campo.strip() for campo in campos]
+        data = data or data_anterior
+        data_anterior = data
+        escritor.writerow(pagina + [TIPOS_COMPACTOS.get(tipo.upper(), tipo), valor, origem, data])
+    return saida.getvalue()
+
+def separar_saldos(texto):
+    """
+    Tira da resposta as linhas de saldo (#saldo_inicial=..., #saldo_final=...).
+    Devolve (texto sem elas, saldos), com saldos[pagina] = {nome: texto do
+    valor}; pagina é o N das chamadas empacotadas, ou None.
+    """
+    linhas = []
+    saldos = {}
+    for linha in texto.splitlines():
+        match = RE_SALDO.match(linha)
+        if match is None:
+            linhas.append(linha)
+            continue
+        nome, pagina, valor = match.groups()
+        saldos.setdefault(int(pagina) if pagina else None, {})[nome.lower()] = valor
+    return "\n".join(linhas) + "\n", saldos
+
+def linhas_saldos(saldos):
+    """Linhas de saldo de uma página ({nome: texto do valor}), no formato sem número de página."""
+    return "".join(f"#{nome}={saldos[nome]}\n" for nome in SALDOS if nome in saldos)
+
+def ler_saldos(saldos):
+    """Saldos da página em reais (negativos com sinal); None quando faltam ou não dá para ler."""
+    textos = pd.Series([saldos.get(nome) or '' for nome in SALDOS], dtype='string')
+    valores, negativo = _ler_valores(textos)
+    return {
+        nome: None if pd.isna(valor) else float(-valor if neg else valor)
+        for nome, valor, neg in zip(SALDOS, valores, negativo)
+    }
+
+def _ler_tipos(tipos):
+    sem_acento = tipos.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    return sem_acento.str.strip().str.lower().map(TIPOS_ACEITOS)
+
+def _ler_valores(valores):
+    """
+    Converte os valores nos formatos brasileiro (1.234,56) e americano
+    (1,234.56 ou 1234.56). O separador decimal é o último que aparece;
+    só pontos (1.234) ou só vírgulas (1,234, como _separar_colunas junta
+    os grupos) em grupos de três são milhares. Vírgula decimal seguida de
+    três dígitos (1.234,567) não é valor em reais: NaN. Devolve os valores
+    absolutos (NaN quando não dá para ler) e se o valor tinha sinal negativo.
+    """
+    texto = valores.str.replace(r"R\$|\s", "", regex=True)
+    negativo = texto.str.startswith('-') | (texto.str.startswith('(') & texto.str.endswith(')'))
+    texto = texto.str.strip('-+()')
+    milhar_virgula = texto.str.fullmatch(r"[1-9]\d{0,2}(,\d{3})+")
+    decimal_virgula = (texto.str.rfind(',') > texto.str.rfind('.')) & ~milhar_virgula
+    milhar_ponto = texto.str.fullmatch(r"\d{1,3}(\.\d{3})+")
+    brasileiro = texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    americano = texto.str.replace(',', '', regex=False)
+    normalizado = brasileiro.where(decimal_virgula | milhar_ponto, americano)
+    legivel = normalizado.str.fullmatch(r"\d+(\.\d+)?") & ~(decimal_virgula & texto.str.contains(r",\d{3}$"))
+    numeros = pd.to_numeric(normalizado.where(legivel), errors='coerce')
+    return numeros, negativo
+
+def _ler_datas(datas):
+    """Datas dd/mm/aaaa, dd/mm/aa e aaaa-mm-dd (com /, - ou . como separador)."""
+    texto = datas.str.strip().str.replace(r"[.\-]", "/", regex=True)
+    convertidas = pd.to_datetime(texto, format='%d/%m/%Y', errors='coerce')
+    for formato in ('%d/%m/%y', '%Y/%m/%d'):
+        faltantes = convertidas.isna()
+        if not faltantes.any():
+            break
+        convertidas[faltantes] = pd.to_datetime(texto[faltantes], format=formato, errors='coerce')
+    return convertidas
+
+def ler_csv_pagina(texto):
+    """
+    Lê o CSV devolvido pelo modelo para uma página. Ignora o que vier antes
+    do cabeçalho (explicações do modelo), cabeçalhos repetidos, linhas em
+    branco e cercas de markdown. Devolve (df, rejeitadas): df com as colunas
+    tipo, valor (float, sempre positivo), origem e data (dd/mm/aaaa), e
+    rejeitadas com a linha original e o motivo das que não puderam ser lidas,
+    em vez de virarem zero.
+    """
+    linhas = texto.splitlines()
+    inicio = next((i + 1 for i, linha in enumerate(linhas) if _eh_cabecalho(_campos(linha))), 0)
+
+    registros = []
+    originais = []
+    rejeitadas = []
+    for linha in linhas[inicio:]:
+        if not linha.strip() or linha.strip().startswith('```'):
+            continue
+        campos = _campos(linha)
+        if _eh_cabecalho(campos):
+            continue
+        colunas = _separar_colunas(campos)
+        if colunas is None:
+            rejeitadas.append({'linha': linha, 'motivo': 'colunas'})
+            continue
+        registros.append([campo.strip() for campo in colunas])
+        originais.append(linha)
+
+    df = pd.DataFrame(registros, columns=COLUNAS, dtype='string')
+    valores, negativo = _ler_valores(df['valor'])
+    # Sem tipo, um valor negativo ainda indica débito
+    tipos = _ler_tipos(df['tipo']).where(lambda t: t.notna() | ~negativo, 'debito')
+    datas = _ler_datas(df['data'])
+
+    motivo = pd.Series(pd.NA, index=df.index, dtype='string')
+    motivo = motivo.mask(datas.isna(), 'data').mask(valores.isna(), 'valor').mask(tipos.isna(), 'tipo')
+    invalidas = motivo.notna()
+    rejeitadas.extend(
+        {'linha': originais[i], 'motivo': motivo[i]} for i in invalidas[invalidas].index
+    )
+
+    validas = ~invalidas
+    resultado = pd.DataFrame({
+        'tipo': tipos[validas].astype(str),
+        'valor': valores[validas].astype(float),
+        'origem': df['origem'][validas].fillna('').astype(str),
+        'data': datas[validas].dt.strftime('%d/%m/%Y'),
+    }).reset_index(drop=True)
+    return resultado, pd.DataFrame(rejeitadas, columns=['linha', 'motivo'])
+
+def validar_pagina(df, rejeitadas):
+    """
+    Confere a leitura da resposta do modelo para uma página: devolve o
+    motivo da reprovação ('leitura' se alguma linha não pôde ser lida,
+    'vazia' se nenhuma transação foi extraída) ou None se passou.
+    """
+    if not rejeitadas.empty:
+        return 'leitura'
+    if df.empty:
+        return 'vazia'
+    return None
@@ -0,0 +1,238 @@
+"""
+Processamento em lote, sem o Streamlit: percorre um diretório de extratos
+em PDF, processa os arquivos em paralelo com o mesmo núcleo do streamapp.py
+(camada de texto, recorte, modelo, normalização) e grava, para cada extrato,
+as transações em CSV e o resumo em JSON. O progresso vai para um diário
+JSONL; rodando de novo, os extratos já concluídos são pulados.
+
+    python lote.py extratos/ resultados/ --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from metricas import EstatisticasExtrato
+from modelo import MAX_PAGINAS_SIMULTANEAS, analisar_extrato_por_links, paginas_do_pdf
+from renderizacao import CORES_PADRAO, DPI_PADRAO, FORMATO_PADRAO, QUALIDADE_PADRAO
+from transacoes import resumir_transacoes
+
+NOME_DIARIO = "diario.jsonl"
+NOME_RESUMO = "resumo_lote.csv"
+MAX_EXTRATOS_SIMULTANEOS = 4
+
+class Diario:
+    """
+    Diário JSONL do lote: uma linha por extrato processado (ou que falhou),
+    gravada e sincronizada no disco assim que o extrato termina, para que
+    uma execução interrompida retome de onde parou.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self.registros = {}
+        if self.caminho.exists():
+            with open(self.caminho, encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    try:
+                        registro = json.loads(linha)
+                    except json.JSONDecodeError:
+                        # Última linha cortada por uma interrupção no meio da gravação
+                        continue
+                    self.registros[registro['arquivo']] = registro
+
+    def concluido(self, arquivo, sha256):
+        registro = self.registros.get(arquivo)
+        return registro is not None and registro['status'] == 'ok' and registro['sha256'] == sha256
+
+    def registrar(self, registro):
+        with self._lock:
+            self.registros[registro['arquivo']] = registro
+            with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+
+def _sha256(caminho, tamanho_bloco=1024 * 1024):
+    # Em blocos, sem hashlib.file_digest (só existe a partir do Python 3.11)
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def listar_pdfs(diretorio):
+    """PDFs do diretório e subdiretórios, em ordem, como caminhos relativos."""
+    diretorio = Path(diretorio)
+    return sorted(
+        caminho.relative_to(diretorio) for caminho in diretorio.rglob('*')
+        if caminho.is_file() and caminho.suffix.lower() == '.pdf'
+    )
+
+def _tabela_saida(df):
+    """Transações em reais e datas dd/mm/aaaa, como o usuário vê na tela."""
+    return pd.DataFrame({
+        'tipo': df['tipo'].astype(str),
+        'valor': df['valor_centavos'] / 100,
+        'origem': df['origem'].astype(str),
+        'data': df['data'].dt.strftime('%d/%m/%Y'),
+    })
+
+def processar_extrato(caminho_pdf, destino, opcoes):
+    """
+    Processa um extrato e grava destino.csv (transações) e destino.json
+    (totais, origens mais frequentes, estatísticas, linhas rejeitadas,
+    transações repetidas entre páginas, páginas que não foram ao modelo por
+    não terem movimentações e, com --conciliar, a conferência de saldos de
+    cada página).
+    Devolve o resumo que vai para o diário.
+    """
+    pdf_bytes = Path(caminho_pdf).read_bytes()
+    estatisticas = EstatisticasExtrato()
+    with estatisticas.etapa('renderizacao'):
+        paginas, _ = paginas_do_pdf(
+            pdf_bytes, opcoes.camada_texto, opcoes.recortar, opcoes.filtrar,
+            dpi=opcoes.dpi, cores=opcoes.cores, formato=opcoes.formato, qualidade=opcoes.qualidade
+        )
+    total_credito, total_debito, total_liquido, df, *_ = analisar_extrato_por_links(
+        paginas,
+        max_paginas_simultaneas=opcoes.max_paginas_simultaneas,
+        usar_cache=opcoes.cache,
+        empacotar_paginas=opcoes.empacotar,
+        estatisticas=estatisticas,
+        saida_compacta=opcoes.compacta,
+        conciliar_saldos=opcoes.conciliar,
+    )
+
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    _tabela_saida(df).to_csv(destino.with_suffix('.csv'), index=False)
+    resumo_transacoes = resumir_transacoes(df)
+    resumo = {
+        'paginas': len(paginas),
+        'transacoes': len(df),
+        'total_credito': total_credito,
+        'total_debito': total_debito,
+        'total_liquido': total_liquido,
+        'origem_credito': resumo_transacoes['origem_credito'],
+        'soma_origem_credito': resumo_transacoes['soma_origem_credito'] / 100,
+        'origem_debito': resumo_transacoes['origem_debito'],
+        'soma_origem_debito': resumo_transacoes['soma_origem_debito'] / 100,
+        'estatisticas': estatisticas.resumo(),
+    }
+    with open(destino.with_suffix('.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            **resumo, 'linhas_rejeitadas': estatisticas.rejeitadas, 'linhas_duplicadas': estatisticas.duplicadas,
+            'paginas_ignoradas': estatisticas.ignoradas, 'conciliacao': estatisticas.conciliacao,
+        }, arquivo, ensure_ascii=False, indent=1)
+    return resumo
+
+def gravar_resumo_lote(diario, caminho):
+    """Uma linha por extrato, com o último registro de cada um no diário."""
+    linhas = []
+    for registro in diario.registros.values():
+        estatisticas = registro.get('estatisticas', {})
+        linhas.append({
+            'arquivo': registro['arquivo'],
+            'status': registro['status'],
+            'paginas': registro.get('paginas'),
+            'transacoes': registro.get('transacoes'),
+            'total_credito': registro.get('total_credito'),
+            'total_debito': registro.get('total_debito'),
+            'total_liquido': registro.get('total_liquido'),
+            'chamadas': estatisticas.get('chamadas'),
+            'total_tokens': estatisticas.get('total_tokens'),
+            'preco_total': estatisticas.get('preco_total'),
+            'linhas_rejeitadas': estatisticas.get('linhas_rejeitadas'),
+            'linhas_duplicadas': estatisticas.get('linhas_duplicadas'),
+            'paginas_ignoradas': estatisticas.get('paginas_ignoradas'),
+            'chamadas_evitadas': estatisticas.get('chamadas_evitadas'),
+            'paginas_sem_conciliacao': estatisticas.get('paginas_sem_conciliacao'),
+            'segundos': registro.get('segundos'),
+            'erro': registro.get('erro', ''),
+        })
+    df = pd.DataFrame(linhas).sort_values('arquivo')
+    # Contagens sem NaN de float nas linhas dos extratos que falharam
+    for coluna in ['paginas', 'transacoes', 'chamadas', 'total_tokens', 'linhas_rejeitadas', 'linhas_duplicadas', 'paginas_ignoradas', 'chamadas_evitadas', 'paginas_sem_conciliacao']:
+        df[coluna] = df[coluna].astype('Int64')
+    df.to_csv(caminho, index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa em lote um diretório de extratos em PDF.")
+    parser.add_argument('entrada', help="diretório com os PDFs (inclui subdiretórios)")
+    parser.add_argument('saida', help="diretório dos resultados, do diário e do resumo do lote")
+    parser.add_argument('--workers', type=int, default=MAX_EXTRATOS_SIMULTANEOS, help="extratos processados ao mesmo tempo")
+    parser.add_argument('--max-paginas-simultaneas', type=int, default=MAX_PAGINAS_SIMULTANEAS, help="páginas no modelo ao mesmo tempo, por extrato")
+    parser.add_argument('--diario', help=f"diário JSONL (padrão: SAIDA/{NOME_DIARIO})")
+    parser.add_argument('--sem-camada-texto', dest='camada_texto', action='store_false', help="manda todas as páginas ao modelo")
+    parser.add_argument('--sem-filtro', dest='filtrar', action='store_false', help="manda ao modelo também as páginas sem movimentações")
+    parser.add_argument('--sem-recorte', dest='recortar', action='store_false', help="envia a página inteira, sem recortar a tabela")
+    parser.add_argument('--sem-cache', dest='cache', action='store_false', help="ignora o cache de páginas")
+    parser.add_argument('--empacotar', action='store_true', help="várias páginas por chamada ao modelo")
+    parser.add_argument('--compacta', action='store_true', help="resposta compacta do modelo")
+    parser.add_argument('--conciliar', action='store_true', help="confere os saldos de cada página e reenvia as que não fecham")
+    parser.add_argument('--dpi', type=int, default=DPI_PADRAO)
+    parser.add_argument('--cores', default=CORES_PADRAO, choices=['cinza', 'colorido', 'paleta'])
+    parser.add_argument('--formato', default=FORMATO_PADRAO, choices=['png', 'jpeg', 'webp'])
+    parser.add_argument('--qualidade', type=int, default=QUALIDADE_PADRAO)
+    opcoes = parser.parse_args()
+
+    entrada = Path(opcoes.entrada)
+    saida = Path(opcoes.saida)
+    saida.mkdir(parents=True, exist_ok=True)
+    diario = Diario(opcoes.diario or saida / NOME_DIARIO)
+
+    pendentes = []
+    for relativo in listar_pdfs(entrada):
+        sha256 = _sha256(entrada / relativo)
+        if not diario.concluido(relativo.as_posix(), sha256):
+            pendentes.append((relativo, sha256))
+    total = len(pendentes)
+    print(f"{total} extratos a processar ({len(diario.registros)} no diário)")
+
+    def processar(relativo, sha256):
+        inicio = time.perf_counter()
+        registro = {'arquivo': relativo.as_posix(), 'sha256': sha256}
+        try:
+            resumo = processar_extrato(entrada / relativo, saida / relativo, opcoes)
+        except Exception as erro:
+            registro.update(status='erro', erro=f"{type(erro).__name__}: {erro}")
+        else:
+            registro.update(status='ok', **resumo)
+        registro['segundos'] = round(time.perf_counter() - inicio, 3)
+        registro['data'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        diario.registrar(registro)
+        return registro
+
+    falhas = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, opcoes.workers))
+    try:
+        futuros = [executor.submit(processar, relativo, sha256) for relativo, sha256 in pendentes]
+        for feitos, futuro in enumerate(as_completed(futuros), start=1):
+            registro = futuro.result()
+            if registro['status'] == 'ok':
+                print(f"[{feitos}/{total}] {registro['arquivo']}: {registro['paginas']} páginas, "
+                      f"{registro['transacoes']} transações, {registro['segundos']:.1f} s")
+            else:
+                falhas += 1
+                print(f"[{feitos}/{total}] {registro['arquivo']}: ERRO {registro['erro']}", file=sys.stderr)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print("\nInterrompido. Rode o mesmo comando para continuar de onde parou.", file=sys.stderr)
+        sys.exit(130)
+    executor.shutdown()
+
+    gravar_resumo_lote(diario, saida / NOME_RESUMO)
+    print(f"Concluído: {total - falhas} ok, {falhas} com erro. Resumo em {saida / NOME_RESUMO}")
+    sys.exit(1 if falhas else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import json
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Preços do gpt-4.1-mini, em dólares por milhão de tokens
+PRECO_ENTRADA_MILHAO = 0.40
+PRECO_SAIDA_MILHAO = 1.60
+# Preços (entrada, saída) dos modelos da cascata, pelo início do nome;
+# modelos fora da lista usam os do gpt-4.1-mini
+PRECOS_MODELOS = {
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4.1-mini': (PRECO_ENTRADA_MILHAO, PRECO_SAIDA_MILHAO),
+    'gpt-4.1': (2.00, 8.00),
+    'o4-mini': (1.10, 4.40),
+}
+
+# Etapas medidas no processamento de um extrato
+ETAPAS = ['renderizacao', 'envio', 'inferencia', 'leitura', 'conciliacao', 'duplicatas', 'normalizacao', 'limpeza']
+
+def _preco_chamada(chamada):
+    """Preço de uma chamada em dólares, pelo modelo que a atendeu."""
+    modelo = chamada.get('modelo') or ''
+    # O prefixo mais longo primeiro, para gpt-4.1-mini não cair em gpt-4.1
+    prefixo = max((p for p in PRECOS_MODELOS if modelo.startswith(p)), key=len, default=None)
+    entrada, saida = PRECOS_MODELOS[prefixo] if prefixo else (PRECO_ENTRADA_MILHAO, PRECO_SAIDA_MILHAO)
+    return chamada['input_tokens'] * entrada / 1000000 + chamada['output_tokens'] * saida / 1000000
+
+class EstatisticasExtrato:
+    """
+    Estatísticas de um extrato: uso de tokens, latência de cada chamada ao
+    modelo e tempo de relógio de cada etapa. Pode ser alimentada por várias
+    threads ao mesmo tempo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inicio = time.perf_counter()
+        self.chamadas = []
+        self.etapas = defaultdict(float)
+        self.paginas = defaultdict(int)
+        self.rejeitadas = []
+        self.duplicadas = []
+        self.conciliacao = []
+        self.ignoradas = []
+        self.validacoes = []
+        self.saidas_compactas = []
+
+    def registrar_chamada(self, response, segundos, paginas=1, modelo=None, nivel=0, descartada=False):
+        """
+        Guarda o usage_metadata e a latência de uma chamada ao modelo (nivel
+        da cascata). descartada marca a chamada que perdeu um hedge: entra
+        nos tokens e no preço, mas não nas latências.
+        """
+        uso = getattr(response, 'usage_metadata', None) or {}
+        chamada = {
+            'modelo': modelo,
+            'nivel': nivel,
+            'paginas': paginas,
+            'input_tokens': int(uso.get('input_tokens', 0)),
+            'output_tokens': int(uso.get('output_tokens', 0)),
+            'segundos': segundos,
+            'descartada': descartada,
+        }
+        with self._lock:
+            self.chamadas.append(chamada)
+
+    def registrar_saida_compacta(self, response, texto_compacto, texto_padrao, paginas=1):
+        """
+        Estima quantos tokens de saída a resposta teria no CSV padrão,
+        proporcionalmente ao tamanho do texto expandido.
+        """
+        uso = getattr(response, 'usage_metadata', None) or {}
+        tokens = int(uso.get('output_tokens', 0))
+        with self._lock:
+            self.saidas_compactas.append({
+                'paginas': paginas,
+                'output_tokens': tokens,
+                'output_tokens_padrao': round(tokens * len(texto_padrao) / max(len(texto_compacto), 1)),
+            })
+
+    def registrar_validacao(self, nivel, modelo, motivo=None):
+        """Resultado da validação de uma página no nível da cascata (motivo None = aprovada)."""
+        with self._lock:
+            self.validacoes.append({'nivel': nivel, 'modelo': modelo, 'motivo': motivo})
+
+    def contar_paginas(self, origem, quantidade=1):
+        """Conta as páginas por origem do resultado: modelo, cache, texto ou ignorada (e cache_reprovada)."""
+        with self._lock:
+            self.paginas[origem] += quantidade
+
+    def registrar_ignorada(self, indice, motivo):
+        """Página (indice, a partir de 0) que o filtro tirou do modelo por não ter movimentações."""
+        with self._lock:
+            self.paginas['ignorada'] += 1
+            self.ignoradas.append({'pagina': indice + 1, 'motivo': motivo})
+
+    def registrar_rejeitadas(self, indice, rejeitadas):
+        """Guarda as linhas da resposta que não puderam ser lidas (página indice, a partir de 0)."""
+        linhas = [{'pagina': indice + 1, **linha} for linha in rejeitadas.to_dict('records')]
+        if linhas:
+            with self._lock:
+                self.rejeitadas.extend(linhas)
+
+    def registrar_duplicadas(self, removidas):
+        """Guarda as transações removidas por repetirem outra página ou outro extrato."""
+        linhas = removidas.astype({'valor': float, 'data': str}).to_dict('records')
+        if linhas:
+            with self._lock:
+                self.duplicadas.extend(linhas)
+
+    def registrar_conciliacao(self, relatorio):
+        """Guarda a conferência de saldos das páginas (uma linha por página, com a situação)."""
+        with self._lock:
+            self.conciliacao = relatorio.astype(object).where(relatorio.notna(), None).to_dict('records')
+
+    def adicionar_etapa(self, nome, segundos):
+        with self._lock:
+            self.etapas[nome] += segundos
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o tempo de relógio do bloco e soma na etapa."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.adicionar_etapa(nome, time.perf_counter() - inicio)
+
+    @contextmanager
+    def medir_contexto(self, gerenciador, etapa_entrada, etapa_saida):
+        """
+        Entra em outro gerenciador de contexto medindo a entrada e a saída
+        em etapas separadas (ex.: envio e limpeza dos arquivos do Drive).
+        """
+        with self.etapa(etapa_entrada):
+            valor = gerenciador.__enter__()
+        try:
+            yield valor
+        except BaseException:
+            with self.etapa(etapa_saida):
+                if not gerenciador.__exit__(*sys.exc_info()):
+                    raise
+        else:
+            with self.etapa(etapa_saida):
+                gerenciador.__exit__(None, None, None)
+
+    @property
+    def input_tokens(self):
+        return sum(c['input_tokens'] for c in self.chamadas)
+
+    @property
+    def output_tokens(self):
+        return sum(c['output_tokens'] for c in self.chamadas)
+
+    @property
+    def total_tokens(self):
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def preco_total(self):
+        return sum(_preco_chamada(c) for c in self.chamadas)
+
+    def _niveis(self):
+        """Por nível da cascata: páginas validadas, aprovadas, motivos das reprovações, chamadas e latência."""
+        niveis = {}
+        for validacao in self.validacoes:
+            nivel = niveis.setdefault(validacao['nivel'], {'modelo': validacao['modelo'], 'paginas': 0, 'aprovadas': 0, 'motivos': defaultdict(int)})
+            nivel['paginas'] += 1
+            if validacao['motivo'] is None:
+                nivel['aprovadas'] += 1
+            else:
+                nivel['motivos'][validacao['motivo']] += 1
+        resultado = []
+        for numero, nivel in sorted(niveis.items()):
+            chamadas = [c for c in self.chamadas if c['nivel'] == numero]
+            latencias = [c['segundos'] for c in chamadas if not c['descartada']]
+            resultado.append({
+                'nivel': numero,
+                'modelo': nivel['modelo'],
+                'paginas': nivel['paginas'],
+                'aprovadas': nivel['aprovadas'],
+                'taxa_aprovacao': round(nivel['aprovadas'] / nivel['paginas'], 3),
+                'motivos': dict(nivel['motivos']),
+                'chamadas': len(chamadas),
+                'latencia_media': round(statistics.fmean(latencias), 4) if latencias else 0.0,
+                'preco': round(sum(_preco_chamada(c) for c in chamadas), 6),
+            })
+        return resultado
+
+    def resumo(self):
+        """Dicionário com os totais, pronto para exibir ou gravar."""
+        with self._lock:
+            latencias = [c['segundos'] for c in self.chamadas if not c['descartada']]
+            descartadas = sum(c['descartada'] for c in self.chamadas)
+            etapas = {nome: round(self.etapas.get(nome, 0.0), 4) for nome in ETAPAS}
+            etapas.update({nome: round(s, 4) for nome, s in self.etapas.items() if nome not in etapas})
+            paginas = dict(self.paginas)
+            rejeitadas = len(self.rejeitadas)
+            duplicadas = len(self.duplicadas)
+            situacoes = [pagina['situacao'] for pagina in self.conciliacao]
+            reconsultadas = sum(bool(pagina.get('reconsultada')) for pagina in self.conciliacao)
+            compactas = list(self.saidas_compactas)
+            ignoradas = len(self.ignoradas)
+            chamadas_nivel0 = sum(c['nivel'] == 0 and not c['descartada'] for c in self.chamadas)
+            chamadas_por_pagina = chamadas_nivel0 / paginas['modelo'] if paginas.get('modelo') else 1.0
+            niveis = self._niveis()
+        return {
+            'chamadas': len(self.chamadas),
+            'chamadas_descartadas': descartadas,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'total_tokens': self.total_tokens,
+            'preco_total': round(self.preco_total, 6),
+            'latencia_media': round(statistics.fmean(latencias), 4) if latencias else 0.0,
+            'latencia_mediana': round(statistics.median(latencias), 4) if latencias else 0.0,
+            'latencia_maxima': round(max(latencias), 4) if latencias else 0.0,
+            'paginas': paginas,
+            # Estimativa: cada página ignorada custaria o mesmo que as outras no
+            # primeiro modelo (menos de uma chamada com páginas empacotadas), sem
+            # contar a subida na cascata que a resposta vazia causaria
+            'paginas_ignoradas': ignoradas,
+            'chamadas_evitadas': round(ignoradas * chamadas_por_pagina),
+            'linhas_rejeitadas': rejeitadas,
+            'linhas_duplicadas': duplicadas,
+            'paginas_conciliadas': situacoes.count('conciliada'),
+            'paginas_sem_conciliacao': situacoes.count('divergente') + situacoes.count('sem_saldo'),
+            'paginas_reconsultadas_saldo': reconsultadas,
+            'output_tokens_economizados': sum(c['output_tokens_padrao'] - c['output_tokens'] for c in compactas),
+            'economia_saida_por_pagina': round(
+                sum(c['output_tokens_padrao'] - c['output_tokens'] for c in compactas) / sum(c['paginas'] for c in compactas), 1
+            ) if compactas else 0.0,
+            'niveis': niveis,
+            'etapas': etapas,
+            'segundos_total': round(time.perf_counter() - self.inicio, 4),
+        }
+
+    def gravar_jsonl(self, caminho, **extras):
+        """Acrescenta o resumo, com a data e os campos extras, em um log JSONL."""
+        registro = {'data': datetime.now(timezone.utc).isoformat(timespec='seconds'), **extras, **self.resumo()}
+        with open(caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
@@ -1,25 +1,87 @@
 import os
 
 import re
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
 import pandas as pd
 import io
+import base64
+import csv
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 from similaridade_nomes import normalizar_origens
+from agendador import LIMITE_RPM, LIMITE_TPM, Agendador
+from cache_paginas import CAMINHO_CACHE, CachePaginas
+from dicionario_origens import CAMINHO_DICIONARIO, DicionarioOrigens
+from leitura_csv import COLUNAS, expandir_compacto, ler_csv_pagina, ler_saldos, linhas_saldos, separar_saldos, validar_pagina
+from metricas import EstatisticasExtrato
+from recorte_tabela import estimar_tokens_imagem
+from camada_texto import extrair_transacoes_texto
+from conciliacao import conciliar_paginas
+from duplicatas import remover_duplicatas
+from renderizacao import renderizar_paginas, renderizar_recortes, tipo_imagem
+from transacoes import compactar_transacoes, resumir_transacoes, separar_por_tipo
 import streamlit as st
 
-# Acessando as variáveis do secrets.toml
-api_key = st.secrets["OPENAI_API_KEY"]
+# Acessando as variáveis do secrets.toml (a chave da OpenAI só quando o modelo é usado)
+# Quantas páginas podem estar em análise no modelo ao mesmo tempo
+MAX_PAGINAS_SIMULTANEAS = int(st.secrets.get("MAX_PAGINAS_SIMULTANEAS", 8))
+# Resultados por página já extraídos, reaproveitados quando o mesmo extrato volta
+cache_paginas = CachePaginas(st.secrets.get("CACHE_PAGINAS", CAMINHO_CACHE))
+# Nomes canônicos das origens, mantidos entre um extrato e outro
+dicionario_origens = DicionarioOrigens(st.secrets.get("DICIONARIO_ORIGENS", CAMINHO_DICIONARIO))
+# Log JSONL com as estatísticas de cada extrato (vazio = não grava)
+LOG_METRICAS = st.secrets.get("LOG_METRICAS", "")
+
+@st.cache_resource
+def obter_agendador():
+    """Limites de requisições/tokens por minuto da conta, compartilhados por todas as sessões."""
+    return Agendador(
+        rpm=int(st.secrets.get("LIMITE_RPM", LIMITE_RPM)),
+        tpm=int(st.secrets.get("LIMITE_TPM", LIMITE_TPM)),
+        hedging=bool(st.secrets.get("HEDGING", False)),
+    )
+
+agendador = obter_agendador()
+
+# Empacotamento de várias páginas na mesma chamada: orçamento de tokens por chamada
+ORCAMENTO_TOKENS_IMAGEM = 6000
+ORCAMENTO_TOKENS_SAIDA = 4000
+# Limite real de saída das chamadas empacotadas; se for atingido, o lote é dividido
+LIMITE_TOKENS_SAIDA_LOTE = 2 * ORCAMENTO_TOKENS_SAIDA
+# Estimativa de tokens de imagem quando só temos o link (página A4 a 100 DPI)
+TOKENS_IMAGEM_LINK = 1559
 
 # from dotenv import load_dotenv
 # load_dotenv()
 # api_key = os.getenv("OPENAI_API_KEY")
 
-llm = ChatOpenAI(
-    api_key=api_key,
-    model="gpt-4.1-mini-2025-04-14",  # gpt-4.1-mini-2025-04-14     "o4-mini-2025-04-16"
-    # temperature=0,
-)
+MODELO = "gpt-4.1-mini-2025-04-14"  # gpt-4.1-mini-2025-04-14     "o4-mini-2025-04-16"
+# Cascata de modelos, do mais barato e rápido ao mais forte: cada página vai
+# ao primeiro e só sobe de nível quando a resposta não passa na validação
+CASCATA_MODELOS = list(st.secrets.get("CASCATA_MODELOS", [MODELO, "o4-mini-2025-04-16"]))
+
+@st.cache_resource
+def _criar_llm(modelo=MODELO):
+    """Cliente do modelo, criado uma vez e reaproveitado entre execuções do script e entre sessões."""
+    # O langchain_openai leva segundos para importar, então só entra na primeira chamada ao modelo
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        api_key=st.secrets["OPENAI_API_KEY"],
+        model=modelo,
+        max_retries=0,  # as retentativas ficam com o agendador
+        # temperature=0,
+    )
+
+# Clientes da cascata por nome do modelo, criados no primeiro uso por
+# obter_llm (o benchmark põe modelos falsos aqui)
+llms = {}
+
+def obter_llm(nivel=0):
+    modelo = CASCATA_MODELOS[nivel]
+    if modelo not in llms:
+        llms[modelo] = _criar_llm(modelo)
+    return llms[modelo]
 
 prompt = """
 Você receberá imagens de um extrato de uma conta bancária, onde os débitos podem ser representados pela cor vermelha, por um sinal de menos, pela letra 'D', ou por algum outro sinal, enquanto que os créditos podem ser representados pela cor azul, por um sinal de +, pela letra 'C', ou por algum outro sinal.
@@ -44,57 +106,564 @@ Caso não encontre algum campo deixe vazio;
 *IMPORTANTE*: Considere apenas as movimentações financeiras. Não inclua dados de saldo bancário. 
 Em alguns tipo de extrato, pode ser que tenha o "SALDO DO DIA" na coluna de movimentações, você NÃO DEVE colocar essa linha no csv.
 """
+prompt_lote = """
+As imagens a seguir são de páginas diferentes do extrato. Antes das imagens de cada página há um texto "Página N".
+Acrescente no início de cada linha do csv o número N da página de onde a movimentação foi tirada, no formato:
 
-def analisar_extrato_por_links(links, threshold_similaridade = 0.8):
-    """
-    Recebe uma lista de links públicos de imagens (Google Drive),
-    retorna total_credito, total_debito, total_liquido e o DataFrame.
-    """
-    csvs = []
-    for link in links:
-        messages = [
-            SystemMessage(content=prompt),
-            HumanMessage(
-                content=[{"type": "image_url", "image_url": {"url": link}}]
-            )
-        ]
-        response = llm.invoke(messages)
-        extrato_csv = response.content
-        # Limpa possíveis mensagens extras do modelo, pega só o CSV
-        match = re.search(r"tipo,valor,origem, data[\s\S]+", extrato_csv)
-        if match:
-            extrato_csv = match.group(0)
-        csvs.append(extrato_csv)
-    
-    # Junta todos os CSVs em um só
-    csv_final = "\n".join(csvs)
-    df = pd.read_csv(io.StringIO(csv_final))
-    # Garante que a coluna valor é float
-    df['valor'] = pd.to_numeric(df['valor'], errors='coerce').fillna(0)
-    
-    # NOVA FUNCIONALIDADE: Normaliza as origens usando similaridade
-    df = normalizar_origens(df, threshold_similaridade)
-    
-    total_credito = df[df['tipo'] == 'credito']['valor'].sum()
-    total_debito = df[df['tipo'] == 'debito']['valor'].sum()
-    total_liquido = total_credito - total_debito
-    df_credito =  df[df['tipo'] == 'credito'][['origem','valor','data']]
-    df_debito =  df[df['tipo'] == 'debito'][['origem','valor','data']]
-    df_credito.reset_index(inplace=True, drop=True)
-    df_debito.reset_index(inplace=True, drop=True)
-    soma_valores_credito = df_credito[df_credito['origem'] == df_credito['origem'].mode()[0]]['valor'].sum()
-    soma_valores_debito = df_debito[df_debito['origem'] == df_debito['origem'].mode()[0]]['valor'].sum()
-
-    # input_tokens = response.usage_metadata['input_tokens']  
-    # output_tokens = response.usage_metadata['output_tokens']
-    input_tokens = 0
-    output_tokens = 0 
-    total_tokens = input_tokens + output_tokens
-    preco_total = input_tokens*0.40/1000000 + output_tokens*1.60/1000000
+pagina,tipo,valor,origem, data
+1,debito,22.97,IFOOD.COM,28/03/2025
+2,credito,12.19,SHPP BRASIL,05/05/2025
+"""
 
-    return total_credito, total_debito, total_liquido, df, df_credito, df_debito, soma_valores_credito, soma_valores_debito, total_tokens, preco_total
+# Resposta compacta: menos tokens de saída, expandida de volta para o CSV padrão
+prompt_compacto = """
+FORMATO COMPACTO: em vez do csv acima, responda no formato abaixo, que é mais curto.
+A primeira linha é o cabeçalho T;V;O;D e cada linha seguinte é uma movimentação, com os campos separados por ponto e vírgula:
+T = D para débito ou C para crédito; V = valor com ponto decimal; O = origem; D = data no formato dd/mm/aa, deixada vazia quando for igual à data da linha anterior.
 
+T;V;O;D
+D;22.97;IFOOD.COM;28/03/25
+D;25.11;SHPP BRASIL;
+C;12.19;SHPP BRASIL;05/05/25
+"""
+prompt_lote_compacto = """
+As imagens a seguir são de páginas diferentes do extrato. Antes das imagens de cada página há um texto "Página N".
+Acrescente no início de cada linha o número N da página de onde a movimentação foi tirada, no formato:
+
+P;T;V;O;D
+1;D;22.97;IFOOD.COM;28/03/25
+2;C;12.19;SHPP BRASIL;05/05/25
+"""
 
+# Conferência de saldos: o modelo também devolve os saldos do início e do fim da página
+prompt_saldos = """
+CONFERÊNCIA DE SALDOS: depois das movimentações, acrescente duas linhas com o saldo da conta no início e no fim da página, assim:
 
+#saldo_inicial=1000.00
+#saldo_final=962.11
 
+saldo_inicial é o saldo antes da primeira movimentação da página (saldo anterior, saldo transportado, ou o saldo da primeira linha desfeita a movimentação dela) e saldo_final é o saldo depois da última movimentação da página. Use ponto decimal e sinal de menos para saldo negativo, e deixe o valor vazio quando a página não mostrar o saldo. Só nessas duas linhas o saldo aparece; as movimentações continuam sem ele.
+"""
+prompt_lote_saldos = """
+Com várias páginas, escreva as duas linhas de saldo de cada página, com o número N da página depois do nome:
+
+#saldo_inicial:1=1000.00
+#saldo_final:1=962.11
+"""
+
+# Média móvel dos tokens de saída por página, usada para montar os lotes
+_saida_por_pagina = 600
+_lock_saida = threading.Lock()
+
+
+def _url_imagem(imagem):
+    """
+    Devolve a URL enviada ao modelo para uma página: links são usados como
+    estão e bytes (PNG, JPEG ou WebP) viram uma data URL base64, sem passar pelo Drive.
+    """
+    if isinstance(imagem, (bytes, bytearray, memoryview)):
+        return f"data:{tipo_imagem(imagem)};base64," + base64.b64encode(imagem).decode("ascii")
+    return imagem
+
+def _conteudo_pagina(imagem):
+    """
+    Bytes que identificam a página no cache: a própria imagem ou o link
+    (ou todos os recortes, quando a página vem em várias imagens).
+    Links do Drive mudam a cada upload, então só as páginas em memória
+    (ou data URLs) voltam a acertar o cache.
+    """
+    if isinstance(imagem, (list, tuple)):
+        return b"".join(len(parte).to_bytes(8, "big") + parte for parte in map(_conteudo_pagina, imagem))
+    if isinstance(imagem, (bytes, bytearray, memoryview)):
+        return bytes(imagem)
+    return imagem.encode("utf-8")
+
+def _linhas_para_csv(linhas):
+    saida = io.StringIO()
+    csv.writer(saida, lineterminator="\n").writerows(linhas)
+    return saida.getvalue()
+
+def _partes_imagem(imagem):
+    """Itens de imagem da mensagem; uma página recortada em faixas leva todas."""
+    imagens = imagem if isinstance(imagem, (list, tuple)) else [imagem]
+    return [{"type": "image_url", "image_url": {"url": _url_imagem(parte)}} for parte in imagens]
+
+def _chave_cache(imagem, conciliar_saldos=False):
+    # O cache guarda o resultado final da cascata, com o nome do primeiro nível;
+    # respostas sem os saldos não servem para a conferência de saldos
+    return CachePaginas.chave(_conteudo_pagina(imagem), prompt + prompt_saldos if conciliar_saldos else prompt, CASCATA_MODELOS[0])
+
+def _csv_pronto(imagem, usar_cache=True, estatisticas=None, conciliar_saldos=False):
+    """
+    CSV da página que não precisa do modelo: páginas reconstruídas da camada
+    de texto do PDF (DataFrame, com os saldos lidos nela), páginas sem
+    movimentações (DataFrame vazio) e páginas já vistas no cache. Senão, None.
+    Uma página do cache nunca volta à cascata, mesmo a que o último modelo
+    deixou reprovada (contada também em paginas['cache_reprovada']).
+    """
+    if isinstance(imagem, pd.DataFrame):
+        if estatisticas is not None and not imagem.attrs.get('ignorada'):
+            estatisticas.contar_paginas('texto')
+        saldos = {nome: f"{valor:.2f}" for nome, valor in imagem.attrs.items() if nome.startswith('saldo_') and valor is not None}
+        return "tipo,valor,origem, data\n" + imagem.to_csv(index=False, header=False) + linhas_saldos(saldos)
+    if usar_cache:
+        entrada = cache_paginas.obter(_chave_cache(imagem, conciliar_saldos))
+        if entrada is not None:
+            linhas, motivo = entrada
+            if estatisticas is not None:
+                estatisticas.contar_paginas('cache')
+                if motivo is not None:
+                    estatisticas.contar_paginas('cache_reprovada')
+            return _linhas_para_csv(linhas)
+    return None
+
+def _registrar_descartada(estatisticas, response, segundos, modelo=None, nivel=0):
+    """Chamada do hedge que perdeu: conta tokens e preço, sem páginas."""
+    estatisticas.registrar_chamada(response, segundos, 0, modelo, nivel, descartada=True)
+
+def _invocar(messages, estatisticas=None, paginas=1, tokens_imagem=0, nivel=0, **kwargs):
+    """
+    Chama o modelo do nivel da cascata pelo agendador (limites de RPM/TPM,
+    retentativas e hedge) registrando tokens e latência nas estatísticas.
+    As latências do hedge são separadas por modelo e páginas por chamada.
+    A reserva de tokens usa o texto, os tokens_imagem estimados e a saída
+    máxima ou esperada.
+    """
+    tokens = (
+        sum(len(m.content) for m in messages if isinstance(m.content, str)) // 4
+        + tokens_imagem
+        + kwargs.get("max_tokens", round(_saida_por_pagina * paginas))
+    )
+    modelo = CASCATA_MODELOS[nivel]
+    # A chamada duplicada do hedge que perder também é cobrada
+    ao_descartar = None
+    if estatisticas is not None:
+        ao_descartar = partial(_registrar_descartada, estatisticas, modelo=modelo, nivel=nivel)
+    inicio = time.perf_counter()
+    response = agendador.executar(
+        partial(obter_llm(nivel).invoke, messages, **kwargs), tokens, chave=(modelo, paginas), ao_descartar=ao_descartar
+    )
+    if estatisticas is not None:
+        estatisticas.registrar_chamada(response, time.perf_counter() - inicio, paginas, modelo, nivel)
+    return response
+
+def _extrair_csv_pagina(imagem, estatisticas=None, saida_compacta=False, nivel=0, conciliar_saldos=False):
+    """
+    Envia a imagem de uma página ao modelo do nivel da cascata e devolve o
+    CSV da resposta. Com saida_compacta=True o modelo responde no formato
+    compacto, que é expandido aqui para o CSV padrão. Com
+    conciliar_saldos=True o modelo também devolve os saldos da página, que
+    ficam no fim do CSV como linhas #saldo_inicial=... e #saldo_final=...
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+    instrucoes = prompt + prompt_compacto if saida_compacta else prompt
+    messages = [
+        SystemMessage(content=instrucoes + prompt_saldos if conciliar_saldos else instrucoes),
+        HumanMessage(content=_partes_imagem(imagem))
+    ]
+    response = _invocar(messages, estatisticas, tokens_imagem=_tokens_imagem(imagem), nivel=nivel)
+    if estatisticas is not None and nivel == 0:
+        estatisticas.contar_paginas('modelo')
+    # Explicações do modelo antes do CSV são descartadas na leitura (leitura_csv)
+    extrato_csv, saldos = separar_saldos(response.content)
+    if saida_compacta:
+        extrato_csv = expandir_compacto(extrato_csv)
+        if estatisticas is not None:
+            estatisticas.registrar_saida_compacta(response, response.content, extrato_csv)
+    return extrato_csv + linhas_saldos(saldos.get(None, {}))
+
+def _tokens_imagem(imagem):
+    """Estimativa dos tokens de imagem de uma página (só lê o cabeçalho da imagem)."""
+    if isinstance(imagem, (list, tuple)):
+        return sum(_tokens_imagem(parte) for parte in imagem)
+    if isinstance(imagem, (bytes, bytearray, memoryview)):
+        from PIL import Image
+
+        largura, altura = Image.open(io.BytesIO(imagem)).size
+        return estimar_tokens_imagem(largura, altura)
+    return TOKENS_IMAGEM_LINK
+
+def _montar_lotes(pendentes):
+    """
+    Agrupa páginas consecutivas em lotes que cabem no orçamento de tokens
+    de imagem e na estimativa de tokens de saída por página.
+    """
+    lotes = []
+    lote = []
+    tokens_lote = 0
+    for indice, imagem in pendentes:
+        tokens = _tokens_imagem(imagem)
+        if lote and (tokens_lote + tokens > ORCAMENTO_TOKENS_IMAGEM
+                     or (len(lote) + 1) * _saida_por_pagina > ORCAMENTO_TOKENS_SAIDA):
+            lotes.append(lote)
+            lote = []
+            tokens_lote = 0
+        lote.append((indice, imagem))
+        tokens_lote += tokens
+    if lote:
+        lotes.append(lote)
+    return lotes
 
+def _separar_por_pagina(resposta, n_paginas):
+    """
+    Divide o CSV de um lote (com a coluna pagina) em um CSV por página.
+    Devolve None se alguma linha não puder ser atribuída a uma página do lote.
+    """
+    match = re.search(r"pagina\s*,\s*tipo\s*,\s*valor\s*,\s*origem\s*,\s*data[^\n]*\n?([\s\S]*)", resposta, re.IGNORECASE)
+    if not match:
+        return None
+    linhas_por_pagina = [[["tipo", "valor", "origem", " data"]] for _ in range(n_paginas)]
+    for linha in csv.reader(io.StringIO(match.group(1))):
+        if not linha or not "".join(linha).strip():
+            continue
+        numero = linha[0].strip()
+        if not numero.isdigit() or not 1 <= int(numero) <= n_paginas:
+            return None
+        linhas_por_pagina[int(numero) - 1].append(linha[1:])
+    return [_linhas_para_csv(linhas) for linhas in linhas_por_pagina]
+
+def _registrar_saida(response, n_paginas):
+    global _saida_por_pagina
+    uso = getattr(response, "usage_metadata", None) or {}
+    if uso.get("output_tokens"):
+        with _lock_saida:
+            _saida_por_pagina = 0.7 * _saida_por_pagina + 0.3 * uso["output_tokens"] / n_paginas
+
+def _extrair_csv_lote(lote, estatisticas=None, saida_compacta=False, conciliar_saldos=False):
+    """
+    Envia várias páginas em uma única mensagem ao primeiro modelo da
+    cascata e devolve {indice: CSV}. Se a resposta bater no limite de saída
+    ou tiver linhas sem página válida, o lote é dividido ao meio e cada
+    metade é reenviada.
+    """
+    if len(lote) == 1:
+        indice, imagem = lote[0]
+        return {indice: _extrair_csv_pagina(imagem, estatisticas, saida_compacta, conciliar_saldos=conciliar_saldos)}
+    conteudo = []
+    for numero, (_, imagem) in enumerate(lote, start=1):
+        conteudo.append({"type": "text", "text": f"Página {numero}"})
+        conteudo.extend(_partes_imagem(imagem))
+    instrucoes = prompt + prompt_compacto + prompt_lote_compacto if saida_compacta else prompt + prompt_lote
+    if conciliar_saldos:
+        instrucoes += prompt_saldos + prompt_lote_saldos
+    from langchain_core.messages import HumanMessage, SystemMessage
+    messages = [
+        SystemMessage(content=instrucoes),
+        HumanMessage(content=conteudo)
+    ]
+    response = _invocar(
+        messages, estatisticas, len(lote),
+        tokens_imagem=sum(_tokens_imagem(imagem) for _, imagem in lote), max_tokens=LIMITE_TOKENS_SAIDA_LOTE
+    )
+    truncada = (getattr(response, "response_metadata", None) or {}).get("finish_reason") == "length"
+    resposta, saldos = separar_saldos(response.content)
+    if saida_compacta:
+        resposta = expandir_compacto(resposta, com_pagina=True)
+    csvs = None if truncada else _separar_por_pagina(resposta, len(lote))
+    if csvs is None:
+        meio = len(lote) // 2
+        return {**_extrair_csv_lote(lote[:meio], estatisticas, saida_compacta, conciliar_saldos),
+                **_extrair_csv_lote(lote[meio:], estatisticas, saida_compacta, conciliar_saldos)}
+    if saida_compacta and estatisticas is not None:
+        estatisticas.registrar_saida_compacta(response, response.content, resposta, len(lote))
+    _registrar_saida(response, len(lote))
+    if estatisticas is not None:
+        estatisticas.contar_paginas('modelo', len(lote))
+    return {
+        indice: extrato_csv + linhas_saldos(saldos.get(numero, {}))
+        for numero, ((indice, _), extrato_csv) in enumerate(zip(lote, csvs), start=1)
+    }
+
+def _ler_pagina(extrato_csv):
+    """Lê o CSV de uma página; os saldos das linhas #saldo_... vão para df.attrs."""
+    extrato_csv, saldos = separar_saldos(extrato_csv)
+    df, rejeitadas = ler_csv_pagina(extrato_csv)
+    df.attrs.update(ler_saldos(saldos.get(None, {})))
+    return df, rejeitadas
+
+def extrair_transacoes_por_pagina(links, max_paginas_simultaneas = MAX_PAGINAS_SIMULTANEAS, usar_cache = True, empacotar_paginas = False, estatisticas = None, saida_compacta = False, conciliar_saldos = False):
+    """
+    Gerador que analisa as páginas em paralelo e produz (indice, DataFrame)
+    de cada página assim que ela fica pronta, fora da ordem das páginas.
+    Os DataFrames têm as colunas tipo, valor, origem e data, ainda sem a
+    normalização das origens (que depende de todas as páginas).
+    Com empacotar_paginas=True, as páginas que precisam do modelo são
+    agrupadas em lotes que cabem no orçamento de tokens, uma chamada por lote.
+    Com saida_compacta=True o modelo responde no formato compacto (tipo em
+    uma letra, datas repetidas omitidas), com menos tokens de saída.
+    Cada resposta é lida e validada assim que chega: as páginas reprovadas
+    (linhas ilegíveis ou nenhuma transação) são reenviadas, uma a uma, ao
+    próximo modelo de CASCATA_MODELOS, e só o resultado final vai para o
+    cache. As linhas que não puderam ser lidas ficam em
+    estatisticas.rejeitadas, em vez de virarem zero.
+    Com conciliar_saldos=True o modelo também devolve os saldos do início e
+    do fim de cada página, que ficam em df.attrs (saldo_inicial,
+    saldo_final) junto com o nível da cascata que aceitou a página, para
+    conciliar_saldos_paginas.
+    Tokens, latência das chamadas, aprovação por nível da cascata e os
+    tempos das etapas de inferência e leitura vão para estatisticas
+    (EstatisticasExtrato), se informada.
+    """
+    if estatisticas is None:
+        estatisticas = EstatisticasExtrato()
+    for indice, link in enumerate(links):
+        if isinstance(link, pd.DataFrame) and link.attrs.get('ignorada'):
+            estatisticas.registrar_ignorada(indice, link.attrs['ignorada'])
+
+    # As tarefas devolvem {indice: (CSV, nível da cascata)}; nível None para
+    # páginas que não passaram pelo modelo (camada de texto ou cache)
+    def extrair_pagina(indice, link, nivel=0):
+        if nivel == 0:
+            extrato_csv = _csv_pronto(link, usar_cache, estatisticas, conciliar_saldos)
+            if extrato_csv is not None:
+                return {indice: (extrato_csv, None)}
+        return {indice: (_extrair_csv_pagina(link, estatisticas, saida_compacta, nivel, conciliar_saldos), nivel)}
+
+    def extrair_lote(lote):
+        csvs = _extrair_csv_lote(lote, estatisticas, saida_compacta, conciliar_saldos)
+        return {indice: (extrato_csv, 0) for indice, extrato_csv in csvs.items()}
+
+    prontas = []
+    if empacotar_paginas:
+        pendentes = []
+        for indice, link in enumerate(links):
+            extrato_csv = _csv_pronto(link, usar_cache, estatisticas, conciliar_saldos)
+            if extrato_csv is None:
+                pendentes.append((indice, link))
+            else:
+                prontas.append((indice, extrato_csv))
+        tarefas = [partial(extrair_lote, lote) for lote in _montar_lotes(pendentes)]
+    else:
+        tarefas = [partial(extrair_pagina, indice, link) for indice, link in enumerate(links)]
+
+    def finalizar(indice, extrato_csv, nivel):
+        """Lê a resposta; devolve o DataFrame, ou None se a página subiu de nível na cascata."""
+        with estatisticas.etapa('leitura'):
+            df, rejeitadas = _ler_pagina(extrato_csv)
+        df.attrs['nivel'] = nivel
+        if nivel is not None:
+            motivo = validar_pagina(df, rejeitadas)
+            estatisticas.registrar_validacao(nivel, CASCATA_MODELOS[nivel], motivo)
+            if motivo is not None and nivel + 1 < len(CASCATA_MODELOS):
+                return None
+            # O resultado final da cascata vai para o cache com o motivo da
+            # reprovação, se o último nível também falhou: a página (ex.: sem
+            # movimentações que passou pelo filtro) não percorre de novo a cascata
+            if usar_cache:
+                cache_paginas.guardar(
+                    _chave_cache(links[indice], conciliar_saldos), list(csv.reader(io.StringIO(extrato_csv))), motivo
+                )
+        estatisticas.registrar_rejeitadas(indice, rejeitadas)
+        return df
+
+    for indice, extrato_csv in prontas:
+        yield indice, finalizar(indice, extrato_csv, None)
+
+    # A inferência vai do envio da primeira tarefa até a última terminar,
+    # sem contar o tempo em que o consumidor segura o gerador
+    inicio = time.perf_counter()
+    fim = [inicio]
+
+    def marcar_fim(_):
+        fim[0] = max(fim[0], time.perf_counter())
+
+    n_workers = max(1, min(max_paginas_simultaneas, len(tarefas)))
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        pendentes = set()
+
+        def enviar(tarefa):
+            futuro = executor.submit(tarefa)
+            futuro.add_done_callback(marcar_fim)
+            pendentes.add(futuro)
+
+        for tarefa in tarefas:
+            enviar(tarefa)
+        try:
+            while pendentes:
+                concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    pendentes.discard(futuro)
+                    for indice, (extrato_csv, nivel) in futuro.result().items():
+                        df = finalizar(indice, extrato_csv, nivel)
+                        if df is None:
+                            enviar(partial(extrair_pagina, indice, links[indice], nivel + 1))
+                        else:
+                            yield indice, df
+        finally:
+            # Se o consumidor parar no meio, as páginas ainda na fila não são enviadas
+            for futuro in pendentes:
+                futuro.cancel()
+    estatisticas.adicionar_etapa('inferencia', fim[0] - inicio)
+
+def conciliar_saldos_paginas(links, dfs_paginas, estatisticas = None, paginas_por_extrato = None, max_paginas_simultaneas = MAX_PAGINAS_SIMULTANEAS, usar_cache = True, saida_compacta = False):
+    """
+    Confere os saldos das páginas extraídas com conciliar_saldos=True
+    (conciliacao.conciliar_paginas) e reenvia ao modelo só as divergentes,
+    uma vez, no nível da cascata seguinte ao que as aceitou (ou no último).
+    A nova resposta substitui a anterior (e vai para o cache) quando a
+    página passa a fechar. As que continuam divergentes, ou sem saldo para
+    conferir, não são aceitas em silêncio: ficam marcadas em
+    estatisticas.conciliacao, com a coluna reconsultada. Páginas da camada
+    de texto não têm imagem para reenviar e só são marcadas.
+    Devolve dfs_paginas (lista, na ordem das páginas) com as correções.
+    """
+    if estatisticas is None:
+        estatisticas = EstatisticasExtrato()
+    dfs_paginas = list(dfs_paginas)
+    with estatisticas.etapa('conciliacao'):
+        relatorio = conciliar_paginas(dfs_paginas, paginas_por_extrato)
+    divergentes = [
+        indice for indice in relatorio.index[relatorio['situacao'] == 'divergente']
+        if not isinstance(links[indice], pd.DataFrame)
+    ]
+
+    def reconsultar(indice):
+        nivel = min((dfs_paginas[indice].attrs.get('nivel') or 0) + 1, len(CASCATA_MODELOS) - 1)
+        extrato_csv = _extrair_csv_pagina(links[indice], estatisticas, saida_compacta, nivel, conciliar_saldos=True)
+        return nivel, extrato_csv
+
+    if divergentes:
+        n_workers = max(1, min(max_paginas_simultaneas, len(divergentes)))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            respostas = dict(zip(divergentes, executor.map(reconsultar, divergentes)))
+        with estatisticas.etapa('conciliacao'):
+            novas = {}
+            for indice, (nivel, extrato_csv) in respostas.items():
+                df, rejeitadas = _ler_pagina(extrato_csv)
+                df.attrs['nivel'] = nivel
+                novas[indice] = (df, rejeitadas, extrato_csv)
+            candidatas = [novas[i][0] if i in novas else df for i, df in enumerate(dfs_paginas)]
+            conferencia = conciliar_paginas(candidatas, paginas_por_extrato)
+            for indice, (df, rejeitadas, extrato_csv) in novas.items():
+                fechou = conferencia.at[indice, 'situacao'] == 'conciliada' and rejeitadas.empty
+                estatisticas.registrar_validacao(df.attrs['nivel'], CASCATA_MODELOS[df.attrs['nivel']], None if fechou else 'saldo')
+                if fechou:
+                    dfs_paginas[indice] = df
+                    if usar_cache:
+                        cache_paginas.guardar(_chave_cache(links[indice], True), list(csv.reader(io.StringIO(extrato_csv))))
+            relatorio = conciliar_paginas(dfs_paginas, paginas_por_extrato)
+    relatorio['reconsultada'] = relatorio.index.isin(divergentes)
+    estatisticas.registrar_conciliacao(relatorio)
+    return dfs_paginas
+
+def _pagina_ignorada(motivo):
+    """Página sem movimentações: DataFrame vazio, com o motivo em attrs['ignorada']."""
+    df = pd.DataFrame(columns=COLUNAS)
+    df.attrs['ignorada'] = motivo
+    return df
+
+def paginas_do_pdf(pdf_bytes, usar_camada_texto=True, recortar=True, filtrar_paginas=True, **opcoes_imagem):
+    """
+    Prepara as páginas do PDF para extrair_transacoes_por_pagina: páginas de
+    PDFs digitais viram o DataFrame reconstruído da camada de texto (sem o
+    modelo) e as demais viram imagem, só da tabela (recortar=True) ou da
+    página inteira. Com filtrar_paginas=True, páginas sem tabela de
+    movimentações (capa, avisos, propaganda, resumo; veja
+    classificacao_paginas) viram um DataFrame vazio e não são renderizadas
+    nem enviadas ao modelo. opcoes_imagem são as de renderizacao (dpi,
+    cores, formato, qualidade). Devolve (paginas, relatorio_recorte).
+    """
+    import fitz  # PyMuPDF
+    from classificacao_paginas import motivo_sem_movimentacoes
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_document:
+        paginas = []
+        for page in pdf_document:
+            pagina = extrair_transacoes_texto(page) if usar_camada_texto else None
+            if pagina is None and filtrar_paginas:
+                motivo = motivo_sem_movimentacoes(page)
+                if motivo is not None:
+                    pagina = _pagina_ignorada(motivo)
+            paginas.append(pagina)
+
+    # Só as páginas sem camada de texto utilizável viram imagem
+    numeros_imagens = [i for i, pagina in enumerate(paginas) if pagina is None]
+    relatorio_recorte = []
+    if recortar:
+        imagens, relatorio_recorte = renderizar_recortes(pdf_bytes, numeros_imagens, **opcoes_imagem)
+    else:
+        imagens = renderizar_paginas(pdf_bytes, numeros_imagens, **opcoes_imagem)
+    for i, imagem in zip(numeros_imagens, imagens):
+        paginas[i] = imagem
+    return paginas, relatorio_recorte
+
+def consolidar_transacoes(dfs_paginas, threshold_similaridade = 0.8, usar_dicionario_origens = True, estatisticas = None, paginas_por_extrato = None):
+    """
+    Junta os DataFrames das páginas (na ordem das páginas), sem as transações
+    repetidas entre páginas e entre extratos (paginas_por_extrato diz quantas
+    páginas tem cada extrato; as removidas ficam em estatisticas.duplicadas),
+    normaliza as origens e devolve o resultado no mesmo formato de
+    analisar_extrato_por_links.
+    total_tokens e preco_total saem das estatisticas das chamadas ao modelo.
+    """
+    if estatisticas is None:
+        estatisticas = EstatisticasExtrato()
+    with estatisticas.etapa('duplicatas'):
+        dfs_paginas, removidas = remover_duplicatas(dfs_paginas, paginas_por_extrato)
+        estatisticas.registrar_duplicadas(removidas)
+    with estatisticas.etapa('normalizacao'):
+        df = pd.concat(dfs_paginas or [pd.DataFrame(columns=COLUNAS)], ignore_index=True)
+
+        # NOVA FUNCIONALIDADE: Normaliza as origens usando similaridade
+        df = normalizar_origens(df, threshold_similaridade, dicionario_origens if usar_dicionario_origens else None)
+        # Formato compacto: valores em centavos, tipo/origem categóricos e datas
+        df = compactar_transacoes(df)
+    
+    resumo = resumir_transacoes(df)
+    total_credito = resumo['total_credito'] / 100
+    total_debito = resumo['total_debito'] / 100
+    total_liquido = (resumo['total_credito'] - resumo['total_debito']) / 100
+    df_credito, df_debito = separar_por_tipo(df)
+    soma_valores_credito = resumo['soma_origem_credito'] / 100
+    soma_valores_debito = resumo['soma_origem_debito'] / 100
+
+    total_tokens = estatisticas.total_tokens
+    preco_total = estatisticas.preco_total
+
+    return total_credito, total_debito, total_liquido, df, df_credito, df_debito, soma_valores_credito, soma_valores_debito, total_tokens, preco_total
+
+def analisar_extrato_por_links(links, threshold_similaridade = 0.8, max_paginas_simultaneas = MAX_PAGINAS_SIMULTANEAS, usar_cache = True, usar_dicionario_origens = True, empacotar_paginas = False, estatisticas = None, saida_compacta = False, paginas_por_extrato = None, conciliar_saldos = False):
+    """
+    Recebe uma lista de imagens das páginas, como links públicos (Google Drive)
+    ou bytes da imagem em memória (ou uma lista deles, com os recortes da
+    página), ou o DataFrame já extraído da camada de texto da página, e retorna total_credito, total_debito, total_liquido e o
+    DataFrame compacto (valor_centavos em int64, tipo/origem categóricos e
+    data em datetime64). Os totais são somados em centavos e devolvidos em reais.
+    As páginas são analisadas em paralelo, com no máximo
+    max_paginas_simultaneas chamadas ao modelo em andamento.
+    Com usar_cache=False todas as páginas vão ao modelo, ignorando o cache.
+    As páginas sem movimentações que paginas_do_pdf marca (DataFrame vazio)
+    não vão ao modelo; estatisticas conta as páginas ignoradas e as
+    chamadas evitadas.
+    Com usar_dicionario_origens=True as origens são normalizadas pelo
+    dicionário persistido de nomes canônicos.
+    Com empacotar_paginas=True várias páginas vão na mesma chamada ao modelo,
+    e com saida_compacta=True o modelo responde no formato compacto.
+    As transações repetidas no fim de uma página e início da seguinte são
+    contadas uma vez só; para juntar vários extratos com períodos que se
+    sobrepõem, passe as páginas de todos em links e quantas páginas tem
+    cada um em paginas_por_extrato.
+    Com conciliar_saldos=True o saldo inicial e final de cada página é
+    conferido com as movimentações extraídas; só as páginas que não fecham
+    são reenviadas ao modelo, e as que continuam sem fechar ficam marcadas
+    em estatisticas.conciliacao (veja conciliar_saldos_paginas).
+    Passe um EstatisticasExtrato em estatisticas para obter os tokens, a
+    latência de cada chamada e os tempos das etapas; com LOG_METRICAS
+    configurado, o resumo também é acrescentado ao log JSONL.
+    """
+    if estatisticas is None:
+        estatisticas = EstatisticasExtrato()
+    dfs_paginas = dict(extrair_transacoes_por_pagina(
+        links, max_paginas_simultaneas, usar_cache, empacotar_paginas, estatisticas, saida_compacta, conciliar_saldos
+    ))
+    dfs_paginas = [dfs_paginas[indice] for indice in range(len(links))]
+    if conciliar_saldos:
+        dfs_paginas = conciliar_saldos_paginas(
+            links, dfs_paginas, estatisticas, paginas_por_extrato, max_paginas_simultaneas, usar_cache, saida_compacta
+        )
+    resultado = consolidar_transacoes(
+        dfs_paginas, threshold_similaridade, usar_dicionario_origens, estatisticas, paginas_por_extrato
+    )
+    if LOG_METRICAS:
+        estatisticas.gravar_jsonl(LOG_METRICAS, paginas_extrato=len(links))
+    return resultado
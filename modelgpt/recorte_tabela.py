@@ -0,0 +1,190 @@
+import math
+
+from camada_texto import MIN_PALAVRAS, RE_VALOR, _agrupar_linhas, _colunas_cabecalho
+
+# O PyMuPDF (fitz) e o numpy são importados nas funções que recortam, para
+# quem só estima tokens (estimar_tokens_imagem) não carregá-los
+
+# Folga em volta da tabela, em pontos
+MARGEM = 6
+# Mínimo de linhas com valores para considerar que achou a tabela
+MIN_LINHAS_TABELA = 2
+
+# Resolução e limiares da análise por projeção (páginas escaneadas)
+DPI_PROJECAO = 50
+LIMIAR_TINTA = 160
+FRACAO_TINTA_LINHA = 0.005
+FATOR_ESPACO_BLOCO = 1.5
+
+# Modelo de contagem de tokens de imagem do gpt-4.1-mini: blocos de 32x32
+# pixels, no máximo 1536 blocos por imagem, multiplicados por 1.62
+TAMANHO_BLOCO_PX = 32
+MAX_BLOCOS_IMAGEM = 1536
+MULTIPLICADOR_TOKENS = 1.62
+
+def estimar_tokens_imagem(largura, altura):
+    """Tokens cobrados por uma imagem de largura x altura pixels."""
+    if largura <= 0 or altura <= 0:
+        return 0
+    blocos = math.ceil(largura / TAMANHO_BLOCO_PX) * math.ceil(altura / TAMANHO_BLOCO_PX)
+    if blocos > MAX_BLOCOS_IMAGEM:
+        # Imagens grandes são reduzidas até caber no limite de blocos
+        escala = math.sqrt(TAMANHO_BLOCO_PX ** 2 * MAX_BLOCOS_IMAGEM / (largura * altura))
+        escala *= min(
+            math.floor(largura * escala / TAMANHO_BLOCO_PX) / (largura * escala / TAMANHO_BLOCO_PX),
+            math.floor(altura * escala / TAMANHO_BLOCO_PX) / (altura * escala / TAMANHO_BLOCO_PX),
+        )
+        blocos = math.ceil(largura * escala / TAMANHO_BLOCO_PX) * math.ceil(altura * escala / TAMANHO_BLOCO_PX)
+    return math.ceil(blocos * MULTIPLICADOR_TOKENS)
+
+def _regiao_por_texto(page):
+    """
+    Região da tabela pela camada de texto: do cabeçalho até a última linha
+    com valor monetário. Devolve (retângulo, linhas) ou None.
+    """
+    import fitz  # PyMuPDF
+
+    palavras = page.get_text("words")
+    if len(palavras) < MIN_PALAVRAS:
+        return None
+    linhas = _agrupar_linhas(palavras)
+    com_valor = [i for i, linha in enumerate(linhas) if any(RE_VALOR.match(p[4]) for p in linha)]
+    if len(com_valor) < MIN_LINHAS_TABELA:
+        return None
+    cabecalhos = [i for i, linha in enumerate(linhas[:com_valor[0]]) if _colunas_cabecalho(linha) is not None]
+    inicio = cabecalhos[-1] if cabecalhos else com_valor[0]
+    trecho = linhas[inicio:com_valor[-1] + 1]
+    retangulo = fitz.Rect(trecho[0][0][:4])
+    for linha in trecho:
+        for palavra in linha:
+            retangulo |= fitz.Rect(palavra[:4])
+    return retangulo, [(min(p[1] for p in linha), max(p[3] for p in linha)) for linha in trecho]
+
+def mapa_tinta(page):
+    """Pixels com tinta de uma versão da página em baixa resolução (DPI_PROJECAO), como matriz booleana."""
+    import fitz  # PyMuPDF
+    import numpy as np
+
+    pix = page.get_pixmap(dpi=DPI_PROJECAO, colorspace=fitz.csGRAY, alpha=False)
+    imagem = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return imagem < LIMIAR_TINTA
+
+def blocos_texto(tinta):
+    """
+    Blocos de linhas de texto (listas de (y0, y1) em pixels) do mapa de
+    tinta, de cima para baixo: as linhas são agrupadas em blocos separados
+    por espaços maiores que o normal.
+    """
+    import numpy as np
+
+    com_texto = tinta.sum(axis=1) > FRACAO_TINTA_LINHA * tinta.shape[1]
+
+    # Sequências de linhas de pixels com tinta = linhas de texto
+    linhas_texto = []
+    inicio = None
+    for y, tem in enumerate(com_texto):
+        if tem and inicio is None:
+            inicio = y
+        elif not tem and inicio is not None:
+            linhas_texto.append((inicio, y))
+            inicio = None
+    if inicio is not None:
+        linhas_texto.append((inicio, len(com_texto)))
+    if not linhas_texto:
+        return []
+
+    espacos = [b[0] - a[1] for a, b in zip(linhas_texto, linhas_texto[1:])]
+    espaco_normal = float(np.median(espacos)) if espacos else 0.0
+    blocos = [[linhas_texto[0]]]
+    for espaco, linha in zip(espacos, linhas_texto[1:]):
+        if espaco > FATOR_ESPACO_BLOCO * max(espaco_normal, 1):
+            blocos.append([])
+        blocos[-1].append(linha)
+    return blocos
+
+def bloco_tabela(tinta):
+    """
+    Linhas de texto (y0, y1 em pixels) da tabela no mapa de tinta: do
+    primeiro ao último bloco (blocos_texto) que pode ser tabela pelo mesmo
+    critério do filtro de páginas (classificacao_paginas), para o cabeçalho
+    e os grupos de linhas separados por espaços maiores irem juntos.
+    Devolve None se não há linhas suficientes para uma tabela, ou se entre
+    esses blocos há texto corrido: não dá para saber onde está a tabela e
+    vai a página inteira.
+    """
+    from classificacao_paginas import ALTURA_MAXIMA_LINHA, MIN_LINHAS_COLUNAS, _pode_ser_tabela
+
+    blocos = blocos_texto(tinta)
+    tabela = [_pode_ser_tabela(tinta, bloco) for bloco in blocos]
+    if not any(tabela):
+        return None
+    primeiro = tabela.index(True)
+    ultimo = len(tabela) - 1 - tabela[::-1].index(True)
+    # Cabeçalho das colunas: uma linha de texto sozinha logo acima
+    if primeiro and len(blocos[primeiro - 1]) == 1 and blocos[primeiro - 1][0][1] - blocos[primeiro - 1][0][0] <= ALTURA_MAXIMA_LINHA:
+        primeiro -= 1
+    # Linhas soltas e imagens no meio vão no recorte; texto corrido não
+    if any(not e_tabela and len(bloco) >= MIN_LINHAS_COLUNAS
+           for bloco, e_tabela in zip(blocos[primeiro:ultimo + 1], tabela[primeiro:ultimo + 1])):
+        return None
+    linhas = [linha for bloco in blocos[primeiro:ultimo + 1] for linha in bloco]
+    if len(linhas) < MIN_LINHAS_TABELA + 1:
+        return None
+    return linhas
+
+def _regiao_por_projecao(page):
+    """
+    Região da tabela em páginas escaneadas, pelo perfil de tinta das linhas
+    de uma versão em baixa resolução: a tabela vai do primeiro ao último
+    bloco de linhas de texto que pode ser tabela (bloco_tabela). Devolve
+    (retângulo, linhas) ou None.
+    """
+    import fitz  # PyMuPDF
+    import numpy as np
+
+    tinta = mapa_tinta(page)
+    bloco = bloco_tabela(tinta)
+    if bloco is None:
+        return None
+
+    y0, y1 = bloco[0][0], bloco[-1][1]
+    colunas = np.flatnonzero(tinta[y0:y1].any(axis=0))
+    escala = 72 / DPI_PROJECAO
+    retangulo = fitz.Rect(colunas[0] * escala, y0 * escala, (colunas[-1] + 1) * escala, y1 * escala)
+    return retangulo, [(a * escala, b * escala) for a, b in bloco]
+
+def _dividir_em_blocos(retangulo, linhas, dpi):
+    """
+    Divide recortes que passariam do limite de blocos de imagem do modelo
+    (e seriam reduzidos) em faixas cortadas nos espaços entre as linhas.
+    """
+    import fitz  # PyMuPDF
+
+    escala = dpi / 72
+    blocos_largura = max(math.ceil(retangulo.width * escala / TAMANHO_BLOCO_PX), 1)
+    max_altura = (MAX_BLOCOS_IMAGEM // blocos_largura - 1) * TAMANHO_BLOCO_PX / escala
+    if retangulo.height <= max_altura or len(linhas) < 2:
+        return [retangulo]
+    faixas = []
+    topo = retangulo.y0
+    for anterior, proxima in zip(linhas, linhas[1:]):
+        corte = (anterior[1] + proxima[0]) / 2
+        if proxima[1] - topo > max_altura and corte > topo:
+            faixas.append(fitz.Rect(retangulo.x0, topo, retangulo.x1, corte))
+            topo = corte
+    faixas.append(fitz.Rect(retangulo.x0, topo, retangulo.x1, retangulo.y1))
+    return faixas
+
+def regioes_tabela(page, dpi):
+    """
+    Recortes da página que contêm a tabela de movimentações, na ordem de
+    leitura. Usa a camada de texto quando existe e o perfil de tinta da
+    imagem nas páginas escaneadas. Se a tabela não for encontrada devolve
+    a página inteira.
+    """
+    regiao = _regiao_por_texto(page) or _regiao_por_projecao(page)
+    if regiao is None:
+        return [page.rect]
+    retangulo, linhas = regiao
+    retangulo = (retangulo + (-MARGEM, -MARGEM, MARGEM, MARGEM)) & page.rect
+    return _dividir_em_blocos(retangulo, linhas, dpi)
@@ -0,0 +1,144 @@
+import io
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# O PyMuPDF (fitz) é importado nas funções que renderizam, para quem só
+# precisa das opções padrão (ex.: a página do Streamlit) não carregá-lo
+
+# Opções padrão das imagens enviadas ao modelo
+DPI_PADRAO = 100
+# Colorido por padrão: o prompt usa o vermelho/azul dos valores para o tipo
+CORES_PADRAO = "colorido"  # "colorido", "paleta" ou "cinza"
+FORMATO_PADRAO = "png"  # "png", "jpeg" ou "webp"
+QUALIDADE_PADRAO = 80
+CORES_PALETA = 16
+
+# Abaixo disso o custo de subir os processos não compensa
+MIN_PAGINAS_PROCESSOS = 8
+
+_pool = None
+
+def tipo_imagem(conteudo):
+    """Tipo MIME da imagem pelos primeiros bytes (PNG, JPEG ou WebP)."""
+    conteudo = bytes(conteudo[:12])
+    if conteudo.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if conteudo.startswith(b"RIFF") and conteudo[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+def _obter_pool():
+    """
+    Pool de processos criado uma vez e reaproveitado. Usa spawn para não
+    herdar, via fork, as threads do servidor do Streamlit.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _codificar(pix, cores, formato, qualidade):
+    """
+    Bytes finais da página, gerados direto do pixmap, sem PNG intermediário.
+    Com cores="paleta" a imagem colorida é reduzida a CORES_PALETA cores
+    (mantendo vermelho e azul) e sai em PNG, qualquer que seja o formato.
+    """
+    if cores == "paleta":
+        saida = io.BytesIO()
+        pix.pil_image().quantize(colors=CORES_PALETA).save(saida, format="PNG", optimize=True)
+        return saida.getvalue()
+    if formato == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=qualidade)
+    if formato == "webp":
+        return pix.pil_tobytes(format="WEBP", quality=qualidade)
+    return pix.tobytes("png")
+
+def _renderizar_intervalo(pdf_bytes, numeros_paginas, dpi, cores, formato, qualidade):
+    """Renderiza um bloco de páginas abrindo o PDF uma única vez."""
+    import fitz  # PyMuPDF
+    documento = fitz.open(stream=pdf_bytes, filetype="pdf")
+    colorspace = fitz.csGRAY if cores == "cinza" else fitz.csRGB
+    imagens = []
+    for numero in numeros_paginas:
+        pix = documento.load_page(numero).get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+        imagens.append(_codificar(pix, cores, formato, qualidade))
+    documento.close()
+    return imagens
+
+def _renderizar_recortes_intervalo(pdf_bytes, numeros_paginas, dpi, cores, formato, qualidade):
+    """
+    Renderiza só a região da tabela de cada página do bloco. Devolve, por
+    página, as imagens dos recortes e a estimativa de tokens antes e depois.
+    """
+    import fitz  # PyMuPDF
+    from recorte_tabela import estimar_tokens_imagem, regioes_tabela
+
+    documento = fitz.open(stream=pdf_bytes, filetype="pdf")
+    colorspace = fitz.csGRAY if cores == "cinza" else fitz.csRGB
+    resultados = []
+    for numero in numeros_paginas:
+        page = documento.load_page(numero)
+        imagens = []
+        tokens_recorte = 0
+        for regiao in regioes_tabela(page, dpi):
+            pix = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False, clip=regiao)
+            imagens.append(_codificar(pix, cores, formato, qualidade))
+            tokens_recorte += estimar_tokens_imagem(pix.width, pix.height)
+        escala = dpi / 72
+        relatorio = {
+            'pagina': numero + 1,
+            'tokens_pagina': estimar_tokens_imagem(math.ceil(page.rect.width * escala), math.ceil(page.rect.height * escala)),
+            'tokens_recorte': tokens_recorte,
+            'imagens': len(imagens),
+        }
+        resultados.append((imagens, relatorio))
+    documento.close()
+    return resultados
+
+def _renderizar_em_blocos(funcao, pdf_bytes, numeros_paginas, opcoes, max_processos):
+    """
+    Aplica funcao às páginas, dividindo PDFs com muitas páginas em blocos
+    contíguos renderizados em paralelo no pool de processos.
+    """
+    if numeros_paginas is None:
+        import fitz  # PyMuPDF
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as documento:
+            numeros_paginas = list(range(len(documento)))
+    numeros_paginas = list(numeros_paginas)
+
+    n_processos = min(max_processos or os.cpu_count() or 1, len(numeros_paginas))
+    if len(numeros_paginas) < MIN_PAGINAS_PROCESSOS or n_processos <= 1:
+        return funcao(pdf_bytes, numeros_paginas, *opcoes)
+
+    tamanho_bloco = -(-len(numeros_paginas) // n_processos)
+    blocos = [numeros_paginas[i:i + tamanho_bloco] for i in range(0, len(numeros_paginas), tamanho_bloco)]
+    pool = _obter_pool()
+    futuros = [pool.submit(funcao, pdf_bytes, bloco, *opcoes) for bloco in blocos]
+    return [resultado for futuro in futuros for resultado in futuro.result()]
+
+def renderizar_paginas(pdf_bytes, numeros_paginas=None, dpi=DPI_PADRAO, cores=CORES_PADRAO,
+                       formato=FORMATO_PADRAO, qualidade=QUALIDADE_PADRAO, max_processos=None):
+    """
+    Rasteriza as páginas do PDF e devolve os bytes de cada imagem na ordem
+    de numeros_paginas (todas, se None). PDFs com muitas páginas são
+    divididos em blocos contíguos e renderizados em paralelo no pool de
+    processos, usando todos os núcleos.
+    """
+    return _renderizar_em_blocos(
+        _renderizar_intervalo, pdf_bytes, numeros_paginas, (dpi, cores, formato, qualidade), max_processos
+    )
+
+def renderizar_recortes(pdf_bytes, numeros_paginas=None, dpi=DPI_PADRAO, cores=CORES_PADRAO,
+                        formato=FORMATO_PADRAO, qualidade=QUALIDADE_PADRAO, max_processos=None):
+    """
+    Como renderizar_paginas, mas cada página vira a lista de imagens dos
+    recortes da tabela (veja recorte_tabela.regioes_tabela). Devolve
+    (imagens_por_pagina, relatorio), com a estimativa de tokens de imagem
+    da página inteira e dos recortes de cada página.
+    """
+    resultados = _renderizar_em_blocos(
+        _renderizar_recortes_intervalo, pdf_bytes, numeros_paginas, (dpi, cores, formato, qualidade), max_processos
+    )
+    return [imagens for imagens, _ in resultados], [relatorio for _, relatorio in resultados]
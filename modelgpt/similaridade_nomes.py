@@ -1,6 +1,7 @@
 
 from difflib import SequenceMatcher
 from collections import Counter
+import math
 
 def similaridade_nomes(nome1, nome2, threshold=0.8):
     """
@@ -15,35 +16,129 @@ def similaridade_nomes(nome1, nome2, threshold=0.8):
     similaridade = SequenceMatcher(None, nome1, nome2).ratio()
     return similaridade >= threshold
 
+def _normalizar_nome(nome):
+    return ' '.join(nome.lower().split())
+
+def _tokens_nome(nome_normalizado):
+    """
+    Representa o multiconjunto de caracteres do nome como um conjunto de
+    pares (caractere, ocorrência), para que a interseção conte repetições.
+    """
+    ocorrencias = Counter()
+    tokens = []
+    for caractere in nome_normalizado:
+        tokens.append((caractere, ocorrencias[caractere]))
+        ocorrencias[caractere] += 1
+    return tokens
+
+class IndiceNomes:
+    """
+    Índice invertido de caracteres para achar, sem comparar todos os pares,
+    os nomes que podem ter similaridade >= threshold com um nome dado.
+
+    O ratio() do SequenceMatcher nunca passa do quick_ratio(), que é a
+    fração de caracteres em comum. Com similaridade >= t, dois nomes de
+    tamanhos la e lb têm pelo menos t*la/(2-t) caracteres em comum, então
+    (filtro de prefixo) basta indexar os la - ceil(t*la/(2-t)) + 1
+    caracteres mais raros de cada nome: pares que não dividem nenhum deles
+    não podem passar do threshold. O filtro é exato, sem falsos negativos.
+    """
+
+    def __init__(self, nomes, threshold=0.8):
+        self.threshold = threshold
+        self.nomes = list(nomes)
+        self.normalizados = [_normalizar_nome(nome) for nome in self.nomes]
+        self.tokens = [frozenset(_tokens_nome(nome)) for nome in self.normalizados]
+        self.frequencia_tokens = Counter(token for tokens_nome in self.tokens for token in tokens_nome)
+        self.indice = {}
+        self.vazios = []
+        for i, tokens_nome in enumerate(self.tokens):
+            if not tokens_nome:
+                self.vazios.append(i)
+                continue
+            for token in self._prefixo(tokens_nome):
+                self.indice.setdefault(token, []).append(i)
+
+    def _prefixo(self, tokens_nome):
+        """Tokens mais raros do nome que precisam ser compartilhados."""
+        tamanho = len(tokens_nome)
+        sobreposicao_minima = math.ceil(self.threshold * tamanho / (2 - self.threshold) - 1e-9)
+        tamanho_prefixo = min(tamanho, tamanho - max(sobreposicao_minima, 1) + 1)
+        ordenados = sorted(tokens_nome, key=lambda token: (self.frequencia_tokens.get(token, 0), token))
+        return ordenados[:tamanho_prefixo]
+
+    def candidatos(self, nome_normalizado):
+        """Posições dos nomes indexados que podem ser similares ao nome dado."""
+        if self.threshold <= 0:
+            return set(range(len(self.nomes)))
+        if self.threshold > 1:
+            return set()
+        tokens_nome = _tokens_nome(nome_normalizado)
+        if not tokens_nome:
+            # ratio entre dois textos vazios é 1.0; com qualquer outro, 0.0
+            return set(self.vazios)
+        encontrados = set()
+        for token in self._prefixo(tokens_nome):
+            encontrados.update(self.indice.get(token, ()))
+        return encontrados
+
+    def similares(self, nome_normalizado, posicoes):
+        """
+        Filtra as posições cujos nomes têm similaridade >= threshold com o
+        nome dado (mesmo critério de similaridade_nomes). Antes do ratio()
+        completo aplica os mesmos limites do real_quick_ratio (tamanhos) e do
+        quick_ratio (caracteres em comum), calculados sobre os conjuntos já
+        indexados, sem montar o SequenceMatcher para cada candidato.
+        """
+        matcher = SequenceMatcher(None)
+        matcher.set_seq1(nome_normalizado)
+        tamanho = len(nome_normalizado)
+        tokens_nome = frozenset(_tokens_nome(nome_normalizado))
+        for i in posicoes:
+            outro = self.normalizados[i]
+            total = tamanho + len(outro)
+            if total:
+                if 2.0 * min(tamanho, len(outro)) / total < self.threshold:
+                    continue
+                if 2.0 * len(tokens_nome & self.tokens[i]) / total < self.threshold:
+                    continue
+            matcher.set_seq2(outro)
+            if matcher.ratio() >= self.threshold:
+                yield i
+
 def agrupar_nomes_similares(nomes, threshold=0.8):
     """
     Agrupa nomes similares e retorna um dicionário de mapeamento.
     A chave é o nome original, o valor é o nome mais frequente do grupo.
+    Só os pares indicados pelo IndiceNomes são comparados por completo;
+    o resultado é o mesmo da comparação de todos contra todos.
     """
     nomes_unicos = list(set(nomes))
+    indice = IndiceNomes(nomes_unicos, threshold)
     grupos = []
     processados = set()
     
-    for nome in nomes_unicos:
-        if nome in processados:
+    for i, nome in enumerate(nomes_unicos):
+        if i in processados:
             continue
             
-        grupo_atual = [nome]
-        processados.add(nome)
+        grupo_atual = [i]
+        processados.add(i)
         
-        for outro_nome in nomes_unicos:
-            if outro_nome not in processados and similaridade_nomes(nome, outro_nome, threshold):
-                grupo_atual.append(outro_nome)
-                processados.add(outro_nome)
+        candidatos = sorted(indice.candidatos(indice.normalizados[i]) - processados)
+        for j in indice.similares(indice.normalizados[i], candidatos):
+            grupo_atual.append(j)
+            processados.add(j)
         
-        grupos.append(grupo_atual)
+        grupos.append([nomes_unicos[j] for j in grupo_atual])
     
-    # Para cada grupo, escolhe o nome mais frequente
+    # Frequência de cada nome, contada uma única vez; em caso de empate
+    # vence o que aparece primeiro na lista original
+    frequencias = Counter(nomes)
+    posicoes = {nome: i for i, nome in enumerate(frequencias)}
     mapeamento = {}
     for grupo in grupos:
-        # Conta frequência de cada nome no grupo dentro da lista original
-        contador = Counter([nome for nome in nomes if nome in grupo])
-        nome_mais_frequente = contador.most_common(1)[0][0]
+        nome_mais_frequente = max(grupo, key=lambda nome: (frequencias[nome], -posicoes[nome]))
         
         # Mapeia todos os nomes do grupo para o mais frequente
         for nome in grupo:
@@ -51,9 +146,11 @@ def agrupar_nomes_similares(nomes, threshold=0.8):
     
     return mapeamento
 
-def normalizar_origens(df, threshold=0.8):
+def normalizar_origens(df, threshold=0.8, dicionario=None):
     """
     Normaliza as origens no DataFrame aplicando similaridade de nomes.
+    Com um DicionarioOrigens, as origens já conhecidas mantêm o nome
+    canônico salvo e só as novas são comparadas.
     """
     df_normalizado = df.copy()
     
@@ -61,7 +158,10 @@ def normalizar_origens(df, threshold=0.8):
     origens = df_normalizado['origem'].dropna().tolist()
     
     # Cria mapeamento de nomes similares
-    mapeamento = agrupar_nomes_similares(origens, threshold)
+    if dicionario is not None:
+        mapeamento = dicionario.resolver(origens, threshold)
+    else:
+        mapeamento = agrupar_nomes_similares(origens, threshold)
     
     # Aplica o mapeamento
     df_normalizado['origem'] = df_normalizado['origem'].map(mapeamento).fillna(df_normalizado['origem'])
@@ -1,15 +1,13 @@
+import hashlib
 import streamlit as st
-import fitz  # PyMuPDF
-from PIL import Image
-import io
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-import pickle
-import os
-import tempfile
-from modelo import analisar_extrato_por_links
+import pandas as pd
+from contextlib import nullcontext
+from metricas import EstatisticasExtrato
+from transacoes import compactar_transacoes, resumir_transacoes, separar_por_tipo
+from renderizacao import DPI_PADRAO, QUALIDADE_PADRAO
+from google_drive import FOLDER_ID, SessaoDrive, authenticate
+from tarefas import MAX_TAREFAS_FILA, MAX_TAREFAS_SIMULTANEAS, ExecutorTarefas, FilaCheia
+# O modelo (langchain, PyMuPDF, PIL) é importado só na primeira análise, para a página abrir rápido
 
 def format_currency(value):
     """Formata valores para moeda brasileira"""
@@ -17,49 +15,323 @@ def format_currency(value):
         return f"R$ {value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
     return f"R$ {str(value)}"
 
-# Configurações googledrive
-SCOPES = ['https://www.googleapis.com/auth/drive.file']
-FOLDER_ID = "1kvWh4CxWZsmovOBZat7QzgY9kw26o7RE"  # Minha pasta
-
-def authenticate():
-    creds = None
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-    return creds
-
-def upload_image_and_get_public_link(path_image, folder_id, return_id=False):
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
-
-    file_metadata = {
-        'name': os.path.basename(path_image),
-        'parents': [folder_id]
-    }
-    media = MediaFileUpload(path_image, mimetype='image/png')
-    file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-    file_id = file.get('id')
-
-    # Torna o arquivo público
-    permission = {
-        'type': 'anyone',
-        'role': 'reader'
+# Exibição das tabelas de créditos e débitos
+COLUNAS_TABELA = {
+    "valor": st.column_config.NumberColumn("valor", format="R$ %.2f"),
+    "data": st.column_config.DateColumn("data", format="DD/MM/YYYY"),
+}
+
+# Opções de renderização das páginas: rótulo na tela -> valor do renderizador
+OPCOES_CORES = {"Colorido": "colorido", "Paleta reduzida": "paleta", "Tons de cinza": "cinza"}
+OPCOES_FORMATO = {"PNG": "png", "JPEG": "jpeg", "WebP": "webp"}
+
+# Tarefas da sessão (PDFs e opções -> ID da tarefa), para as interações com a página não refazerem a análise
+CHAVE_TAREFAS = "tarefas"
+MAX_TAREFAS_SESSAO = 5
+# Segundos entre duas consultas ao andamento da tarefa
+INTERVALO_ANDAMENTO = 1.0
+
+# Formas de enviar as páginas ao modelo
+TRANSPORTE_MEMORIA = "Memória (base64)"
+TRANSPORTE_DRIVE = "Google Drive"
+
+@st.cache_resource
+def obter_executor_tarefas():
+    """Executor das análises, um por processo: limita quantos extratos rodam ao mesmo tempo somando todas as sessões."""
+    return ExecutorTarefas(
+        max_simultaneas=int(st.secrets.get("MAX_TAREFAS_SIMULTANEAS", MAX_TAREFAS_SIMULTANEAS)),
+        max_fila=int(st.secrets.get("MAX_TAREFAS_FILA", MAX_TAREFAS_FILA)),
+    )
+
+@st.cache_resource
+def obter_sessao_drive():
+    """Sessão do Drive reaproveitada entre execuções do script e entre usuários."""
+    return SessaoDrive(authenticate())
+
+def mostrar_resultado(df, df_credito, df_debito, total_credito, total_debito, total_liquido, soma_valores_credito, soma_valores_debito):
+    """Cards de resumo e tabelas de créditos e débitos."""
+    # --- ORIGEM MAIS FREQUENTE ---
+    origem_mais_frequente_credito = df_credito['origem'].mode()[0] if not df_credito.empty else ""
+    origem_mais_frequente_debito = df_debito['origem'].mode()[0] if not df_debito.empty else ""
+
+    # --- CARDS DE RESUMO ---
+    st.subheader("📊 Resumo Financeiro")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(
+            label="💰 Total Créditos",
+            value=format_currency(total_credito),
+            delta=f"{(df['tipo'] == 'credito').sum()} transações"
+        )
+    with col2:
+        st.metric(
+            label="💸 Total Débitos",
+            value=format_currency(total_debito),
+            delta=f"{(df['tipo'] == 'debito').sum()} transações"
+        )
+    with col3:
+        st.metric(
+            label="⚖️ Saldo Líquido",
+            value=format_currency(total_liquido),
+            delta=format_currency(abs(total_liquido)) if total_liquido != 0 else "Equilibrado"
+        )
+
+    # --- CARDS DE ORIGEM MAIS FREQUENTE ---
+    st.markdown("#### Origem mais frequente")
+    col4, col5 = st.columns(2)
+    with col4:
+        st.metric(
+            label=f"🔝 Crédito: {origem_mais_frequente_credito}",
+            value=format_currency(soma_valores_credito)
+        )
+    with col5:
+        st.metric(
+            label=f"🔝 Débito: {origem_mais_frequente_debito}",
+            value=format_currency(soma_valores_debito)
+        )
+
+    # --- TABELA DETALHADA ---
+    st.markdown("---")
+    st.subheader("📄 Movimentações Detalhadas")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### Créditos")
+        st.dataframe(df_credito, use_container_width=True, column_config=COLUNAS_TABELA)
+    with col2:
+        st.markdown("### Débitos")
+        st.dataframe(df_debito, use_container_width=True, column_config=COLUNAS_TABELA)
+
+def chave_resultado(arquivos, opcoes):
+    """Chave da tarefa na sessão: o conteúdo dos PDFs (SHA-256) e as opções que mudam a extração."""
+    return (
+        tuple(hashlib.sha256(conteudo).hexdigest() for _, conteudo in arquivos),
+        tuple(sorted(opcoes.items())),
+    )
+
+@st.cache_data(show_spinner=False, max_entries=20)
+def preparar_paginas(pdf_bytes, usar_camada_texto, recortar, filtrar_paginas, dpi, cores, formato, qualidade):
+    """paginas_do_pdf em cache: o mesmo PDF com as mesmas opções não é convertido de novo."""
+    from modelo import paginas_do_pdf
+    return paginas_do_pdf(
+        pdf_bytes, usar_camada_texto, recortar, filtrar_paginas, dpi=dpi, cores=cores, formato=formato, qualidade=qualidade
+    )
+
+def processar_extratos(tarefa, arquivos, opcoes, sessao_drive, usar_cache):
+    """
+    Roda no executor de tarefas, fora do script: converte os PDFs, extrai as
+    transações (publicando o andamento e o resultado parcial na tarefa à
+    medida que as páginas ficam prontas) e devolve um dicionário com tudo o
+    que mostrar_processamento exibe. sessao_drive é None no envio em memória.
+    """
+    from modelo import LOG_METRICAS, conciliar_saldos_paginas, consolidar_transacoes, extrair_transacoes_por_pagina
+
+    estatisticas = EstatisticasExtrato()
+    tarefa.atualizar(0.0, "🔄 Convertendo PDF...")
+    with estatisticas.etapa('renderizacao'):
+        # 1. Converter PDF em imagens (PDFs digitais: a tabela é reconstruída da camada de texto, sem o modelo)
+        # As páginas de todos os extratos vão juntas ao modelo
+        paginas, relatorio_recorte, paginas_por_extrato = [], [], []
+        for _, pdf_bytes in arquivos:
+            paginas_arquivo, relatorio_arquivo = preparar_paginas(
+                pdf_bytes, opcoes['usar_camada_texto'], opcoes['recortar'], opcoes['filtrar_paginas'],
+                opcoes['dpi'], opcoes['cores'], opcoes['formato'], opcoes['qualidade']
+            )
+            paginas.extend(paginas_arquivo)
+            relatorio_recorte.extend(relatorio_arquivo)
+            paginas_por_extrato.append(len(paginas_arquivo))
+
+    # 2. Dados do modelo, publicados à medida que cada página fica pronta
+    # Posições (página, recorte) de cada imagem, para trocar pelos links do Drive
+    posicoes_imagens = [
+        (i, j) for i, pagina in enumerate(paginas) if isinstance(pagina, (bytes, list))
+        for j in range(len(pagina) if isinstance(pagina, list) else 1)
+    ]
+    if sessao_drive is not None and posicoes_imagens:
+        # Os arquivos saem do Drive ao fim do bloco, mesmo se a análise falhar
+        envio = sessao_drive.paginas_publicas(
+            [paginas[i][j] if isinstance(paginas[i], list) else paginas[i] for i, j in posicoes_imagens], FOLDER_ID,
+            ao_falhar_remocao=lambda file_id, e: tarefa.avisar(f"Não foi possível deletar o arquivo {file_id}: {e}")
+        )
+    else:
+        envio = nullcontext([])
+
+    tarefa.atualizar(0.0, "🔄 Analisando as páginas do extrato...")
+    dfs_paginas = {}
+    compactos = {}
+    # A entrada do bloco é o upload e a saída é a remoção dos arquivos
+    with estatisticas.medir_contexto(envio, 'envio', 'limpeza') as links_publicos:
+        for (i, j), link in zip(posicoes_imagens, links_publicos):
+            if isinstance(paginas[i], list):
+                paginas[i][j] = link
+            else:
+                paginas[i] = link
+        for indice, df_pagina in extrair_transacoes_por_pagina(
+            paginas, usar_cache=usar_cache, empacotar_paginas=opcoes['empacotar_paginas'], estatisticas=estatisticas,
+            saida_compacta=opcoes['saida_compacta'], conciliar_saldos=opcoes['conciliar_saldos']
+        ):
+            dfs_paginas[indice] = df_pagina
+            compactos[indice] = compactar_transacoes(df_pagina)
+            # Resultado parcial, com as origens ainda sem normalizar
+            tarefa.atualizar(
+                len(dfs_paginas) / len(paginas), f"🔄 {len(dfs_paginas)} de {len(paginas)} páginas analisadas",
+                pd.concat([compactos[i] for i in sorted(compactos)], ignore_index=True)
+            )
+
+        dfs_paginas = [dfs_paginas[i] for i in range(len(paginas))]
+        # Ainda dentro do bloco: as páginas reenviadas usam os links do Drive
+        if opcoes['conciliar_saldos']:
+            tarefa.atualizar(mensagem="🔄 Conferindo os saldos das páginas...")
+            dfs_paginas = conciliar_saldos_paginas(
+                paginas, dfs_paginas, estatisticas, paginas_por_extrato, usar_cache=usar_cache,
+                saida_compacta=opcoes['saida_compacta']
+            )
+
+    total_credito, total_debito, total_liquido, df, df_credito, df_debito, soma_valores_credito, soma_valores_debito, total_tokens, preco_total = consolidar_transacoes(
+        dfs_paginas, estatisticas=estatisticas, paginas_por_extrato=paginas_por_extrato
+    )
+    nomes = [nome for nome, _ in arquivos]
+    if LOG_METRICAS:
+        estatisticas.gravar_jsonl(LOG_METRICAS, arquivo=", ".join(nomes), paginas_extrato=len(paginas))
+
+    duplicadas = pd.DataFrame(estatisticas.duplicadas)
+    if not duplicadas.empty:
+        duplicadas['extrato'] = duplicadas['extrato'].map(lambda n: nomes[n - 1])
+    # Páginas ignoradas pelo filtro, pelo arquivo e pela página dentro dele
+    arquivo_pagina = [(nome, numero) for nome, quantidade in zip(nomes, paginas_por_extrato) for numero in range(1, quantidade + 1)]
+    ignoradas = pd.DataFrame(
+        [{'arquivo': arquivo_pagina[i['pagina'] - 1][0], 'pagina': arquivo_pagina[i['pagina'] - 1][1], 'motivo': i['motivo']}
+         for i in sorted(estatisticas.ignoradas, key=lambda i: i['pagina'])],
+        columns=['arquivo', 'pagina', 'motivo']
+    )
+    conciliacao = pd.DataFrame(estatisticas.conciliacao)
+    if not conciliacao.empty:
+        conciliacao['extrato'] = conciliacao['extrato'].map(lambda n: nomes[n - 1])
+    return {
+        'transacoes': (df, df_credito, df_debito, total_credito, total_debito, total_liquido, soma_valores_credito, soma_valores_debito),
+        'total_tokens': total_tokens,
+        'preco_total': preco_total,
+        'metricas': estatisticas.resumo(),
+        'usar_cache': usar_cache,
+        'relatorio_recorte': relatorio_recorte,
+        'rejeitadas': pd.DataFrame(estatisticas.rejeitadas),
+        'duplicadas': duplicadas,
+        'conciliacao': conciliacao,
+        'ignoradas': ignoradas,
     }
-    service.permissions().create(fileId=file_id, body=permission).execute()
 
-    # Gera o link público
-    public_url = f"https://drive.google.com/uc?id={file_id}"
-    if return_id:
-        return public_url, file_id
-    return public_url
+@st.fragment(run_every=INTERVALO_ANDAMENTO)
+def mostrar_andamento(id_tarefa):
+    """Andamento da tarefa, atualizado sozinho; quando ela termina, a página inteira é refeita com o resultado."""
+    executor = obter_executor_tarefas()
+    tarefa = executor.obter(id_tarefa)
+    if tarefa is None or tarefa.terminou:
+        st.rerun()
+    if tarefa.estado == 'na_fila':
+        st.info(f"⏳ Aguardando na fila ({executor.posicao(id_tarefa)} extratos na frente)...")
+        return
+    st.progress(tarefa.progresso, text=tarefa.mensagem)
+    if tarefa.parcial is not None:
+        resumo = resumir_transacoes(tarefa.parcial)
+        df_credito_parcial, df_debito_parcial = separar_por_tipo(tarefa.parcial)
+        mostrar_resultado(
+            tarefa.parcial, df_credito_parcial, df_debito_parcial,
+            resumo['total_credito'] / 100, resumo['total_debito'] / 100,
+            (resumo['total_credito'] - resumo['total_debito']) / 100,
+            resumo['soma_origem_credito'] / 100, resumo['soma_origem_debito'] / 100
+        )
+
+def acompanhar_tarefa(id_tarefa):
+    """Mostra o andamento, o erro ou o resultado da tarefa."""
+    tarefa = obter_executor_tarefas().obter(id_tarefa)
+    if tarefa is None:
+        st.info("O resultado deste processamento expirou. Processe o extrato de novo.")
+    elif not tarefa.terminou:
+        mostrar_andamento(id_tarefa)
+    elif tarefa.estado == 'erro':
+        st.error(f"❌ Erro no processamento: {tarefa.erro}")
+    else:
+        for aviso in tarefa.avisos:
+            st.warning(aviso)
+        mostrar_processamento(tarefa.resultado)
+
+def mostrar_processamento(resultado):
+    """Resultado final de processar_extratos, com os detalhes do processamento."""
+    st.success("✅ Processamento concluído!")
+    if resultado['usar_cache']:
+        # Só deste processamento: páginas que saíram do cache e as que foram ao modelo
+        paginas = resultado['metricas']['paginas']
+        st.caption(f"Cache de páginas: {paginas.get('cache', 0)} acertos, {paginas.get('modelo', 0)} falhas")
+    if resultado['relatorio_recorte']:
+        df_recorte = pd.DataFrame(resultado['relatorio_recorte'])
+        tokens_antes = df_recorte['tokens_pagina'].sum()
+        tokens_depois = df_recorte['tokens_recorte'].sum()
+        with st.expander(f"✂️ Recorte das tabelas: {tokens_antes:,} → {tokens_depois:,} tokens de imagem ({1 - tokens_depois / tokens_antes:.0%} a menos)"):
+            st.dataframe(df_recorte, use_container_width=True, hide_index=True)
+    if not resultado['ignoradas'].empty:
+        with st.expander(
+            f"⏭️ {len(resultado['ignoradas'])} páginas sem movimentações (capa, avisos, propaganda, resumo) não foram ao modelo: "
+            f"cerca de {resultado['metricas']['chamadas_evitadas']} chamadas a menos"
+        ):
+            st.dataframe(resultado['ignoradas'], use_container_width=True, hide_index=True)
+    if not resultado['rejeitadas'].empty:
+        with st.expander(f"⚠️ {len(resultado['rejeitadas'])} linhas da resposta do modelo não puderam ser lidas e ficaram fora dos totais"):
+            st.dataframe(resultado['rejeitadas'], use_container_width=True, hide_index=True)
+    if not resultado['duplicadas'].empty:
+        with st.expander(f"🔁 {len(resultado['duplicadas'])} transações repetidas entre páginas ou extratos foram contadas uma vez só"):
+            st.dataframe(resultado['duplicadas'], use_container_width=True, hide_index=True)
+    conciliacao = resultado['conciliacao']
+    if not conciliacao.empty:
+        sem_conciliacao = conciliacao[conciliacao['situacao'].isin(['divergente', 'sem_saldo'])]
+        reconsultadas = int(conciliacao['reconsultada'].sum())
+        if sem_conciliacao.empty:
+            st.caption(f"⚖️ Saldos conferidos: todas as páginas fecham ({reconsultadas} reenviadas ao modelo para corrigir)")
+        else:
+            st.warning(
+                f"⚖️ {len(sem_conciliacao)} páginas não fecham com o saldo do extrato (ou não mostram o saldo) "
+                f"e precisam ser conferidas: {', '.join(f'{e} p. {p}' for e, p in zip(sem_conciliacao['extrato'], sem_conciliacao['pagina']))}"
+            )
+        with st.expander(f"⚖️ Conferência de saldos por página ({reconsultadas} páginas reenviadas ao modelo)"):
+            st.dataframe(conciliacao, use_container_width=True, hide_index=True)
+
+    mostrar_resultado(*resultado['transacoes'])
+
+    # --- INFORMAÇÕES DO PROCESSAMENTO ---
+    st.markdown("---")
+    st.subheader("💡 Informações do Processamento")
+
+    resumo_metricas = resultado['metricas']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("🔢 Tokens Utilizados", f"{resultado['total_tokens']:,.0f}")
+    with col2:
+        st.metric("💵 Custo Estimado", f"${resultado['preco_total']:.4f}")
+    with col3:
+        st.metric("📨 Chamadas ao Modelo", f"{resumo_metricas['chamadas']}")
+    with st.expander(f"⏱️ Tempo por etapa ({resumo_metricas['segundos_total']:.1f} s no total)"):
+        st.dataframe(
+            pd.DataFrame({
+                'etapa': list(resumo_metricas['etapas']),
+                'segundos': list(resumo_metricas['etapas'].values()),
+            }),
+            use_container_width=True, hide_index=True
+        )
+        st.caption(
+            f"Entrada: {resumo_metricas['input_tokens']:,} tokens · Saída: {resumo_metricas['output_tokens']:,} tokens · "
+            f"Latência por chamada: média {resumo_metricas['latencia_media']:.2f} s, máxima {resumo_metricas['latencia_maxima']:.2f} s"
+        )
+        if resumo_metricas['output_tokens_economizados']:
+            st.caption(
+                f"Resposta compacta: cerca de {resumo_metricas['output_tokens_economizados']:,} tokens de saída a menos "
+                f"({resumo_metricas['economia_saida_por_pagina']:,.0f} por página)"
+            )
+    if resumo_metricas['niveis']:
+        primeiro = resumo_metricas['niveis'][0]
+        with st.expander(f"🪜 Cascata de modelos: {primeiro['taxa_aprovacao']:.0%} das páginas resolvidas no {primeiro['modelo']}"):
+            st.dataframe(
+                pd.DataFrame(resumo_metricas['niveis']).assign(motivos=lambda df: df['motivos'].map(str)),
+                use_container_width=True, hide_index=True
+            )
 
 # --- INTERFACE PRINCIPAL ---
 st.set_page_config(page_title="PDF para Imagens no Drive", page_icon="📄", layout="wide")
@@ -77,115 +349,100 @@ with st.sidebar:
 
     st.header("📋 Como usar")
     st.markdown("""
-    1. Faça upload do arquivo PDF
+    1. Faça upload de um ou mais PDFs (períodos que se sobrepõem são contados uma vez só)
     2. Clique em "Processar Extrato com IA"
     3. Aguarde o processamento
     4. Veja o resumo e as tabelas detalhadas
     """)
 
+    st.header("⚙️ Configurações")
+    transporte = st.radio(
+        "Envio das imagens ao modelo",
+        [TRANSPORTE_MEMORIA, TRANSPORTE_DRIVE],
+        help="Em memória as páginas vão direto ao modelo, sem arquivos temporários nem Google Drive."
+    )
+    usar_camada_texto = st.checkbox(
+        "Ler o texto do PDF quando disponível",
+        value=True,
+        help="Extratos gerados digitalmente são lidos direto do PDF, sem chamar o modelo de visão."
+    )
+    filtrar_paginas = st.checkbox(
+        "Pular páginas sem movimentações",
+        value=True,
+        help="Capas, avisos, propagandas e páginas só de resumo são identificadas pelo texto ou pela imagem e não vão ao modelo."
+    )
+    usar_cache = st.checkbox(
+        "Reaproveitar páginas já analisadas",
+        value=True,
+        help="Páginas idênticas a de extratos já enviados saem do cache, sem nova chamada ao modelo."
+    )
+    empacotar_paginas = st.checkbox(
+        "Agrupar páginas em uma chamada",
+        value=False,
+        help="Envia várias páginas na mesma requisição ao modelo, dentro de um orçamento de tokens. Menos chamadas, mas cada resposta demora mais."
+    )
+    saida_compacta = st.checkbox(
+        "Resposta compacta do modelo",
+        value=False,
+        help="O modelo responde com o tipo em uma letra e sem repetir datas, o que reduz os tokens de saída e o tempo de resposta."
+    )
+    conciliar_saldos = st.checkbox(
+        "Conferir os saldos das páginas",
+        value=False,
+        help="O modelo também lê o saldo inicial e final de cada página. Páginas em que as movimentações não fecham com o saldo são reenviadas ao modelo e, se continuarem sem fechar, ficam marcadas para conferência."
+    )
+    with st.expander("🖼️ Imagens das páginas"):
+        dpi = st.slider("Resolução (DPI)", 50, 200, DPI_PADRAO, step=10)
+        cores = OPCOES_CORES[st.selectbox("Cores", list(OPCOES_CORES))]
+        formato = OPCOES_FORMATO[st.selectbox("Formato", list(OPCOES_FORMATO))]
+        qualidade = st.slider("Qualidade (JPEG/WebP)", 30, 95, QUALIDADE_PADRAO, step=5)
+        recortar = st.checkbox(
+            "Enviar só a tabela de movimentações",
+            value=True,
+            help="Corta logos, cabeçalhos, rodapés e margens antes de enviar a página ao modelo."
+        )
 
-st.markdown("Faça upload de um PDF e processe automaticamente o extrato bancário.")
 
-uploaded_file = st.file_uploader("Selecione o PDF", type=['pdf'])
+st.markdown("Faça upload de um ou mais PDFs e processe automaticamente o extrato bancário.")
 
-if uploaded_file is not None:
-    st.success(f"Arquivo carregado: {uploaded_file.name}")
+uploaded_files = st.file_uploader("Selecione os PDFs", type=['pdf'], accept_multiple_files=True)
 
-    if st.button("🚀 Processar Extrato com IA"):
-        with st.spinner("🔄 Convertendo PDF, enviando imagens e analisando extrato... Isso pode levar alguns minutos."):
-            # 1. Converter PDF em imagens
-            pdf_bytes = uploaded_file.read()
-            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-            imagens = []
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                pix = page.get_pixmap()
-                img_bytes = pix.tobytes("png")
-                img = Image.open(io.BytesIO(img_bytes))
-                imagens.append(img)
-                
-            links_publicos = []
-            file_ids = []
-            for i, img in enumerate(imagens):
-                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                    img.save(tmp.name, format="PNG")
-                    tmp.flush()
-                    link, file_id = upload_image_and_get_public_link(tmp.name, FOLDER_ID, return_id=True)
-                    links_publicos.append(link)
-                    file_ids.append(file_id)
-                os.unlink(tmp.name)
-            # 2. Dados do modelo
-            total_credito, total_debito, total_liquido, df, df_credito, df_debito, soma_valores_credito, soma_valores_debito, total_tokens, preco_total = analisar_extrato_por_links(links_publicos)
-        
-        st.success("✅ Processamento concluído!")
-
-        # --- ORIGEM MAIS FREQUENTE ---
-        origem_mais_frequente_credito = df_credito['origem'].mode()[0] if not df_credito.empty else ""
-        origem_mais_frequente_debito = df_debito['origem'].mode()[0] if not df_debito.empty else ""
-
-        # --- CARDS DE RESUMO ---
-        st.subheader("📊 Resumo Financeiro")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric(
-                label="💰 Total Créditos",
-                value=format_currency(total_credito),
-                delta=f"{(df['tipo'] == 'credito').sum()} transações"
-            )
-        with col2:
-            st.metric(
-                label="💸 Total Débitos",
-                value=format_currency(total_debito),
-                delta=f"{(df['tipo'] == 'debito').sum()} transações"
-            )
-        with col3:
-            st.metric(
-                label="⚖️ Saldo Líquido",
-                value=format_currency(total_liquido),
-                delta=format_currency(abs(total_liquido)) if total_liquido != 0 else "Equilibrado"
-            )
+if uploaded_files:
+    st.success(f"Arquivos carregados: {', '.join(arquivo.name for arquivo in uploaded_files)}")
 
-        # --- CARDS DE ORIGEM MAIS FREQUENTE ---
-        st.markdown("#### Origem mais frequente")
-        col4, col5 = st.columns(2)
-        with col4:
-            st.metric(
-                label=f"🔝 Crédito: {origem_mais_frequente_credito}",
-                value=format_currency(soma_valores_credito)
-            )
-        with col5:
-            st.metric(
-                label=f"🔝 Débito: {origem_mais_frequente_debito}",
-                value=format_currency(soma_valores_debito)
-            )
+    arquivos = [(arquivo.name, arquivo.getvalue()) for arquivo in uploaded_files]
+    opcoes = {
+        'usar_camada_texto': usar_camada_texto, 'filtrar_paginas': filtrar_paginas, 'recortar': recortar, 'dpi': dpi, 'cores': cores,
+        'formato': formato, 'qualidade': qualidade, 'empacotar_paginas': empacotar_paginas, 'saida_compacta': saida_compacta,
+        'conciliar_saldos': conciliar_saldos,
+    }
+    chave = chave_resultado(arquivos, opcoes)
+    tarefas = st.session_state.setdefault(CHAVE_TAREFAS, {})
+    tarefa_atual = obter_executor_tarefas().obter(tarefas[chave]) if chave in tarefas else None
 
-        # --- TABELA DETALHADA ---
-        st.markdown("---")
-        st.subheader("📄 Movimentações Detalhadas")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("### Créditos")
-            st.dataframe(df_credito, use_container_width=True)
-        with col2:
-            st.markdown("### Débitos")
-            st.dataframe(df_debito, use_container_width=True)
-        
-        # # --- INFORMAÇÕES DO PROCESSAMENTO ---
-        # st.markdown("---")
-        # st.subheader("💡 Informações do Processamento")
-
-        # col1, col2 = st.columns(2)
-        # with col1:
-        #     st.metric("🔢 Tokens Utilizados", f"{total_tokens:,.0f}")
-        # with col2:
-        #     st.metric("💵 Custo Estimado", f"${preco_total:.4f}")
-
-        # --- DELETA AS IMAGENS DO GOOGLE DRIVE ---
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
-        for file_id in file_ids:
+    if st.button("🚀 Processar Extrato com IA"):
+        if tarefa_atual is not None and not tarefa_atual.terminou:
+            st.info("Este extrato já está sendo processado.")
+        else:
+            sessao_drive = obter_sessao_drive() if transporte == TRANSPORTE_DRIVE else None
             try:
-                service.files().delete(fileId=file_id).execute()
-            except Exception as e:
-                st.warning(f"Não foi possível deletar o arquivo {file_id}: {e}")
\ No newline at end of file
+                id_tarefa = obter_executor_tarefas().submeter(processar_extratos, arquivos, opcoes, sessao_drive, usar_cache)
+            except FilaCheia:
+                st.warning("⏳ O servidor está ocupado com outros extratos. Tente de novo em alguns instantes.")
+            else:
+                tarefas.pop(chave, None)
+                tarefas[chave] = id_tarefa
+                # Só as tarefas mais recentes ficam na sessão
+                while len(tarefas) > MAX_TAREFAS_SESSAO:
+                    tarefas.pop(next(iter(tarefas)))
+                # Na URL, para reencontrar a tarefa depois de atualizar o navegador
+                st.query_params['tarefa'] = id_tarefa
+
+    id_tarefa = tarefas.get(chave)
+else:
+    # Depois de atualizar o navegador o upload se perde, mas a tarefa continua no servidor
+    id_tarefa = st.query_params.get('tarefa')
+
+# Nas outras interações (ordenar, rolar, abrir painéis) o resultado sai da tarefa, sem o modelo nem o Drive
+if id_tarefa:
+    acompanhar_tarefa(id_tarefa)
@@ -0,0 +1,126 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Extratos processados ao mesmo tempo, somando todas as sessões
+MAX_TAREFAS_SIMULTANEAS = 4
+# Tarefas aguardando na fila antes de recusar novas
+MAX_TAREFAS_FILA = 16
+# Tempo que uma tarefa terminada fica disponível para consulta, em segundos
+VALIDADE_TAREFA = 3600
+
+class FilaCheia(Exception):
+    """O executor já tem MAX_TAREFAS_FILA tarefas aguardando."""
+
+class Tarefa:
+    """
+    Uma tarefa do executor: a função roda em segundo plano e publica aqui o
+    progresso, um resultado parcial e, no fim, o resultado ou o erro. Os
+    campos são lidos por outras threads (a página que acompanha a tarefa).
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.estado = 'na_fila'
+        self.progresso = 0.0
+        self.mensagem = ""
+        self.parcial = None
+        self.avisos = []
+        self.resultado = None
+        self.erro = None
+        self.criada = time.time()
+        self.iniciada = None
+        self.terminada = None
+        self._lock = threading.Lock()
+
+    @property
+    def terminou(self):
+        return self.estado in ('concluida', 'erro')
+
+    def atualizar(self, progresso=None, mensagem=None, parcial=None):
+        """Chamado pela função da tarefa para publicar o andamento."""
+        with self._lock:
+            if progresso is not None:
+                self.progresso = progresso
+            if mensagem is not None:
+                self.mensagem = mensagem
+            if parcial is not None:
+                self.parcial = parcial
+
+    def avisar(self, mensagem):
+        """Aviso para mostrar na página junto com o resultado (ex.: falha ao limpar o Drive)."""
+        with self._lock:
+            self.avisos.append(mensagem)
+
+class ExecutorTarefas:
+    """
+    Executor de tarefas do processo, compartilhado por todas as sessões: no
+    máximo max_simultaneas tarefas rodando e max_fila aguardando. As
+    tarefas são identificadas por um ID, que a página guarda para consultar
+    o andamento; como rodam fora do script, sobrevivem a reruns e a uma
+    atualização do navegador.
+    """
+
+    def __init__(self, max_simultaneas=MAX_TAREFAS_SIMULTANEAS, max_fila=MAX_TAREFAS_FILA, validade=VALIDADE_TAREFA):
+        self.max_simultaneas = max_simultaneas
+        self.max_fila = max_fila
+        self.validade = validade
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneas, thread_name_prefix="tarefa")
+        self._lock = threading.Lock()
+        self._tarefas = {}
+
+    def _limpar(self):
+        """Esquece as tarefas terminadas há mais de validade segundos."""
+        limite = time.time() - self.validade
+        for id_tarefa in [i for i, t in self._tarefas.items() if t.terminou and t.terminada < limite]:
+            del self._tarefas[id_tarefa]
+
+    def _executar(self, tarefa, funcao, args, kwargs):
+        tarefa.estado = 'executando'
+        tarefa.iniciada = time.time()
+        try:
+            tarefa.resultado = funcao(tarefa, *args, **kwargs)
+        except Exception as erro:
+            tarefa.erro = f"{type(erro).__name__}: {erro}"
+            tarefa.estado = 'erro'
+        else:
+            tarefa.progresso = 1.0
+            tarefa.estado = 'concluida'
+        finally:
+            tarefa.terminada = time.time()
+
+    def submeter(self, funcao, *args, **kwargs):
+        """
+        Agenda funcao(tarefa, *args, **kwargs) e devolve o ID da tarefa.
+        Levanta FilaCheia se já houver max_fila tarefas aguardando.
+        """
+        with self._lock:
+            self._limpar()
+            if self.na_fila() >= self.max_fila:
+                raise FilaCheia(f"{self.max_fila} extratos já aguardam processamento")
+            tarefa = Tarefa()
+            self._tarefas[tarefa.id] = tarefa
+        self._executor.submit(self._executar, tarefa, funcao, args, kwargs)
+        return tarefa.id
+
+    def obter(self, id_tarefa):
+        """A tarefa do ID, ou None se não existe ou já foi esquecida."""
+        with self._lock:
+            return self._tarefas.get(id_tarefa)
+
+    def na_fila(self):
+        return sum(t.estado == 'na_fila' for t in list(self._tarefas.values()))
+
+    def posicao(self, id_tarefa):
+        """Quantas tarefas criadas antes desta ainda aguardam (0 = a próxima a rodar)."""
+        with self._lock:
+            tarefa = self._tarefas.get(id_tarefa)
+            if tarefa is None or tarefa.estado != 'na_fila':
+                return 0
+            return sum(t.estado == 'na_fila' and t.criada < tarefa.criada for t in self._tarefas.values())
+
+    def estatisticas(self):
+        with self._lock:
+            estados = [t.estado for t in self._tarefas.values()]
+        return {estado: estados.count(estado) for estado in ('na_fila', 'executando', 'concluida', 'erro')}
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from agendador import MIN_AMOSTRAS_HEDGE, Agendador
+
+class Resposta:
+    def __init__(self, nome):
+        self.nome = nome
+        self.usage_metadata = {'total_tokens': 10}
+
+def _aquecer(agendador, chave, segundos=0.01):
+    """Latências conhecidas para a chave, até o hedge poder disparar."""
+    for _ in range(MIN_AMOSTRAS_HEDGE):
+        agendador.executar(lambda: time.sleep(segundos) or Resposta('rapida'), chave=chave)
+
+def test_latencias_separadas_por_chave():
+    agendador = Agendador(hedging=True)
+    _aquecer(agendador, ('nano', 1))
+    assert agendador.p95(('nano', 1)) is not None
+    assert agendador.p95(('mini', 1)) is None
+    assert agendador.p95(('nano', 4)) is None
+
+def test_chamada_perdedora_do_hedge_e_repassada():
+    agendador = Agendador(hedging=True)
+    _aquecer(agendador, 'modelo')
+    chamadas = []
+    descartadas = []
+    terminou = threading.Event()
+
+    def lenta_depois_rapida():
+        chamadas.append(None)
+        if len(chamadas) == 1:
+            time.sleep(0.3)
+            return Resposta('original')
+        return Resposta('duplicada')
+
+    def ao_descartar(resposta, segundos):
+        descartadas.append((resposta.nome, segundos))
+        terminou.set()
+
+    resposta = agendador.executar(lenta_depois_rapida, chave='modelo', ao_descartar=ao_descartar)
+    assert resposta.nome == 'duplicada'
+    assert terminou.wait(2)
+    assert descartadas[0][0] == 'original' and descartadas[0][1] >= 0.3
+    assert agendador.estatisticas()['hedges_vencedores'] == 1
+
+def test_espera_no_limite_nao_conta_para_o_hedge():
+    agendador = Agendador(hedging=True)
+    _aquecer(agendador, 'modelo')
+    reservar = agendador.balde.reservar
+    esperas = []
+
+    def reservar_devagar(tokens):
+        # Só a primeira reserva depois do aquecimento espera pelo limite
+        if not esperas:
+            esperas.append(None)
+            time.sleep(0.2)
+        reservar(tokens)
+
+    agendador.balde.reservar = reservar_devagar
+    resposta = agendador.executar(lambda: Resposta('original'), chave='modelo')
+    assert resposta.nome == 'original'
+    assert agendador.estatisticas()['hedges'] == 0
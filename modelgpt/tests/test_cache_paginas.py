@@ -0,0 +1,42 @@
+import json
+
+from cache_paginas import CachePaginas
+
+LINHAS = [["tipo", "valor", "origem", " data"], ["debito", "12.50", "PADARIA", "01/03/2024"]]
+
+def _tamanho(linhas):
+    return len(json.dumps(linhas, ensure_ascii=False).encode("utf-8"))
+
+def test_chave_depende_da_pagina_do_prompt_e_do_modelo():
+    chave = CachePaginas.chave(b"pagina", "prompt", "modelo")
+    assert chave == CachePaginas.chave(b"pagina", "prompt", "modelo")
+    assert chave != CachePaginas.chave(b"pagina2", "prompt", "modelo")
+    assert chave != CachePaginas.chave(b"pagina", "prompt2", "modelo")
+    assert chave != CachePaginas.chave(b"pagina", "prompt", "modelo2")
+    # As partes têm o tamanho na chave: mover bytes de uma para a outra muda o hash
+    assert CachePaginas.chave(b"ab", "prompt", "x") != CachePaginas.chave(b"b", "prompt", "xa")
+
+def test_acertos_falhas_e_motivo(tmp_path):
+    cache = CachePaginas(str(tmp_path / "cache.sqlite"))
+    assert cache.obter("a") is None
+    cache.guardar("a", LINHAS)
+    cache.guardar("b", LINHAS[:1], motivo='vazia')
+    assert cache.obter("a") == (LINHAS, None)
+    assert cache.obter("b") == (LINHAS[:1], 'vazia')
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['acertos'], estatisticas['falhas'], estatisticas['entradas']) == (2, 1, 2)
+    # O cache em disco sobrevive a uma nova instância
+    assert CachePaginas(str(tmp_path / "cache.sqlite")).obter("a") == (LINHAS, None)
+
+def test_remove_as_entradas_usadas_ha_mais_tempo(tmp_path, monkeypatch):
+    relogio = iter(range(1, 100))
+    monkeypatch.setattr("cache_paginas.time.time", lambda: next(relogio))
+    cache = CachePaginas(str(tmp_path / "cache.sqlite"), max_bytes=3 * _tamanho(LINHAS))
+    for chave in "abc":
+        cache.guardar(chave, LINHAS)
+    # "a" passa a ser a usada mais recentemente; "b" é a mais antiga
+    cache.obter("a")
+    cache.guardar("d", LINHAS)
+    assert cache.obter("b") is None
+    assert all(cache.obter(chave) is not None for chave in "acd")
+    assert cache.estatisticas()['bytes'] <= cache.max_bytes
@@ -0,0 +1,29 @@
+import fitz  # PyMuPDF
+
+from camada_texto import extrair_transacoes_texto
+
+def _pagina(linhas):
+    documento = fitz.open()
+    page = documento.new_page(width=595, height=842)
+    page.insert_text((40, 60), "BANCO SINTETICO S.A. Extrato de conta corrente", fontsize=12)
+    page.insert_text((40, 136), "Data", fontsize=8)
+    page.insert_text((100, 136), "Historico", fontsize=8)
+    page.insert_text((440, 136), "Valor", fontsize=8)
+    for y, (data, historico, valor) in zip(range(150, 842, 14), linhas):
+        page.insert_text((40, y), data, fontsize=8)
+        page.insert_text((100, y), historico, fontsize=8)
+        page.insert_text((460 - fitz.get_text_length(valor, fontsize=8), y), valor, fontsize=8)
+    return documento
+
+def test_movimentacoes_com_sinal():
+    documento = _pagina([("05/03/2025", "PIX RECEBIDO JOAO DA SILVA", "+150,00"),
+                         ("06/03/2025", "COMPRA CARTAO POSTO SHELL", "-70,00")])
+    df = extrair_transacoes_texto(documento[0])
+    assert df[['tipo', 'valor']].values.tolist() == [['credito', 150.0], ['debito', 70.0]]
+
+def test_linhas_de_total_e_limite_mandam_a_pagina_ao_modelo():
+    documento = _pagina([("05/03/2025", "PIX RECEBIDO JOAO DA SILVA", "+150,00"),
+                         ("06/03/2025", "COMPRA CARTAO POSTO SHELL", "-70,00"),
+                         ("", "TOTAL DE DEBITOS", "-70,00"),
+                         ("", "Limite disponivel", "+500,00")])
+    assert extrair_transacoes_texto(documento[0]) is None
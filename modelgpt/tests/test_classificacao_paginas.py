@@ -0,0 +1,59 @@
+import fitz  # PyMuPDF
+
+from classificacao_paginas import motivo_sem_movimentacoes
+
+AVISO = "As tarifas e encargos cobrados seguem a tabela vigente disponivel nas agencias e no site do banco. " * 12
+
+def _nova_pagina(documento):
+    return documento.new_page(width=595, height=842)
+
+def _cabecalho(page):
+    page.insert_text((40, 60), "BANCO SINTETICO S.A.", fontsize=14)
+    page.insert_text((40, 80), "Extrato de conta corrente - Agencia 0001 Conta 12345-6", fontsize=9)
+
+def _escanear(page):
+    """Documento com a página rasterizada, sem camada de texto."""
+    pix = page.get_pixmap(dpi=100, colorspace=fitz.csGRAY, alpha=False)
+    documento = fitz.open()
+    nova = documento.new_page(width=page.rect.width, height=page.rect.height)
+    nova.insert_image(nova.rect, stream=pix.tobytes("png"))
+    return documento
+
+def test_texto_uma_movimentacao_sem_sinal_e_saldo_anterior():
+    documento = fitz.open()
+    page = _nova_pagina(documento)
+    _cabecalho(page)
+    page.insert_text((40, 150), "SALDO ANTERIOR 1.000,00", fontsize=8)
+    page.insert_text((40, 164), "05/03/2025", fontsize=8)
+    page.insert_text((100, 164), "PIX RECEBIDO JOAO DA SILVA", fontsize=8)
+    page.insert_text((420, 164), "150,00", fontsize=8)
+    assert motivo_sem_movimentacoes(page) is None
+
+def test_escaneada_duas_movimentacoes_e_rodape_longo():
+    documento = fitz.open()
+    page = _nova_pagina(documento)
+    _cabecalho(page)
+    for y, (data, historico, valor) in zip((150, 164), [("05/03/2025", "PIX RECEBIDO JOAO DA SILVA", "150,00"),
+                                                         ("06/03/2025", "COMPRA CARTAO POSTO SHELL", "-89,90")]):
+        page.insert_text((40, y), data, fontsize=8)
+        page.insert_text((100, y), historico, fontsize=8)
+        page.insert_text((420, y), valor, fontsize=8)
+    page.insert_textbox(fitz.Rect(40, 400, 555, 800), AVISO, fontsize=9, align=3)
+    assert motivo_sem_movimentacoes(_escanear(page)[0]) is None
+
+def test_aviso_legal_e_pagina_em_branco_sao_ignorados():
+    documento_aviso, documento_branco = fitz.open(), fitz.open()
+    aviso = _nova_pagina(documento_aviso)
+    aviso.insert_textbox(fitz.Rect(50, 60, 545, 800), AVISO * 3, fontsize=9, align=3)
+    branca = _nova_pagina(documento_branco)
+    assert motivo_sem_movimentacoes(aviso) == 'sem_movimentacoes'
+    assert motivo_sem_movimentacoes(_escanear(aviso)[0]) == 'sem_tabela'
+    assert motivo_sem_movimentacoes(branca) == 'em_branco'
+
+def test_resumo_sem_movimentacoes_e_ignorado():
+    documento = fitz.open()
+    page = _nova_pagina(documento)
+    for y, linha in zip(range(120, 240, 20), ["Resumo do periodo", "Saldo anterior 1.000,00", "Total de creditos 5.432,10",
+                                              "Total de debitos 4.321,00", "Saldo final 2.111,10", "Limite disponivel 3.000,00"]):
+        page.insert_text((60, y), linha, fontsize=11)
+    assert motivo_sem_movimentacoes(page) == 'sem_movimentacoes'
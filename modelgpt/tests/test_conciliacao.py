@@ -0,0 +1,36 @@
+import pandas as pd
+
+from conciliacao import conciliar_paginas, movimento_centavos
+
+def _pagina(linhas, saldo_inicial=None, saldo_final=None):
+    df = pd.DataFrame(linhas, columns=['tipo', 'valor', 'origem', 'data'])
+    df.attrs.update(saldo_inicial=saldo_inicial, saldo_final=saldo_final)
+    return df
+
+SALARIO = ('credito', 1000.0, 'SALARIO', '01/03/2024')
+MERCADO = ('debito', 250.10, 'MERCADO', '02/03/2024')
+PADARIA = ('debito', 12.50, 'PADARIA', '03/03/2024')
+
+def test_pagina_que_fecha_e_conciliada():
+    assert movimento_centavos(_pagina([SALARIO, MERCADO, PADARIA])) == 73740
+    relatorio = conciliar_paginas([_pagina([SALARIO, MERCADO, PADARIA], 100.0, 837.40)])
+    assert relatorio['situacao'].tolist() == ['conciliada']
+    assert relatorio.at[0, 'diferenca'] == 0
+
+def test_sinal_trocado_ou_linha_faltando_diverge():
+    sinal_trocado = _pagina([SALARIO, ('credito', 250.10, 'MERCADO', '02/03/2024'), PADARIA], 100.0, 837.40)
+    sem_padaria = _pagina([SALARIO, MERCADO], 100.0, 837.40)
+    relatorio = conciliar_paginas([sinal_trocado, sem_padaria], paginas_por_extrato=[1, 1])
+    assert relatorio['situacao'].tolist() == ['divergente', 'divergente']
+    assert relatorio['diferenca'].round(2).tolist() == [-500.20, -12.50]
+
+def test_paginas_sem_saldo_e_sem_movimento():
+    # A segunda página usa o saldo final da primeira; a capa não interrompe a sequência
+    primeira = _pagina([SALARIO], 0.0, 1000.0)
+    capa = _pagina([])
+    segunda = _pagina([MERCADO], saldo_final=749.90)
+    sem_saldos = _pagina([PADARIA])
+    relatorio = conciliar_paginas([primeira, capa, segunda, sem_saldos])
+    assert relatorio['situacao'].tolist() == ['conciliada', 'sem_movimento', 'conciliada', 'sem_saldo']
+    assert relatorio.at[2, 'saldo_inicial'] == 1000.0
+    assert relatorio['pagina'].tolist() == [1, 2, 3, 4]
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from duplicatas import remover_duplicatas
+
+def _pagina(linhas, saldo_inicial=None, saldo_final=None):
+    df = pd.DataFrame(linhas, columns=['tipo', 'valor', 'origem', 'data'])
+    df.attrs.update(saldo_inicial=saldo_inicial, saldo_final=saldo_final)
+    return df
+
+CAFE = ('debito', 5.0, 'CAFE', '01/03/2024')
+PADARIA = ('debito', 12.0, 'PADARIA', '01/03/2024')
+SALARIO = ('credito', 1000.0, 'SALARIO', '02/03/2024')
+
+def test_uma_linha_igual_na_borda_sem_saldos_e_mantida():
+    paginas = [_pagina([SALARIO, CAFE]), _pagina([CAFE, PADARIA])]
+    resultado, removidas = remover_duplicatas(paginas)
+    assert [len(df) for df in resultado] == [2, 2]
+    assert removidas.empty
+
+def test_duas_linhas_repetidas_na_borda_sao_removidas():
+    paginas = [_pagina([SALARIO, CAFE, PADARIA]), _pagina([CAFE, PADARIA, SALARIO])]
+    resultado, removidas = remover_duplicatas(paginas)
+    assert [len(df) for df in resultado] == [3, 1]
+    assert removidas['motivo'].tolist() == ['pagina', 'pagina']
+
+def test_uma_linha_repetida_com_saldo_confirmando_e_removida():
+    anterior = _pagina([SALARIO, CAFE], saldo_inicial=0.0, saldo_final=995.0)
+    # Saldo inicial é o de antes do café: o banco reimprimiu a linha
+    repetida = _pagina([CAFE, PADARIA], saldo_inicial=1000.0, saldo_final=983.0)
+    resultado, removidas = remover_duplicatas([anterior, repetida])
+    assert [len(df) for df in resultado] == [2, 1]
+    # Saldo inicial é o final da anterior: é um segundo café de verdade
+    legitima = _pagina([CAFE, PADARIA], saldo_inicial=995.0, saldo_final=978.0)
+    resultado, removidas = remover_duplicatas([anterior, legitima])
+    assert [len(df) for df in resultado] == [2, 2]
+    assert removidas.empty
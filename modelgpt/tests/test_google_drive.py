@@ -0,0 +1,27 @@
+import pytest
+
+from google_drive import DriveFalso, SessaoDrive
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+def test_permissoes_e_remocoes_em_uma_requisicao_em_lote_cada():
+    drive = DriveFalso()
+    sessao = SessaoDrive(service=drive)
+    paginas = 7
+    with sessao.paginas_publicas([PNG] * paginas) as links:
+        # Um upload por página e um lote com todas as permissões
+        assert drive.chamadas_http == paginas + 1
+        assert len(links) == paginas
+        assert all(arquivo['publico'] for arquivo in drive.arquivos.values())
+    # Mais um lote com todas as remoções
+    assert drive.chamadas_http == paginas + 2
+    assert drive.arquivos == {}
+
+def test_arquivos_removidos_quando_o_bloco_falha():
+    drive = DriveFalso()
+    sessao = SessaoDrive(service=drive)
+    with pytest.raises(ValueError):
+        with sessao.paginas_publicas([PNG] * 3):
+            assert len(drive.arquivos) == 3
+            raise ValueError("falha na extração")
+    assert drive.arquivos == {}
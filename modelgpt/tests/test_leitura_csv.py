@@ -0,0 +1,69 @@
+import pandas as pd
+
+from leitura_csv import expandir_compacto, ler_csv_pagina
+
+def _ler(*linhas):
+    return ler_csv_pagina("tipo,valor,origem,data\n" + "\n".join(linhas) + "\n")
+
+def test_valores_sem_aspas_sao_juntados():
+    df, rejeitadas = _ler(
+        "debito,1.234,56,MERCADO,01/03/2024",
+        "credito,1,234.56,SALARIO,02/03/2024",
+        "debito,12,50,PADARIA, CENTRO,03/03/2024",
+    )
+    assert rejeitadas.empty
+    assert df['valor'].tolist() == [1234.56, 1234.56, 12.50]
+    assert df['origem'].tolist() == ['MERCADO', 'SALARIO', 'PADARIA, CENTRO']
+
+def test_divisao_ambigua_sem_aspas_e_rejeitada():
+    df, rejeitadas = _ler(
+        "debito,1234,56,F,01/03/2024",
+        "debito,1234,LOJA, CENTRO,02/03/2024",
+    )
+    assert rejeitadas['linha'].tolist() == ["debito,1234,56,F,01/03/2024"]
+    assert df['valor'].tolist() == [1234.0]
+    assert df['origem'].tolist() == ['LOJA, CENTRO']
+
+def test_virgula_seguida_de_tres_digitos_e_milhar_ou_rejeitada():
+    df, rejeitadas = _ler(
+        "debito,1,234,LOJA,01/03/2024",
+        "debito,2,500,MERCADO,02/03/2024",
+        'debito,"1,234",FARMACIA,03/03/2024',
+        'debito,"1.234,567",POSTO,04/03/2024',
+        'debito,"0,500",BANCA,05/03/2024',
+    )
+    assert df['valor'].tolist() == [1234.0, 2500.0, 1234.0]
+    assert df['origem'].tolist() == ['LOJA', 'MERCADO', 'FARMACIA']
+    assert rejeitadas['motivo'].tolist() == ['valor', 'valor']
+
+COMPLETO = """tipo,valor,origem, data
+debito,22.97,IFOOD.COM,28/03/2025
+debito,25.11,SHPP BRASIL,28/03/2025
+credito,12.19,SHPP BRASIL,05/05/2025
+debito,8.00,PADARIA; CAFE,05/05/2025
+"""
+
+COMPACTO = """Segue o extrato:
+T;V;O;D
+D;22.97;IFOOD.COM;28/03/25
+D;25.11;SHPP BRASIL;
+C;12.19;SHPP BRASIL;05/05/25
+d;8.00;PADARIA; CAFE;
+"""
+
+def test_formato_compacto_volta_ao_csv_completo():
+    expandido = expandir_compacto(COMPACTO)
+    # Tipos por extenso e a data repetida da linha anterior
+    assert expandido.splitlines()[2] == "debito,25.11,SHPP BRASIL,28/03/25"
+    df, rejeitadas = ler_csv_pagina(expandido)
+    esperado, _ = ler_csv_pagina(COMPLETO)
+    assert rejeitadas.empty
+    pd.testing.assert_frame_equal(df, esperado)
+
+def test_formato_compacto_empacotado_mantem_a_pagina():
+    expandido = expandir_compacto("P;T;V;O;D\n1;D;22.97;IFOOD.COM;28/03/25\n2;C;12.19;SHPP BRASIL;\n", com_pagina=True)
+    assert expandido.splitlines() == [
+        "pagina,tipo,valor,origem, data",
+        "1,debito,22.97,IFOOD.COM,28/03/25",
+        "2,credito,12.19,SHPP BRASIL,28/03/25",
+    ]
@@ -0,0 +1,46 @@
+import hashlib
+import json
+import sys
+
+import pytest
+
+import lote
+
+def _rodar(monkeypatch, entrada, saida):
+    """Roda lote.main() com processar_extrato trocado; devolve os arquivos processados."""
+    processados = []
+
+    def processar_extrato(caminho_pdf, destino, opcoes):
+        processados.append(caminho_pdf.name)
+        if caminho_pdf.read_bytes() == b"quebrado":
+            raise ValueError("PDF ilegível")
+        return {'paginas': 1, 'transacoes': 2}
+
+    monkeypatch.setattr(lote, 'processar_extrato', processar_extrato)
+    monkeypatch.setattr(sys, 'argv', ['lote.py', str(entrada), str(saida), '--workers', '1'])
+    with pytest.raises(SystemExit):
+        lote.main()
+    return sorted(processados)
+
+def test_sha256_em_blocos(tmp_path):
+    caminho = tmp_path / "extrato.pdf"
+    caminho.write_bytes(b"%PDF" * 1000)
+    assert lote._sha256(caminho, tamanho_bloco=7) == hashlib.sha256(b"%PDF" * 1000).hexdigest()
+
+def test_retomada_pula_concluidos_e_repete_os_que_falharam(tmp_path, monkeypatch):
+    entrada, saida = tmp_path / "extratos", tmp_path / "resultados"
+    entrada.mkdir()
+    for nome in ("a.pdf", "b.pdf", "c.pdf"):
+        (entrada / nome).write_bytes(b"%PDF " + nome.encode())
+    (entrada / "b.pdf").write_bytes(b"quebrado")
+
+    assert _rodar(monkeypatch, entrada, saida) == ["a.pdf", "b.pdf", "c.pdf"]
+    diario = [json.loads(linha) for linha in (saida / lote.NOME_DIARIO).read_text(encoding='utf-8').splitlines()]
+    assert {registro['arquivo']: registro['status'] for registro in diario} == {'a.pdf': 'ok', 'b.pdf': 'erro', 'c.pdf': 'ok'}
+
+    # Só o que falhou volta; um concluído que mudou de conteúdo também
+    (entrada / "b.pdf").write_bytes(b"%PDF b.pdf")
+    (entrada / "c.pdf").write_bytes(b"%PDF c.pdf alterado")
+    assert _rodar(monkeypatch, entrada, saida) == ["b.pdf", "c.pdf"]
+    assert _rodar(monkeypatch, entrada, saida) == []
+    assert lote.Diario(saida / lote.NOME_DIARIO).registros['b.pdf']['status'] == 'ok'
@@ -0,0 +1,69 @@
+import pytest
+
+import modelo
+from cache_paginas import CachePaginas
+from extrato_sintetico import ModeloFalso
+from metricas import EstatisticasExtrato
+
+@pytest.fixture
+def modelos(monkeypatch, tmp_path):
+    """Modelos falsos em todos os níveis da cascata e um cache de páginas vazio."""
+    falsos = {nome: ModeloFalso(model_name=nome) for nome in modelo.CASCATA_MODELOS}
+    monkeypatch.setattr(modelo, 'llms', falsos)
+    monkeypatch.setattr(modelo, 'cache_paginas', CachePaginas(str(tmp_path / "cache.sqlite")))
+    # A estimativa de saída por página é ajustada a cada chamada empacotada
+    monkeypatch.setattr(modelo, '_saida_por_pagina', modelo._saida_por_pagina)
+    return falsos
+
+def _extrair(links, **opcoes):
+    estatisticas = EstatisticasExtrato()
+    dfs = dict(modelo.extrair_transacoes_por_pagina(links, estatisticas=estatisticas, **opcoes))
+    return [dfs[i] for i in range(len(links))], estatisticas
+
+def test_pagina_vazia_no_ultimo_nivel_sai_do_cache_sem_nova_cascata(modelos):
+    # Nenhuma transação registrada: todos os níveis devolvem só o cabeçalho
+    links = ["https://exemplo/pagina-sem-movimentacoes.png"]
+    dfs, estatisticas = _extrair(links)
+    assert dfs[0].empty
+    assert len(estatisticas.chamadas) == len(modelo.CASCATA_MODELOS)
+
+    dfs, estatisticas = _extrair(links)
+    assert dfs[0].empty
+    assert estatisticas.chamadas == []
+    assert estatisticas.paginas['cache'] == 1 and estatisticas.paginas['cache_reprovada'] == 1
+
+class ModeloQueCorta(ModeloFalso):
+    """Corta a resposta (finish_reason "length") das chamadas com mais de duas páginas."""
+
+    def invoke(self, messages, max_tokens=None, **kwargs):
+        paginas = sum(parte["type"] == "text" for parte in messages[-1].content)
+        return super().invoke(messages, max_tokens=20 if paginas > 2 else max_tokens, **kwargs)
+
+def _transacoes(pagina):
+    return [{'tipo': 'debito', 'valor': 10.0 * pagina + i, 'origem': f"LOJA {pagina}-{i}", 'data': '01/03/2025'}
+            for i in range(3)]
+
+def test_lote_cortado_e_dividido_e_cada_pagina_fica_com_suas_linhas(modelos):
+    falso = ModeloQueCorta(model_name=modelo.CASCATA_MODELOS[0])
+    modelos[modelo.CASCATA_MODELOS[0]] = falso
+    links = [f"https://exemplo/pagina{numero}.png" for numero in range(1, 5)]
+    for numero, link in enumerate(links, start=1):
+        falso.registrar(link, _transacoes(numero))
+
+    estatisticas = EstatisticasExtrato()
+    csvs = modelo._extrair_csv_lote(list(enumerate(links)), estatisticas)
+
+    # Quatro páginas cortadas, depois duas chamadas de duas páginas
+    assert [c['paginas'] for c in estatisticas.chamadas] == [4, 2, 2]
+    assert sorted(csvs) == [0, 1, 2, 3]
+    for indice, extrato_csv in csvs.items():
+        df, rejeitadas = modelo._ler_pagina(extrato_csv)
+        assert rejeitadas.empty
+        assert df['origem'].tolist() == [t['origem'] for t in _transacoes(indice + 1)]
+
+def test_separar_por_pagina_recusa_pagina_fora_do_lote():
+    resposta = "pagina,tipo,valor,origem, data\n1,debito,1.00,A,01/03/2025\n2,credito,2.00,B,01/03/2025\n"
+    primeira, segunda = modelo._separar_por_pagina(resposta, 2)
+    assert primeira.splitlines()[1:] == ["debito,1.00,A,01/03/2025"]
+    assert segunda.splitlines()[1:] == ["credito,2.00,B,01/03/2025"]
+    assert modelo._separar_por_pagina(resposta.replace("\n2,", "\n3,"), 2) is None
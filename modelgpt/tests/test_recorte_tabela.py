@@ -0,0 +1,46 @@
+import fitz  # PyMuPDF
+
+from recorte_tabela import regioes_tabela
+
+AVISO = "As tarifas e encargos cobrados seguem a tabela vigente disponivel nas agencias e no site do banco. " * 12
+
+def _escanear(page):
+    """Documento com a página rasterizada, sem camada de texto."""
+    pix = page.get_pixmap(dpi=100, colorspace=fitz.csGRAY, alpha=False)
+    documento = fitz.open()
+    nova = documento.new_page(width=page.rect.width, height=page.rect.height)
+    nova.insert_image(nova.rect, stream=pix.tobytes("png"))
+    return documento
+
+def _tabela(page, ys):
+    """Cabeçalho das colunas em y=121 e uma movimentação em cada y."""
+    for x, titulo in ((40, "DATA"), (100, "HISTORICO"), (420, "VALOR")):
+        page.insert_text((x, 121), titulo, fontsize=8)
+    for i, y in enumerate(ys):
+        page.insert_text((40, y), f"{i + 1:02d}/03/2025", fontsize=8)
+        page.insert_text((100, y), f"COMPRA LOJA {i}", fontsize=8)
+        page.insert_text((420, y), f"-{i + 1},00", fontsize=8)
+
+def test_escaneada_tabela_em_varios_blocos_vai_inteira_no_recorte():
+    documento = fitz.open()
+    page = documento.new_page(width=595, height=842)
+    # Dois grupos de linhas separados por um espaço maior, e o aviso no rodapé
+    _tabela(page, list(range(150, 193, 14)) + list(range(234, 336, 14)))
+    page.insert_textbox(fitz.Rect(40, 400, 555, 800), AVISO, fontsize=9, align=3)
+    escaneada = _escanear(page)
+    regioes = regioes_tabela(escaneada[0], 100)
+    assert len(regioes) == 1
+    # Do cabeçalho das colunas à última linha, sem o aviso
+    assert regioes[0].y0 < 114 and 336 < regioes[0].y1 < 400
+
+def test_escaneada_texto_corrido_entre_blocos_vai_a_pagina_inteira():
+    documento = fitz.open()
+    page = documento.new_page(width=595, height=842)
+    _tabela(page, range(150, 193, 14))
+    page.insert_textbox(fitz.Rect(40, 240, 555, 420), AVISO, fontsize=9, align=3)
+    for i, y in enumerate(range(480, 550, 14)):
+        page.insert_text((40, y), f"{i + 10:02d}/03/2025", fontsize=8)
+        page.insert_text((100, y), f"PIX RECEBIDO {i}", fontsize=8)
+        page.insert_text((420, y), f"{i + 1},00", fontsize=8)
+    escaneada = _escanear(page)
+    assert regioes_tabela(escaneada[0], 100) == [escaneada[0].rect]
@@ -0,0 +1,60 @@
+import random
+from collections import Counter
+
+import pytest
+
+from similaridade_nomes import agrupar_nomes_similares, similaridade_nomes
+
+BASES = ["PADARIA SAO JOSE", "POSTO SHELL", "MERCADO EXTRA", "FARMACIA PAGUE MENOS", "UBER TRIP",
+         "IFOOD", "PIX JOAO DA SILVA", "NETFLIX.COM", "CONTA DE LUZ", "RESTAURANTE SABOR"]
+
+def _agrupar_todos_os_pares(nomes, threshold=0.8):
+    """Agrupamento de referência: cada nome comparado com todos os outros (O(n²))."""
+    nomes_unicos = list(set(nomes))
+    grupos = []
+    processados = set()
+    for nome in nomes_unicos:
+        if nome in processados:
+            continue
+        grupo_atual = [nome]
+        processados.add(nome)
+        for outro_nome in nomes_unicos:
+            if outro_nome not in processados and similaridade_nomes(nome, outro_nome, threshold):
+                grupo_atual.append(outro_nome)
+                processados.add(outro_nome)
+        grupos.append(grupo_atual)
+    mapeamento = {}
+    for grupo in grupos:
+        contador = Counter([nome for nome in nomes if nome in grupo])
+        nome_mais_frequente = contador.most_common(1)[0][0]
+        for nome in grupo:
+            mapeamento[nome] = nome_mais_frequente
+    return mapeamento
+
+def _variacao(aleatorio, nome):
+    """Nome com pequenas alterações: caracteres trocados, apagados, sufixos, caixa e espaços."""
+    caracteres = list(nome)
+    for _ in range(aleatorio.randint(0, 3)):
+        posicao = aleatorio.randrange(len(caracteres))
+        operacao = aleatorio.random()
+        if operacao < 0.4:
+            caracteres[posicao] = aleatorio.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ")
+        elif operacao < 0.7 and len(caracteres) > 1:
+            del caracteres[posicao]
+        else:
+            caracteres.insert(posicao, aleatorio.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ*-"))
+    variado = "".join(caracteres)
+    if aleatorio.random() < 0.3:
+        variado += f" {aleatorio.randint(1, 99):02d}/03"
+    if aleatorio.random() < 0.2:
+        variado = variado.lower().replace(" ", "  ")
+    return variado
+
+@pytest.mark.parametrize('threshold', [0.6, 0.8, 0.9])
+@pytest.mark.parametrize('semente', range(5))
+def test_mesmos_grupos_da_comparacao_de_todos_os_pares(semente, threshold):
+    aleatorio = random.Random(semente)
+    nomes = [_variacao(aleatorio, aleatorio.choice(BASES)) for _ in range(200)]
+    # Repetições, para a escolha do nome mais frequente de cada grupo
+    nomes += aleatorio.choices(nomes, k=100) + ["", ""]
+    assert agrupar_nomes_similares(nomes, threshold) == _agrupar_todos_os_pares(nomes, threshold)
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from tarefas import ExecutorTarefas, FilaCheia
+
+def _esperar(condicao, limite=5.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "tempo esgotado"
+        time.sleep(0.01)
+
+def test_no_maximo_max_simultaneas_rodando_e_fila_limitada():
+    executor = ExecutorTarefas(max_simultaneas=2, max_fila=2)
+    liberar = threading.Event()
+    rodando = []
+    maximo = [0]
+    lock = threading.Lock()
+
+    def bloqueada(tarefa):
+        with lock:
+            rodando.append(tarefa.id)
+            maximo[0] = max(maximo[0], len(rodando))
+        liberar.wait(5)
+        with lock:
+            rodando.remove(tarefa.id)
+        return tarefa.id
+
+    ids = [executor.submeter(bloqueada) for _ in range(4)]
+    _esperar(lambda: executor.estatisticas()['executando'] == 2)
+    assert executor.estatisticas()['na_fila'] == 2
+    assert executor.posicao(ids[3]) == 1
+    with pytest.raises(FilaCheia):
+        executor.submeter(bloqueada)
+
+    liberar.set()
+    _esperar(lambda: all(executor.obter(i).terminou for i in ids))
+    assert maximo[0] == 2
+    assert [executor.obter(i).resultado for i in ids] == ids
+    assert executor.estatisticas()['concluida'] == 4
+
+def test_erro_na_funcao_fica_na_tarefa():
+    executor = ExecutorTarefas(max_simultaneas=1)
+
+    def falha(tarefa):
+        tarefa.atualizar(0.5, "Metade")
+        raise ValueError("PDF ilegível")
+
+    id_tarefa = executor.submeter(falha)
+    _esperar(lambda: executor.obter(id_tarefa).terminou)
+    tarefa = executor.obter(id_tarefa)
+    assert tarefa.estado == 'erro'
+    assert tarefa.erro == "ValueError: PDF ilegível"
+    assert tarefa.resultado is None and tarefa.progresso == 0.5
+    assert tarefa.terminada is not None
+    # O executor continua aceitando tarefas depois do erro
+    outro = executor.submeter(lambda tarefa: "ok")
+    _esperar(lambda: executor.obter(outro).terminou)
+    assert executor.obter(outro).resultado == "ok"
+
+def test_tarefas_terminadas_expiram():
+    executor = ExecutorTarefas(validade=0)
+    id_tarefa = executor.submeter(lambda tarefa: None)
+    _esperar(lambda: executor.obter(id_tarefa).terminou)
+    time.sleep(0.01)
+    executor.submeter(lambda tarefa: None)
+    assert executor.obter(id_tarefa) is None
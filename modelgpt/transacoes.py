@@ -0,0 +1,73 @@
+import pandas as pd
+
+TIPOS = ['credito', 'debito']
+
+def _converter_datas(datas):
+    datas = datas.astype('string').str.strip()
+    convertidas = pd.to_datetime(datas, format='%d/%m/%Y', errors='coerce')
+    # Datas com ano de dois dígitos ou outro separador
+    faltantes = convertidas.isna() & datas.notna()
+    if faltantes.any():
+        convertidas[faltantes] = pd.to_datetime(datas[faltantes], dayfirst=True, format='mixed', errors='coerce')
+    return convertidas
+
+def compactar_transacoes(df):
+    """
+    Converte as transações para o formato compacto: tipo e origem como
+    categorias, valor_centavos em int64 (sem arredondamento de float nas
+    somas) e data em datetime64.
+    """
+    valores = pd.to_numeric(df['valor'], errors='coerce').fillna(0)
+    tipos = df['tipo'].astype('string').str.strip().str.lower()
+    return pd.DataFrame({
+        'tipo': pd.Categorical(tipos, categories=TIPOS),
+        'valor_centavos': (valores * 100).round().astype('int64'),
+        'origem': df['origem'].astype('category'),
+        'data': _converter_datas(df['data']),
+    })
+
+def _origem_mais_frequente(agregado, tipo):
+    """
+    Origem mais frequente do tipo e a soma dos seus valores, em centavos.
+    No empate vence a menor origem em ordem alfabética, como no mode().
+    """
+    if tipo not in agregado.index.get_level_values('tipo'):
+        return "", 0
+    por_origem = agregado.xs(tipo, level='tipo')
+    mais_frequentes = por_origem[por_origem['size'] == por_origem['size'].max()]
+    origem = min(mais_frequentes.index)
+    return origem, int(mais_frequentes.loc[origem, 'sum'])
+
+def resumir_transacoes(df):
+    """
+    Calcula, com uma única agregação por tipo e origem, os totais em
+    centavos de cada tipo e a soma da origem mais frequente de cada tipo.
+    """
+    agregado = df.groupby(['tipo', 'origem'], observed=True)['valor_centavos'].agg(['sum', 'size'])
+    totais = agregado['sum'].groupby(level='tipo', observed=True).sum()
+    origem_credito, soma_credito = _origem_mais_frequente(agregado, 'credito')
+    origem_debito, soma_debito = _origem_mais_frequente(agregado, 'debito')
+    return {
+        'total_credito': int(totais.get('credito', 0)),
+        'total_debito': int(totais.get('debito', 0)),
+        'origem_credito': origem_credito,
+        'soma_origem_credito': soma_credito,
+        'origem_debito': origem_debito,
+        'soma_origem_debito': soma_debito,
+    }
+
+def separar_por_tipo(df):
+    """
+    Separa créditos e débitos em uma passada (groupby) e devolve as tabelas
+    de exibição com origem, valor em reais e data.
+    """
+    partes = dict(tuple(df.groupby('tipo', observed=True)))
+    tabelas = []
+    for tipo in TIPOS:
+        parte = partes.get(tipo, df.iloc[0:0])
+        tabelas.append(pd.DataFrame({
+            'origem': parte['origem'].reset_index(drop=True),
+            'valor': parte['valor_centavos'].reset_index(drop=True) / 100,
+            'data': parte['data'].reset_index(drop=True),
+        }))
+    return tuple(tabelas)